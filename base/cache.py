@@ -1,110 +1,806 @@
+from collections import OrderedDict
+from decimal import Decimal
 from functools import wraps
+from uuid import UUID
+from django.apps import apps
 from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import models, router
+from django.db.models import DEFERRED
+import contextvars
+import datetime
+import hashlib
 import inspect
+import json
 import logging
+import pickle
+import threading
+import time
 from django.conf import settings
+from .cache_stats import cache_stats
+
+try:
+    import orjson
+except ImportError:  # fall back to the standard library
+    orjson = None
 
 logger = logging.getLogger("django")
 
+# Redis key holding the generation of every worker's local (L1) cache.
+# Bumping it makes each worker drop its L1 entries on the next sync.
+L1_VERSION_KEY = "cache_l1_version"
+# Redis key prefix of the per-model tag versions, see invalidate_cache_tags
+TAG_KEY_PREFIX = "cache_tag"
+# model labels declared as tags by the cache decorators in this process
+cache_tags = set()
+# cache_key name -> CacheOptions of every decorated function, see cache_stats command
+cache_entries = {}
+# per-request memo of cache lookups (key -> pickled payload), see start_request_memo
+_request_memo = contextvars.ContextVar("cache_request_memo", default=None)
+
+
+class LocalCache:
+    """
+    Bounded, per-process LRU cache with a TTL, used as the L1 tier in front of Redis.
+
+    Values are kept pickled so that callers never share (and mutate) the same
+    object, exactly like values that come back from Redis.
+    """
+
+    def __init__(self, max_entries, timeout):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.version = None
+        self.checked_at = 0.0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns the cached value for key, or None when missing or expired.
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, payload = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+        return pickle.loads(payload)
+
+    def set(self, key, value, timeout=None):
+        """
+        Stores value under key, evicting the least recently used entries past max_entries.
+        """
+        try:
+            payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logger.debug(f"LocalCache skip {key}: {e}")
+            return
+        ttl = self.timeout if timeout is None else min(timeout, self.timeout)
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, payload)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+local_cache = LocalCache(
+    max_entries=getattr(settings, "CACHE_L1_MAX_ENTRIES", 1024),
+    timeout=getattr(settings, "CACHE_L1_TIMEOUT", 60),
+)
+
+
+def _local_cache_enabled():
+    return getattr(settings, "CACHE_L1_ENABLED", True)
+
+
+def _sync_local_cache():
+    """
+    Drops the local cache when another worker bumped the L1 version in Redis.
+    Redis is polled at most once every CACHE_L1_SYNC_INTERVAL seconds.
+    """
+    now = time.monotonic()
+    if now - local_cache.checked_at < getattr(settings, "CACHE_L1_SYNC_INTERVAL", 2):
+        return
+    local_cache.checked_at = now
+    try:
+        version = cache.get(L1_VERSION_KEY)
+    except Exception as e:
+        logger.warning(f"Unable to read {L1_VERSION_KEY}: {e}")
+        return
+    if version != local_cache.version:
+        if local_cache.version is not None or len(local_cache) > 0:
+            logger.debug(f"LocalCache cleared, version {local_cache.version} -> {version}")
+        local_cache.clear()
+        local_cache.version = version
+
+
+def invalidate_local_cache():
+    """
+    Clears the L1 cache of this worker and signals every other worker to do the same.
+
+    Database Operations:
+        Increments L1_VERSION_KEY in Redis.
+    """
+    local_cache.clear()
+    try:
+        if not cache.add(L1_VERSION_KEY, 1, timeout=None):
+            cache.incr(L1_VERSION_KEY)
+        local_cache.version = cache.get(L1_VERSION_KEY)
+    except Exception as e:
+        logger.warning(f"Unable to bump {L1_VERSION_KEY}: {e}")
+    local_cache.checked_at = time.monotonic()
+
+
+def _tag_key(tag):
+    return f"{TAG_KEY_PREFIX}[{tag}]"
+
+
+def register_cache_tags(tags):
+    """
+    Declares model labels that cache entries depend on, so that saving those models bumps the tag.
+
+    Args:
+        tags: Model labels such as "userManagement.AppMenu".
+
+    Returns:
+        The tags as a list, to be passed on to cache_get/cache_set.
+    """
+    tags = list(tags or [])
+    cache_tags.update(tags)
+    return tags
+
+
+def is_cache_tag(tag):
+    return tag in cache_tags
+
+
+def invalidate_cache_tags(*tags):
+    """
+    Invalidates every cache entry depending on one of the tags, in Redis and in every worker's L1.
+
+    Database Operations:
+        Increments one cache_tag[...] key per tag in Redis.
+    """
+    for tag in tags:
+        key = _tag_key(tag)
+        try:
+            # a missing tag starts from the current time, so it can never match
+            # a version recorded before the tag key was evicted
+            if not cache.add(key, time.time_ns(), timeout=None):
+                cache.incr(key)
+        except Exception as e:
+            logger.warning(f"Unable to bump {key}: {e}")
+    logger.debug(f"cache tags invalidated: {tags}")
+    invalidate_local_cache()
+    _clear_request_memo()
+
+
+def _get_tag_versions(tags, values):
+    versions = {}
+    for tag in tags:
+        version = values.get(_tag_key(tag))
+        if version is None:
+            version = time.time_ns()
+            if not cache.add(_tag_key(tag), version, timeout=None):
+                version = cache.get(_tag_key(tag))
+        versions[tag] = version
+    return versions
+
+
+class ModelSnapshot:
+    """
+    Compact, picklable copy of the concrete field values of a model instance.
+    It is turned back into an instance with Model.from_db, without a query.
+    """
+
+    __slots__ = ("label", "fields", "values")
+
+    def __init__(self, label, fields, values):
+        self.label = label
+        self.fields = fields
+        self.values = values
+
+    @classmethod
+    def from_instance(cls, instance):
+        fields = tuple(f.attname for f in instance._meta.concrete_fields)
+        return cls(
+            instance._meta.label, fields, tuple(getattr(instance, f) for f in fields)
+        )
+
+    def to_instance(self):
+        model_class = apps.get_model(self.label)
+        # fields added since the snapshot was taken are loaded lazily (deferred)
+        data = dict(zip(self.fields, self.values))
+        values = [data.get(f.attname, DEFERRED) for f in model_class._meta.concrete_fields]
+        return model_class.from_db(
+            router.db_for_read(model_class),
+            [f.attname for f in model_class._meta.concrete_fields],
+            values,
+        )
+
+    def __getstate__(self):
+        return (self.label, self.fields, self.values)
+
+    def __setstate__(self, state):
+        self.label, self.fields, self.values = state
+
+
+def encode_payload(data):
+    """
+    Converts a value to its compact cache payload: model instances become a
+    ModelSnapshot, lists and dicts (e.g. queryset.values()) become JSON bytes.
+    Values must only contain JSON types, dates would come back as strings.
+    """
+    if isinstance(data, models.Model):
+        return ModelSnapshot.from_instance(data)
+    if isinstance(data, models.QuerySet):
+        data = list(data)
+    if isinstance(data, (list, tuple, dict)):
+        if orjson is not None:
+            return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(data, separators=(",", ":")).encode("utf-8")
+    return data
+
+
+def decode_payload(payload):
+    if isinstance(payload, ModelSnapshot):
+        return payload.to_instance()
+    if isinstance(payload, bytes):
+        return orjson.loads(payload) if orjson is not None else json.loads(payload)
+    return payload
+
+
+class CacheOptions:
+    """
+    How a cache entry is read and written.
+
+    Args:
+        timeout: Seconds the entry is fresh.
+        local: Whether the entry may be served from / promoted to the per-process L1 cache.
+        tags: Model labels the entry depends on.
+        single_flight: Only one worker recomputes a missing entry, the others wait for it.
+        stale_ttl: Seconds an expired (or invalidated) entry may still be served while
+            one worker refreshes it (stale-while-revalidate). Implies single_flight.
+        compact: Store the value as a compact payload, see encode_payload.
+    """
+
+    def __init__(
+        self,
+        timeout=settings.CACHE_TIMEOUT_DEFAULT,
+        local=False,
+        tags=None,
+        single_flight=False,
+        stale_ttl=None,
+        compact=False,
+    ):
+        self.timeout = timeout
+        self.local = local
+        self.tags = register_cache_tags(tags)
+        self.single_flight = single_flight or stale_ttl is not None
+        self.stale_ttl = stale_ttl
+        self.compact = compact
+
+    @property
+    def use_local(self):
+        return self.local and _local_cache_enabled()
+
+    @property
+    def use_envelope(self):
+        return len(self.tags) > 0 or self.stale_ttl is not None
+
+
+def _cache_lookup(key, options):
+    """
+    Returns (data, tag_versions, state).
+
+    data is None on a miss. tag_versions are the versions read before the miss
+    and must be stored with the recomputed value. state is one of the
+    cache_stats counters: local_hits, hits, stale_hits (an entry which expired
+    or whose tags changed, only returned with stale_ttl) or misses.
+    """
+    if options.use_local:
+        _sync_local_cache()
+        data = local_cache.get(key)
+        if data is not None:
+            return data, None, "local_hits"
+    versions = None
+    state = "hits"
+    if options.use_envelope:
+        values = cache.get_many([key] + [_tag_key(tag) for tag in options.tags])
+        if options.tags:
+            versions = _get_tag_versions(options.tags, values)
+        entry = values.get(key)
+        if entry is None:
+            return None, versions, "misses"
+        refresh_at = entry.get("refresh_at")
+        if entry.get("tags") != versions or (
+            refresh_at is not None and refresh_at <= time.time()
+        ):
+            if options.stale_ttl is None:
+                return None, versions, "misses"
+            state = "stale_hits"
+        data = entry.get("data")
+    else:
+        data = cache.get(key)
+        if data is None:
+            return None, versions, "misses"
+    if options.use_local and state == "hits":
+        local_cache.set(key, data, options.timeout)
+    return data, versions, state
+
+
+def _payload_size(payload):
+    if isinstance(payload, bytes):
+        return len(payload)
+    try:
+        return len(pickle.dumps(payload, pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 0
+
+
+def _cache_store(key, data, options, versions):
+    timeout = options.timeout
+    if options.use_envelope:
+        entry = {"tags": versions, "data": data}
+        if options.stale_ttl is not None and timeout is not None:
+            # keep the value past its soft expiry so it can be served while refreshing
+            entry["refresh_at"] = time.time() + timeout
+            timeout = timeout + options.stale_ttl
+        cache.set(key, entry, timeout)
+    else:
+        cache.set(key, data, timeout)
+    if options.use_local:
+        local_cache.set(key, data, options.timeout)
+
+
+def _lock_key(key):
+    return f"lock[{key}]"
+
+
+def _acquire_lock(key):
+    """
+    Takes the rebuild lock of key. The lock expires after CACHE_LOCK_TIMEOUT seconds,
+    so a worker dying while rebuilding does not block the entry.
+    """
+    try:
+        return cache.add(
+            _lock_key(key), 1, timeout=getattr(settings, "CACHE_LOCK_TIMEOUT", 30)
+        )
+    except Exception as e:
+        logger.warning(f"Unable to lock {key}: {e}")
+        return True
+
+
+def _release_lock(key):
+    try:
+        cache.delete(_lock_key(key))
+    except Exception as e:
+        logger.warning(f"Unable to unlock {key}: {e}")
+
+
+def _wait_for_rebuild(key, options):
+    """
+    Polls Redis until the worker holding the lock stored key, or the wait times out.
+    """
+    poll_interval = getattr(settings, "CACHE_LOCK_POLL_INTERVAL", 0.05)
+    deadline = time.monotonic() + getattr(settings, "CACHE_LOCK_WAIT_TIMEOUT", 10)
+    while time.monotonic() < deadline:
+        time.sleep(poll_interval)
+        data, versions, state = _cache_lookup(key, options)
+        if data is not None:
+            return data, versions
+        if cache.get(_lock_key(key)) is None:
+            break
+    logger.warning(f"Gave up waiting for {key} to be rebuilt")
+    return None, versions
+
+
+def start_request_memo():
+    """
+    Starts the per-request memo of cache lookups, see RequestCacheMiddleware.
+
+    Returns:
+        The token to pass to end_request_memo.
+    """
+    return _request_memo.set({})
+
+
+def end_request_memo(token):
+    _request_memo.reset(token)
+
+
+def _memo_get(key):
+    memo = _request_memo.get()
+    if memo is None:
+        return None
+    payload = memo.get(key)
+    # values are copied like in the L1 cache, so callers cannot mutate each other's
+    return pickle.loads(payload) if payload is not None else None
+
+
+def _memo_set(key, data):
+    memo = _request_memo.get()
+    if memo is None or data is None:
+        return
+    try:
+        memo[key] = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        logger.debug(f"Request memo skip {key}: {e}")
+
+
+def _clear_request_memo():
+    memo = _request_memo.get()
+    if memo is not None:
+        memo.clear()
+
+
+def prefetch_cache(*calls):
+    """
+    Loads the cache entries a request is going to need with a single get_many,
+    into the request memo. Entries that are missing, expired or invalidated are
+    left to the normal lookup of the decorated function.
+
+    Args:
+        *calls: (key, options) pairs, see cache_call.
+
+    Returns:
+        The number of entries loaded into the memo.
+
+    Database Operations:
+        One get_many on Redis for the entries (and their tags) not in the L1 cache.
+    """
+    memo = _request_memo.get()
+    if memo is None:
+        return 0
+    loaded = 0
+    pending = {}
+    for key, options in calls:
+        if key in memo or key in pending:
+            continue
+        if options.use_local:
+            _sync_local_cache()
+            data = local_cache.get(key)
+            if data is not None:
+                _memo_set(key, data)
+                loaded += 1
+                continue
+        pending[key] = options
+    if len(pending) == 0:
+        return loaded
+    tag_keys = {_tag_key(t) for options in pending.values() for t in options.tags}
+    values = cache.get_many(list(pending.keys()) + list(tag_keys))
+    for key, options in pending.items():
+        data = values.get(key)
+        if data is None:
+            continue
+        if options.use_envelope:
+            versions = (
+                {t: values.get(_tag_key(t)) for t in options.tags}
+                if options.tags
+                else None
+            )
+            refresh_at = data.get("refresh_at")
+            if data.get("tags") != versions or (
+                refresh_at is not None and refresh_at <= time.time()
+            ):
+                continue
+            data = data.get("data")
+        _memo_set(key, data)
+        if options.use_local:
+            local_cache.set(key, data, options.timeout)
+        loaded += 1
+    logger.debug(f"Prefetched {loaded} of {len(calls)} cache entries")
+    return loaded
+
+
+def cache_call(func, *args, **kwargs):
+    """
+    Returns the (key, options) pair prefetch_cache needs for a call of a decorated function.
+
+    Example:
+        prefetch_cache(
+            cache_call(AppMenu.get_app_instance_by_key, app_name),
+            cache_call(FormTemplate.get_instance_by_code, form_code),
+        )
+    """
+    if inspect.ismethod(func):  # class or instance method, the key includes cls/record
+        args = (func.__self__,) + args
+        func = func.__func__
+    return func.cache_key(*args, **kwargs), func.cache_options
+
+
+def _rebuild(key, options, versions, func, *args, **kwargs):
+    started_at = time.perf_counter()
+    data = func(*args, **kwargs)
+    fill_time = time.perf_counter() - started_at
+    if data is not None:
+        payload = encode_payload(data) if options.compact else data
+        _cache_store(key, payload, options, versions)
+        _memo_set(key, payload)
+        cache_stats.record_fill(key, fill_time, _payload_size(payload))
+    return data
+
+
+def _decode(data, options):
+    return decode_payload(data) if options.compact else data
+
+
+def _cached_call(key, options, func, *args, **kwargs):
+    data = _memo_get(key)
+    if data is not None:
+        cache_stats.record(key, "memo_hits")
+        return _decode(data, options)
+    data, versions, state = _cache_lookup(key, options)
+    if state in ("hits", "local_hits"):
+        cache_stats.record(key, state)
+        _memo_set(key, data)
+        return _decode(data, options)
+    if state == "misses":
+        cache_stats.record(key, state)
+    if not options.single_flight:
+        return _rebuild(key, options, versions, func, *args, **kwargs)
+    if _acquire_lock(key):
+        try:
+            return _rebuild(key, options, versions, func, *args, **kwargs)
+        finally:
+            _release_lock(key)
+    if data is not None:
+        # another worker is refreshing the entry, keep serving the previous value
+        logger.debug(f"Serving stale {key}")
+        cache_stats.record(key, state)
+        _memo_set(key, data)
+        return _decode(data, options)
+    data, versions = _wait_for_rebuild(key, options)
+    if data is None:
+        return _rebuild(key, options, versions, func, *args, **kwargs)
+    _memo_set(key, data)
+    return _decode(data, options)
+
+
+def cache_get(key, local=False, tags=None, compact=False):
+    """
+    Reads key from the L1 cache (when local is True) and falls back to Redis.
+
+    Args:
+        key: The cache key.
+        local: Whether the value may be served from / promoted to the per-process L1 cache.
+        tags: Model labels the entry depends on; the entry is ignored once one of them changed.
+        compact: Whether the entry was stored as a compact payload.
+
+    Returns:
+        The cached value, or None if it is not cached.
+    """
+    options = CacheOptions(local=local, tags=tags, compact=compact)
+    data = _memo_get(key)
+    if data is not None:
+        cache_stats.record(key, "memo_hits")
+        return _decode(data, options)
+    data, versions, state = _cache_lookup(key, options)
+    cache_stats.record(key, state)
+    _memo_set(key, data)
+    return _decode(data, options)
+
+
+def cache_set(
+    key,
+    data,
+    timeout=settings.CACHE_TIMEOUT_DEFAULT,
+    local=False,
+    tags=None,
+    compact=False,
+):
+    """
+    Writes key to Redis and, when local is True, to the L1 cache.
+    Tagged entries are stored with the current version of their tags.
+    """
+    options = CacheOptions(timeout=timeout, local=local, tags=tags, compact=compact)
+    versions = (
+        _get_tag_versions(
+            options.tags, cache.get_many([_tag_key(tag) for tag in options.tags])
+        )
+        if options.tags
+        else None
+    )
+    payload = encode_payload(data) if compact else data
+    _cache_store(key, payload, options, versions)
+    _memo_set(key, payload)
+    cache_stats.record_fill(key, None, _payload_size(payload))
+
+
+def _digest(value):
+    return hashlib.blake2b(value.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _normalize_key_part(value):
+    """
+    Converts an argument to a stable string: model instances become "label:pk",
+    model classes their label, querysets their label and a digest of the SQL.
+    Containers are normalized recursively, dicts and sets are sorted.
+    """
+    if value is None or isinstance(value, (str, int, float, bool, Decimal, UUID)):
+        return str(value)
+    if isinstance(value, models.Model):
+        return f"{value._meta.label}:{value.pk}"
+    if inspect.isclass(value):
+        meta = getattr(value, "_meta", None)
+        return meta.label if meta is not None else f"{value.__module__}.{value.__qualname__}"
+    if isinstance(value, models.QuerySet):
+        try:
+            query = str(value.query)
+        except EmptyResultSet:
+            query = ""
+        return f"{value.model._meta.label}?{_digest(query)}"
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, dict):
+        items = sorted(
+            (_normalize_key_part(k), _normalize_key_part(v)) for k, v in value.items()
+        )
+        return "{" + ",".join(f"{k}={v}" for k, v in items) + "}"
+    if isinstance(value, (set, frozenset)):
+        return "{" + ",".join(sorted(_normalize_key_part(v) for v in value)) + "}"
+    if isinstance(value, (list, tuple)):
+        return "(" + ",".join(_normalize_key_part(v) for v in value) + ")"
+    return str(value)
+
+
+def make_cache_key(cache_key, *args):
+    """
+    Builds the cache key of cache_key for the given arguments.
+
+    The key is prefixed with CACHE_SCHEMA_VERSION, so bumping the setting on deploy
+    invalidates every entry. Arguments longer than CACHE_KEY_MAX_LENGTH are hashed.
+
+    Args:
+        cache_key: The name of the cache entry.
+        *args: The arguments the entry depends on.
+
+    Returns:
+        A key like "v1:user_menu_tree[userManagement.CustomUser:1]".
+    """
+    key = f"v{getattr(settings, 'CACHE_SCHEMA_VERSION', 1)}:{cache_key}"
+    if len(args) == 0:
+        return key
+    filter = ":".join(_normalize_key_part(arg) for arg in args)
+    if len(filter) > getattr(settings, "CACHE_KEY_MAX_LENGTH", 200):
+        filter = f"#{_digest(filter)}"
+    return f"{key}[{filter}]"
+
+
+def _bind_arguments(signature, args, kwargs):
+    """
+    Returns the call arguments in signature order with defaults applied,
+    so f(1, b=2) and f(a=1, b=2) produce the same key.
+    """
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    return list(bound.arguments.values())
+
+
+def _key_builder(cache_key, func):
+    """
+    Returns a function building the key of cache_key for a call of func, exposed
+    as cache_key on the decorated functions (see cache_call).
+    """
+    signature = inspect.signature(func)
+
+    def build_key(*args, **kwargs):
+        return make_cache_key(cache_key, *_bind_arguments(signature, args, kwargs))
+
+    return build_key
+
+
+def global_cache_decorator(
+    cache_key,
+    timeout=settings.CACHE_TIMEOUT_DEFAULT,
+    local=False,
+    tags=None,
+    single_flight=False,
+    stale_ttl=None,
+    compact=False,
+):
+    options = CacheOptions(timeout, local, tags, single_flight, stale_ttl, compact)
+    cache_entries[cache_key] = options
 
-def global_cache_decorator(cache_key, timeout=settings.CACHE_TIMEOUT_DEFAULT):
     def decorator(func):
+        build_key = _key_builder(cache_key, func)
+
         @wraps(func)
         def wrapper(*args, **kwargs):
             func_name = func.__name__
             func_module = inspect.getmodule(func)
             logger.debug(f"{func_module.__name__}.{func_name}")
-            filter = ""
-            for key in kwargs.keys():
-                if inspect.isclass(kwargs.get(key)):
-                    filter = f"{filter}:{kwargs.get(key)._meta.label}"
-                else:
-                    filter = f"{filter}:{kwargs.get(key)}"
-            for key in args:
-                if inspect.isclass(key):
-                    filter = f"{filter}:{key._meta.label}"
-                else:
-                    filter = f"{filter}:{key}"
-            data = (
-                cache.get(f"{cache_key}[{filter}]")
-                if filter != ""
-                else cache.get(cache_key)
-            )
-            if data is None:
-                data = func(*args, **kwargs)
-                key = f"{cache_key}[{filter}]" if filter != "" else cache_key
-                cache.set(key, data, timeout)
-            return data
+            try:
+                key = build_key(*args, **kwargs)
+            except TypeError:
+                return func(*args, **kwargs)  # let the function report the bad call
+            return _cached_call(key, options, func, *args, **kwargs)
 
+        wrapper.cache_key = build_key
+        wrapper.cache_options = options
         return wrapper
 
     return decorator
 
 
-def global_class_cache_decorator(cache_key, timeout=settings.CACHE_TIMEOUT_DEFAULT):
+def global_class_cache_decorator(
+    cache_key,
+    timeout=settings.CACHE_TIMEOUT_DEFAULT,
+    local=False,
+    tags=None,
+    single_flight=False,
+    stale_ttl=None,
+    compact=False,
+):
+    options = CacheOptions(timeout, local, tags, single_flight, stale_ttl, compact)
+    cache_entries[cache_key] = options
+
     def decorator(func):
-        @classmethod
+        build_key = _key_builder(cache_key, func)
+
         @wraps(func)
         def wrapper(cls, *args, **kwargs):  # cls will be passed from @classmethod
             func_name = func.__name__
             func_module = inspect.getmodule(func)
             logger.debug(f"{func_module.__name__}.{func_name}")
-            filter = ""
-            for key in kwargs.keys():
-                if inspect.isclass(kwargs.get(key)):
-                    filter = f"{filter}:{kwargs.get(key)._meta.label}"
-                else:
-                    filter = f"{filter}:{kwargs.get(key)}"
-            for key in args:
-                if inspect.isclass(key):
-                    filter = f"{filter}:{key._meta.label}"
-                else:
-                    filter = f"{filter}:{key}"
-            # Use a cache key, with class name to ensure uniqueness if needed
-            data = (
-                cache.get(f"{cache_key}[{filter}]")
-                if filter != ""
-                else cache.get(cache_key)
-            )
-            if data is None:
-                data = func(cls, *args, **kwargs)  # Call the class method
-                key = f"{cache_key}[{filter}]" if filter != "" else cache_key
-                cache.set(key, data, timeout)
-            return data
+            # cls is part of the key, so subclasses do not share entries
+            try:
+                key = build_key(cls, *args, **kwargs)
+            except TypeError:
+                return func(cls, *args, **kwargs)
+            return _cached_call(key, options, func, cls, *args, **kwargs)
 
-        return wrapper
+        wrapper.cache_key = build_key
+        wrapper.cache_options = options
+        return classmethod(wrapper)
 
     return decorator
 
 
-def global_instance_cache_decorator(cache_key, timeout=settings.CACHE_TIMEOUT_DEFAULT):
+def global_instance_cache_decorator(
+    cache_key,
+    timeout=settings.CACHE_TIMEOUT_DEFAULT,
+    local=False,
+    tags=None,
+    single_flight=False,
+    stale_ttl=None,
+    compact=False,
+):
+    options = CacheOptions(timeout, local, tags, single_flight, stale_ttl, compact)
+    cache_entries[cache_key] = options
+
     def decorator(func):
+        build_key = _key_builder(cache_key, func)
+
         @wraps(func)
-        def wrapper(record, *args, **kwargs):  # cls will be passed from @classmethod
+        def wrapper(record, *args, **kwargs):
             func_name = func.__name__
             func_module = inspect.getmodule(func)
             logger.debug(f"{func_module.__name__}.{func_name}")
-            filter = record.pk
-            for key in kwargs.keys():
-                if inspect.isclass(kwargs.get(key)):
-                    filter = f"{filter}:{kwargs.get(key)._meta.label}"
-                else:
-                    filter = f"{filter}:{kwargs.get(key)}"
-            for key in args:
-                if inspect.isclass(key):
-                    filter = f"{filter}:{key._meta.label}"
-                else:
-                    filter = f"{filter}:{key}"
-            # Use a cache key, with class name to ensure uniqueness if needed
-            data = cache.get(f"{cache_key}[{filter}]")
-            if data is None:
-                data = func(
-                    record, *args, **kwargs
-                )  # Call the instance method from model
-                key = f"{cache_key}[{filter}]"
-                cache.set(f"{cache_key}[{filter}]", data, timeout)
-            return data
+            # record is normalized to "label:pk"
+            try:
+                key = build_key(record, *args, **kwargs)
+            except TypeError:
+                return func(record, *args, **kwargs)
+            return _cached_call(key, options, func, record, *args, **kwargs)
 
+        wrapper.cache_key = build_key
+        wrapper.cache_options = options
         return wrapper
 
     return decorator
@@ -0,0 +1,184 @@
+from django.core.cache import cache
+from django.conf import settings
+import logging
+import os
+import socket
+import threading
+import time
+
+logger = logging.getLogger("django")
+
+# Redis keys the workers publish their counters to, see CacheStats.publish
+STATS_WORKERS_KEY = "cache_stats_workers"
+STATS_KEY_PREFIX = "cache_stats"
+# bumped by reset_cache_stats, workers drop their counters when it changed
+STATS_GENERATION_KEY = "cache_stats_generation"
+
+COUNTERS = (
+    "hits",
+    "local_hits",
+    "memo_hits",
+    "stale_hits",
+    "misses",
+    "fills",
+    "fill_time",
+    "max_fill_time",
+    "bytes",
+)
+
+
+def get_cache_key_prefix(key):
+    """
+    Returns the name a cache key was built from, e.g. "user_menu_tree" for
+    "v1:user_menu_tree[userManagement.CustomUser:1]".
+    """
+    return key.split(":", 1)[-1].split("[", 1)[0]
+
+
+def _stats_enabled():
+    return getattr(settings, "CACHE_STATS_ENABLED", True)
+
+
+class CacheStats:
+    """
+    In-process hit/miss/fill counters per cache key prefix.
+
+    Counters are cumulative for the life of the worker and published to Redis
+    every CACHE_STATS_PUBLISH_INTERVAL seconds, where collect_cache_stats sums
+    them up over all workers.
+    """
+
+    def __init__(self):
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        self.published_at = time.monotonic()
+        self.generation = None
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _counters(self, prefix):
+        counters = self._data.get(prefix)
+        if counters is None:
+            counters = self._data[prefix] = dict.fromkeys(COUNTERS, 0)
+        return counters
+
+    def record(self, key, counter):
+        """
+        Increments counter (hits, local_hits, memo_hits, stale_hits or misses) of the prefix of key.
+        """
+        if not _stats_enabled():
+            return
+        with self._lock:
+            self._counters(get_cache_key_prefix(key))[counter] += 1
+        self.maybe_publish()
+
+    def record_fill(self, key, seconds, size):
+        """
+        Records the time taken to compute the value of key, and the size of its payload.
+        seconds is None for values written with cache_set, whose fill time is unknown.
+        """
+        if not _stats_enabled():
+            return
+        threshold = getattr(settings, "CACHE_SLOW_FILL_THRESHOLD", None)
+        if threshold is not None and seconds is not None and seconds >= threshold:
+            logger.warning(f"Slow cache fill {key}: {seconds:.3f}s, {size} bytes")
+        with self._lock:
+            counters = self._counters(get_cache_key_prefix(key))
+            counters["fills"] += 1
+            counters["bytes"] += size
+            if seconds is not None:
+                counters["fill_time"] += seconds
+                counters["max_fill_time"] = max(counters["max_fill_time"], seconds)
+        self.maybe_publish()
+
+    def snapshot(self):
+        with self._lock:
+            return {prefix: dict(counters) for prefix, counters in self._data.items()}
+
+    def maybe_publish(self):
+        interval = getattr(settings, "CACHE_STATS_PUBLISH_INTERVAL", 30)
+        if time.monotonic() - self.published_at >= interval:
+            self.publish()
+
+    def publish(self):
+        """
+        Writes the counters of this worker to Redis.
+
+        Database Operations:
+            Writes cache_stats[<worker>] and, when missing, registers the worker in cache_stats_workers.
+        """
+        self.published_at = time.monotonic()
+        timeout = settings.CACHE_TIMEOUT_L4
+        try:
+            values = cache.get_many([STATS_WORKERS_KEY, STATS_GENERATION_KEY])
+            generation = values.get(STATS_GENERATION_KEY)
+            if self.generation is not None and generation != self.generation:
+                self.reset()
+            self.generation = generation
+            cache.set(f"{STATS_KEY_PREFIX}[{self.worker}]", self.snapshot(), timeout)
+            workers = values.get(STATS_WORKERS_KEY) or []
+            if self.worker not in workers:
+                cache.set(STATS_WORKERS_KEY, workers + [self.worker], timeout)
+        except Exception as e:
+            logger.warning(f"Unable to publish cache stats: {e}")
+
+    def reset(self):
+        with self._lock:
+            self._data = {}
+
+
+cache_stats = CacheStats()
+
+
+def collect_cache_stats():
+    """
+    Sums up the published counters of all workers.
+
+    Returns:
+        A dict of prefix to counters, including hit_ratio and avg_fill_time.
+    """
+    cache_stats.publish()
+    workers = cache.get(STATS_WORKERS_KEY) or []
+    snapshots = cache.get_many([f"{STATS_KEY_PREFIX}[{w}]" for w in workers])
+    result = {}
+    for snapshot in snapshots.values():
+        for prefix, counters in snapshot.items():
+            total = result.setdefault(prefix, dict.fromkeys(COUNTERS, 0))
+            for counter in COUNTERS:
+                if counter == "max_fill_time":
+                    total[counter] = max(total[counter], counters.get(counter, 0))
+                else:
+                    total[counter] += counters.get(counter, 0)
+    for counters in result.values():
+        lookups = (
+            counters["hits"]
+            + counters["local_hits"]
+            + counters["memo_hits"]
+            + counters["stale_hits"]
+            + counters["misses"]
+        )
+        counters["hit_ratio"] = (
+            round((lookups - counters["misses"]) / lookups, 4) if lookups else None
+        )
+        counters["avg_fill_time"] = (
+            round(counters["fill_time"] / counters["fills"], 6)
+            if counters["fill_time"]
+            else None
+        )
+        counters["avg_bytes"] = (
+            counters["bytes"] // counters["fills"] if counters["fills"] else None
+        )
+    return result
+
+
+def reset_cache_stats():
+    """
+    Drops the published counters of all workers. Workers keep counting from zero.
+
+    Database Operations:
+        Deletes cache_stats_workers and every cache_stats[<worker>] key, bumps cache_stats_generation.
+    """
+    workers = cache.get(STATS_WORKERS_KEY) or []
+    cache.delete_many(
+        [STATS_WORKERS_KEY] + [f"{STATS_KEY_PREFIX}[{w}]" for w in workers]
+    )
+    cache.set(STATS_GENERATION_KEY, time.time_ns(), timeout=None)
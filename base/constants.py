@@ -1,6 +1,8 @@
 TASK_TYPE_AUTO = "Auto"
 TASK_TYPE_FLOW = "Flow"
 TASK_TYPE_MANUAL = "Manual"
+TASK_TYPE_FORK = "Fork"
+TASK_TYPE_JOIN = "Join"
 TASK_TYPE_CHOICES = (
     (TASK_TYPE_AUTO, "Manual (task to created task instance by user manually)"),
     (
@@ -8,7 +10,17 @@ TASK_TYPE_CHOICES = (
         "Auto (task to created task instance by system workflow to auto detact the next task)",
     ),
     (TASK_TYPE_FLOW, "Flow Task (task to created task instance by system workflow)"),
+    (
+        TASK_TYPE_FORK,
+        "Fork (task to start the flow tasks of all the decision points matching the case in parallel)",
+    ),
+    (
+        TASK_TYPE_JOIN,
+        "Join (task to continue when all or join quorum of the parallel flow tasks are completed)",
+    ),
 )
+# task types evaluated by the workflow on the case data, their task instances are not assigned
+SYSTEM_TASK_TYPES = (TASK_TYPE_AUTO, TASK_TYPE_FORK, TASK_TYPE_JOIN)
 
 ROLE_CASE_OWNER = "Case Owner"
 
@@ -105,3 +117,44 @@ ROLE_MANAGER_GROUP_TYPE = [TEAM_MANAGER_ROLE_TYPE, DEPARTMENT_MANAGER_ROLE_TYPE]
 
 
 JSON_FORM_TEMPLATE_SCHEMA_PATH = r"\jsonForm\json_template_schema.json"
+
+
+# model labels the cached reference data depends on (cache tags, see base.cache)
+DICTIONARY_CACHE_TAGS = ["base.DictionaryModel", "base.DictionaryItemModel"]
+MODEL_DICTIONARY_CACHE_TAGS = [
+    "base.ModelDictionaryConfigModel",
+    "base.ModelDictionaryItemsConfigModel",
+    "jsonForm.FormSection",
+]
+GLOBAL_DICTIONARY_CACHE_TAGS = DICTIONARY_CACHE_TAGS + [
+    "userManagement.Company",
+    "userManagement.Department",
+    "userManagement.Team",
+    "userManagement.CustomUser",
+]
+MENU_CACHE_TAGS = [
+    "userManagement.AppMenu",
+    "userManagement.CustomGroup",
+    "userManagement.Permission",
+    "userManagement.Company",
+    "userManagement.Department",
+    "userManagement.Team",
+]
+USER_MENU_CACHE_TAGS = MENU_CACHE_TAGS + ["userManagement.CustomUser"]
+USER_INFO_CACHE_TAGS = [
+    "userManagement.CustomUser",
+    "userManagement.Company",
+    "userManagement.Department",
+    "userManagement.Team",
+]
+WORKFLOW_CACHE_TAGS = [
+    "jsonForm.Workflow",
+    "jsonForm.Task",
+    "jsonForm.DecisionPoint",
+    "userManagement.Permission",
+    "userManagement.CustomGroup",
+    # the graph reads the permission company, department and team (first support)
+    "userManagement.Company",
+    "userManagement.Department",
+    "userManagement.Team",
+]
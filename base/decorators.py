@@ -3,6 +3,7 @@ from base.models import ModelDictionaryConfigModel
 from userManagement.models import AppMenu
 from .util_model import get_dictionary
 from .util import get_model_class, get_object_or_redirect
+from .cache import cache_call, prefetch_cache
 from django.shortcuts import redirect
 from django.contrib import messages
 from jsonForm.models import FormTemplate
@@ -57,6 +58,7 @@ def case_decorator(func):
 
     Database Operations:
         - Read: AppMenu, FormTemplate, case_instance (various models)
+        - Cache: one get_many for the cached AppMenu and FormTemplate lookups
         - Conditional: Redirect based on permissions and context setup
 
     Tables Used:
@@ -75,9 +77,13 @@ def case_decorator(func):
                 context[key] = kwargs.get(key)
 
         app_name = kwargs.get("app_name", "")
-        message, context = __setup_app(request, context, app_name)
         form_code = kwargs.get("form_code", None)
         case_id = kwargs.get("case_id", None)
+        calls = [cache_call(AppMenu.get_app_instance_by_key, app_name)]
+        if form_code is not None:
+            calls.append(cache_call(FormTemplate.get_instance_by_code, form_code))
+        prefetch_cache(*calls)
+        message, context = __setup_app(request, context, app_name)
         if message is None:
             message, context = __setup_case_form(request, context, form_code, case_id)
             if message is None:
@@ -123,6 +129,7 @@ def model_decorator(func):
 
     Database Operations:
         - Read: AppMenu, ModelDictionaryConfigModel, model_instance (various models)
+        - Cache: one get_many for the cached AppMenu and ModelDictionaryConfigModel lookups
         - Conditional: Redirect based on context setup
 
     Tables Used:
@@ -141,9 +148,13 @@ def model_decorator(func):
                 context[key] = kwargs.get(key)
 
         app_name = kwargs.get("app_name", "")
-        message, context = __setup_app(request, context, app_name)
         model = kwargs.get("model", None)
         id = kwargs.get("id", None)
+        calls = [cache_call(AppMenu.get_app_instance_by_key, app_name)]
+        if model is not None:
+            calls.append(cache_call(ModelDictionaryConfigModel.get_details, model))
+        prefetch_cache(*calls)
+        message, context = __setup_app(request, context, app_name)
         if message is None:
             message, context = __setup_model(request, context, model, id)
             home_page = True
@@ -183,6 +194,7 @@ def model_unit_decorator(func):
 
     Database Operations:
         - Read: AppMenu, ModelDictionaryConfigModel, department, team
+        - Cache: one get_many for the cached AppMenu, ModelDictionaryConfigModel and unit lookups
         - Conditional: Redirect based on context setup
 
     Tables Used:
@@ -201,10 +213,18 @@ def model_unit_decorator(func):
                 context[key] = kwargs.get(key)
 
         app_name = kwargs.get("app_name", "")
-        message, context = __setup_app(request, context, app_name)
         model = kwargs.get("model", None)
         department = kwargs.get("department", "")
         team = kwargs.get("team", "")
+        calls = [
+            cache_call(AppMenu.get_app_instance_by_key, app_name),
+            cache_call(get_dictionary, "department_list_active"),
+            cache_call(get_dictionary, "team_list_active"),
+        ]
+        if model is not None:
+            calls.append(cache_call(ModelDictionaryConfigModel.get_details, model))
+        prefetch_cache(*calls)
+        message, context = __setup_app(request, context, app_name)
         if message is None:
             message, context = __setup_model(request, context, model)
             home_page = True
@@ -395,7 +415,7 @@ def __verify_case_permission(request, mini_app, case_instance):
 
 
 # model pages must has model
-def __setup_model(request, context, model, id):
+def __setup_model(request, context, model, id=None):
     """
     Set up the model context.
 
@@ -403,7 +423,7 @@ def __setup_model(request, context, model, id):
         request (HttpRequest): The HTTP request object.
         context (dict): The context dictionary to be modified.
         model (str): The model name.
-        id (int): The model instance ID.
+        id (int, optional): The model instance ID.
 
     Returns:
         tuple: A tuple containing a message (str) and the modified context (dict).
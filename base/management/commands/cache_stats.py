@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from base.cache import cache_entries
+from base.cache_stats import collect_cache_stats, reset_cache_stats
+import json
+
+
+class Command(BaseCommand):
+    help = "Shows cache hit/miss/fill statistics per cache key prefix, summed over all workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sort",
+            default="misses",
+            help="Counter to sort by (hits, misses, fill_time, bytes, hit_ratio, ...)",
+        )
+        parser.add_argument("--json", action="store_true", help="Print JSON")
+        parser.add_argument(
+            "--reset", action="store_true", help="Reset the counters of all workers"
+        )
+
+    def handle(self, *args, **options):
+        if options["reset"]:
+            reset_cache_stats()
+            self.stdout.write(self.style.SUCCESS("Cache stats reset"))
+            return
+
+        stats = collect_cache_stats()
+        for prefix, counters in stats.items():
+            entry = cache_entries.get(prefix)
+            counters["timeout"] = entry.timeout if entry is not None else None
+
+        if options["json"]:
+            self.stdout.write(json.dumps(stats, indent=2, sort_keys=True))
+            return
+
+        sort = options["sort"]
+        rows = sorted(
+            stats.items(), key=lambda item: item[1].get(sort) or 0, reverse=True
+        )
+        header = f"{'prefix':<40} {'hits':>8} {'l1':>8} {'memo':>8} {'stale':>6} {'misses':>8} {'ratio':>6} {'avg fill':>9} {'max fill':>9} {'avg bytes':>10} {'timeout':>8}"
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for prefix, c in rows:
+            ratio = f"{c['hit_ratio']:.2f}" if c["hit_ratio"] is not None else "-"
+            avg_fill = (
+                f"{c['avg_fill_time'] * 1000:.1f}ms"
+                if c["avg_fill_time"] is not None
+                else "-"
+            )
+            max_fill = f"{c['max_fill_time'] * 1000:.1f}ms"
+            avg_bytes = c["avg_bytes"] if c["avg_bytes"] is not None else "-"
+            timeout = c["timeout"] if c["timeout"] is not None else "-"
+            self.stdout.write(
+                f"{prefix[:40]:<40} {c['hits']:>8} {c['local_hits']:>8} {c['memo_hits']:>8} {c['stale_hits']:>6} {c['misses']:>8} {ratio:>6} {avg_fill:>9} {max_fill:>9} {avg_bytes:>10} {timeout:>8}"
+            )
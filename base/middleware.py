@@ -9,12 +9,37 @@ from django.db import transaction
 from django.http import Http404, HttpResponseForbidden, HttpResponseRedirect
 from django.urls import NoReverseMatch
 from .util import get_menu_key_in_list, normalized_url
-from django.core.cache import cache
+from .cache import (
+    cache_get,
+    cache_set,
+    end_request_memo,
+    make_cache_key,
+    start_request_memo,
+)
+from .constants import USER_MENU_CACHE_TAGS
 from django.conf import settings
 
 logger = logging.getLogger("django")
 
 
+class RequestCacheMiddleware:
+    """
+    Middleware to memoize cache lookups for the duration of a request, so a value
+    read several times (menus, dictionaries, app and form configs) costs one Redis
+    round trip, and to allow batching them with prefetch_cache.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = start_request_memo()
+        try:
+            return self.get_response(request)
+        finally:
+            end_request_memo(token)
+
+
 class MenuMiddleware:
     """
     Middleware to control menu display and access permissions based on user roles and permissions.
@@ -66,48 +91,18 @@ class MenuMiddleware:
         new_path = normalized_url(request.path)
 
         # Set up menu_tree, app_tree, current_page_menu, permission_list, and level_1_menu for the user.
-        cache_key = f"MenuMiddleware[:{user_info.get('id')}:{new_path}]"
-        data = cache.get(cache_key)
-
-        if data is not None:  # Retrieve from cache if available
-            request.app_tree = data.get("app_tree")
-            request.menu_tree = data.get("menu_tree")
-            request.current_page_menu = data.get("current_page_menu")
-            request.permission_list = data.get("permission_list")
-            request.level_1_menu = data.get("level_1_menu")
-        else:  # Build menu information and cache it
-            data = {}
-            app_tree, menu_tree = self.get_app_tree_for_user(request, user_info)
-            request.app_tree = app_tree
-            request.menu_tree = menu_tree
-            data["app_tree"] = app_tree
-            data["menu_tree"] = menu_tree
-
-            if request.path not in ("/", ""):
-                current_page_menu = self.get_current_page_menu_for_user(
-                    menu_tree, new_path
-                )
-                request.current_page_menu = current_page_menu
-                data["current_page_menu"] = current_page_menu
-
-                permission_list = self.get_permission_list(current_page_menu)
-                request.permission_list = permission_list
-                data["permission_list"] = permission_list
-
-                role_unit = current_page_menu.get("role_unit", [])
-                current_app_key = (
-                    role_unit[0].get("permission_role__app__key")
-                    if len(role_unit) > 0
-                    else None
-                )
-                level_1_menu = self.get_level_1_menu(
-                    request, app_tree, current_app_key, user_info
-                )
-
-                request.level_1_menu = level_1_menu
-                data["level_1_menu"] = level_1_menu
-
-            cache.set(cache_key, data, settings.CACHE_TIMEOUT_L3)
+        menu_index = self.get_menu_index(request, user_info)
+        request.app_tree = menu_index.get("app_tree")
+        request.menu_tree = menu_index.get("menu_tree")
+        if request.path not in ("/", ""):
+            page = self.get_current_page_menu_for_user(menu_index, new_path)
+            request.current_page_menu = page.get("menu", {})
+            request.permission_list = page.get("permission_list", [])
+            request.level_1_menu = page.get("level_1_menu")
+        else:
+            request.current_page_menu = None
+            request.permission_list = None
+            request.level_1_menu = None
 
         # Allow access to the home page.
         if request.path in ("/", ""):
@@ -155,29 +150,87 @@ class MenuMiddleware:
             menus = request.user.get_user_menu_tree()
         return apps, menus
 
-    def get_current_page_menu_for_user(self, menu_tree, new_path):
+    def get_menu_index(self, request, user_info):
         """
-        Finds the current page's menu item in the menu tree.
+        Retrieves the menu index of the user (see build_menu_index), from the cache when available.
+        There is one cache entry per user, invalidated with the user menus.
 
         Args:
-            menu_tree: The user's menu tree.
-            new_path: The normalized request path.
+            request: The request object.
+            user_info: The user info from the session.
 
         Returns:
-            The menu item dictionary or an empty dictionary if not found.
+            The menu index dictionary.
         """
+        if request.path.startswith("/admin") or user_info is None:
+            return {"app_tree": {}, "menu_tree": {}, "pages": {}}
+
+        cache_key = make_cache_key("menu_index", user_info.get("id"))
+        menu_index = cache_get(cache_key, local=True, tags=USER_MENU_CACHE_TAGS)
+        if menu_index is None:
+            menu_index = self.build_menu_index(request, user_info)
+            cache_set(
+                cache_key,
+                menu_index,
+                settings.CACHE_TIMEOUT_L4,
+                local=True,
+                tags=USER_MENU_CACHE_TAGS,
+            )
+        return menu_index
+
+    def build_menu_index(self, request, user_info):
+        """
+        Builds the menu index of the user: the app tree, the menu tree, and the pages the user
+        can access by normalized (lower case) link, each with its menu item, permission list
+        and level 1 menu, so the page of a request is found with a single lookup.
+
+        Args:
+            request: The request object.
+            user_info: The user info from the session.
+
+        Returns:
+            A dictionary with app_tree, menu_tree and pages.
+        """
+        app_tree, menu_tree = self.get_app_tree_for_user(request, user_info)
+        pages = {}
         for m in menu_tree:
             link = m.get("link")
-            if link and new_path == link.lower():
-                return m
-        return {}  # Return empty dictionary if not found
+            if not link or link.lower() in pages:  # the first menu of a link wins
+                continue
+            role_unit = m.get("role_unit", [])
+            app_key = (
+                role_unit[0].get("permission_role__app__key")
+                if len(role_unit) > 0
+                else None
+            )
+            pages[link.lower()] = {
+                "menu": m,
+                "permission_list": self.get_permission_list(m),
+                "level_1_menu": self.get_level_1_menu(
+                    link, app_tree, app_key, user_info
+                ),
+            }
+        return {"app_tree": app_tree, "menu_tree": menu_tree, "pages": pages}
+
+    def get_current_page_menu_for_user(self, menu_index, new_path):
+        """
+        Finds the current page in the menu index.
 
-    def get_level_1_menu(self, request, app_tree, app_key, user_info):
+        Args:
+            menu_index: The user's menu index.
+            new_path: The normalized request path.
+
+        Returns:
+            The page dictionary (menu, permission_list, level_1_menu) or an empty dictionary if not found.
         """
-        Retrieves the level 1 menu item (top-level app) based on the request path or app key.
+        return menu_index.get("pages", {}).get(new_path, {})
+
+    def get_level_1_menu(self, path, app_tree, app_key, user_info):
+        """
+        Retrieves the level 1 menu item (top-level app) based on the page path or app key.
 
         Args:
-            request: The request object.
+            path: The page path.
             app_tree: The user's app tree.
             app_key: The current app key.
 
@@ -185,9 +238,7 @@ class MenuMiddleware:
             The level 1 menu item dictionary or None.
         """
         if user_info.get("is_superuser", False):
-            return next(
-                (m for m in app_tree if f"/{m.get('key')}/" in request.path), None
-            )
+            return next((m for m in app_tree if f"/{m.get('key')}/" in path), None)
         elif app_key:
             return next((m for m in app_tree if m.get("key") == app_key), None)
         return None
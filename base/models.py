@@ -5,6 +5,7 @@ from django.apps import apps
 from .cache import global_class_cache_decorator
 from .util import get_object_or_redirect
 from .validators import get_validator
+from .constants import DICTIONARY_CACHE_TAGS, MODEL_DICTIONARY_CACHE_TAGS
 import uuid
 from django.db.models import F, Q
 from django.conf import settings
@@ -100,24 +101,40 @@ class DictionaryModel(BaseAuditModel):
         return "%s (%s)" % (self.code, self.description)
 
     @global_class_cache_decorator(
-        cache_key="dictionary", timeout=settings.CACHE_TIMEOUT_L3
+        cache_key="dictionary",
+        timeout=settings.CACHE_TIMEOUT_L4,
+        local=True,
+        tags=DICTIONARY_CACHE_TAGS,
+        compact=True,
     )
     def get_dictionary_items_by_code(cls, code):
         instance = get_object_or_redirect(cls, code=code)
         if instance is None:
             return []
         else:
-            return instance.dictionary_item_dictionary.all()
+            return list(
+                instance.dictionary_item_dictionary.values(
+                    *DictionaryItemModel.list_fields
+                )
+            )
 
     @global_class_cache_decorator(
-        cache_key="dictionary_active", timeout=settings.CACHE_TIMEOUT_L3
+        cache_key="dictionary_active",
+        timeout=settings.CACHE_TIMEOUT_L4,
+        local=True,
+        tags=DICTIONARY_CACHE_TAGS,
+        compact=True,
     )
     def get_dictionary_active_items_by_code(cls, code):
         instance = get_object_or_redirect(cls, code=code, is_active=True)
         if instance is None:
             return []
         else:
-            return instance.dictionary_item_dictionary.filter(is_active=True)
+            return list(
+                instance.dictionary_item_dictionary.filter(is_active=True).values(
+                    *DictionaryItemModel.list_fields
+                )
+            )
 
 
 class DictionaryItemModel(BaseAuditModel):
@@ -137,6 +154,16 @@ class DictionaryItemModel(BaseAuditModel):
         blank=True,
     )
     is_active = models.BooleanField(default=True)
+    # fields of the cached dictionary item lists, see DictionaryModel.get_dictionary_items_by_code
+    list_fields = [
+        "id",
+        "dictionary_id",
+        "value",
+        "code",
+        "category",
+        "sub_category_id",
+        "is_active",
+    ]
 
     def __str__(self) -> str:
         return "%s - %s" % (self.dictionary, self.value)
@@ -157,7 +184,10 @@ class DictionaryItemModel(BaseAuditModel):
 
     @global_class_cache_decorator(
         cache_key="dictionary_item_map_active_by_code",
-        timeout=settings.CACHE_TIMEOUT_L3,
+        timeout=settings.CACHE_TIMEOUT_L4,
+        local=True,
+        tags=DICTIONARY_CACHE_TAGS,
+        compact=True,
     )
     def get_active_dictionary_item_map_by_code(cls, code):
         queryset = cls.objects.filter(
@@ -400,7 +430,11 @@ class ModelDictionaryConfigModel(BaseAuditModel):
             "edit_fieldsets": {f[0]: f[1] for f in self.get_edit_fieldsets()},
         }
 
-    @global_class_cache_decorator(cache_key="model_dict")
+    @global_class_cache_decorator(
+        cache_key="model_dict",
+        timeout=settings.CACHE_TIMEOUT_L4,
+        tags=MODEL_DICTIONARY_CACHE_TAGS,
+    )
     def get_details(cls, code):
         instance = get_object_or_redirect(cls, code=code)
         if instance is None:
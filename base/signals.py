@@ -1,8 +1,9 @@
-from django.db.models.signals import post_save, pre_save
-from django.db import models
+from django.db.models.signals import post_save, pre_save, post_delete, m2m_changed
+from django.db import models, transaction
 from django.dispatch import receiver
 from .models import ModelDictionaryConfigModel, ModelDictionaryItemsConfigModel
 from django.db.models.signals import post_migrate
+from base.cache import invalidate_cache_tags, is_cache_tag
 from base.util import get_related_names_for_model, CustomJSONEncoder
 import json
 import logging
@@ -181,6 +182,36 @@ def model_dictionary_saved(sender, instance, created, **kwargs):
 #  for example, what to do if table removed, what to do if add new fields or delete existed fields (FK or not FK), something for the related models configed in ModelDictionaryConfigModel
 
 
+@receiver(post_save)
+@receiver(post_delete)
+def cache_tag_model_changed(sender, **kwargs):
+    """
+    Invalidates the cache entries tagged with the label of the saved/deleted model,
+    once the transaction is committed: bumped before, another worker could cache the
+    rows still committed under the new tag version.
+    Login only touches last_login, which no cache entry depends on.
+    """
+    update_fields = kwargs.get("update_fields")
+    if update_fields is not None and set(update_fields) <= {"last_login"}:
+        return
+    label = sender._meta.label
+    if is_cache_tag(label):
+        transaction.on_commit(lambda: invalidate_cache_tags(label))
+
+
+@receiver(m2m_changed)
+def cache_tag_m2m_changed(sender, instance, action, model, **kwargs):
+    if not action.startswith("post_"):
+        return
+    tags = [
+        label
+        for label in {instance._meta.label, model._meta.label}
+        if is_cache_tag(label)
+    ]
+    if len(tags) > 0:
+        transaction.on_commit(lambda: invalidate_cache_tags(*tags))
+
+
 @receiver(post_migrate)
 def execute_after_migrate(sender, **kwargs):
     objects = ModelDictionaryConfigModel.objects.filter(is_active=True)
@@ -14,6 +14,11 @@ urlpatterns = [
         views_apis.get_dictionary_view,
         name="global_dictionary_view",
     ),  # global:global_dictionary_view
+    path(
+        "global/cache-stats",
+        views_apis.get_cache_stats_view,
+        name="global_cache_stats_view",
+    ),
     # path('forms/workflow/<uuid:workflow_id>-filter', workflow_data, name='workflow_data'),# match with jsonForm:workflow_view
     # for case
     path(
@@ -1,7 +1,7 @@
 import json
 from jsonschema import validate, ValidationError
 import uuid
-from datetime import date, datetime
+from datetime import date, datetime, time
 from django.core.mail import EmailMessage
 from django.conf import settings
 from django.core.files import File
@@ -16,16 +16,33 @@ import re
 import logging
 from django.db.models import Q
 from django.shortcuts import redirect
-from django.http import JsonResponse, HttpResponseRedirect, Http404
+from django.http import HttpResponse, JsonResponse, HttpResponseRedirect, Http404
 from django.forms.models import model_to_dict
 from django.shortcuts import get_object_or_404
 from functools import reduce
-from django.core.paginator import Paginator
-from .cache import global_cache_decorator
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F, JSONField
+from django.db.models.constants import LOOKUP_SEP
+from django.db import connections
+from django.core.exceptions import EmptyResultSet
+import hashlib
+from .cache import (
+    cache_get,
+    cache_set,
+    global_cache_decorator,
+    is_cache_tag,
+    make_cache_key,
+)
 from django.urls import get_resolver
 from django.urls.resolvers import URLPattern, URLResolver
 import re
 
+try:
+    import orjson
+except ImportError:  # fall back to the standard library
+    orjson = None
+
 logger = logging.getLogger("django")
 
 class CustomJSONEncoder(json.JSONEncoder):
@@ -58,6 +75,75 @@ class CustomJSONEncoder(json.JSONEncoder):
             return ""
         return super().default(obj)
 
+
+def to_json_value(obj):
+    """
+    Convert a value to its JSON value, the same way as CustomJSONEncoder.
+
+    Args:
+        obj (any): The value, e.g. a value of a queryset.values() row.
+
+    Returns:
+        any: A str (datetime, date, uuid, lazy string), a float (Decimal), or the value itself.
+
+    Database Operations:
+        None
+    """
+    if isinstance(obj, datetime):
+        return obj.strftime("%m/%d/%Y %H:%M:%S")
+    if isinstance(obj, date):
+        return obj.strftime("%m/%d/%Y")
+    if isinstance(obj, time):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, Promise):
+        return str(obj)
+    return obj
+
+
+def _orjson_default(obj):
+    value = to_json_value(obj)
+    if value is obj:
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+    return value
+
+
+def json_dumps(data):
+    """
+    Serialize data to JSON bytes in one pass, with orjson when it is installed (the
+    values are formatted like CustomJSONEncoder).
+
+    Args:
+        data (any): The data to serialize.
+
+    Returns:
+        bytes: The JSON document.
+
+    Database Operations:
+        None
+    """
+    if orjson is not None:
+        return orjson.dumps(
+            data,
+            default=_orjson_default,
+            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+        )
+    return json.dumps(data, cls=CustomJSONEncoder).encode("utf-8")
+
+
+class FastJSONResponse(HttpResponse):
+    """
+    A JSON response written once with json_dumps, for the data endpoints (instead of
+    json.dumps/json.loads and a JsonResponse or DRF Response encoding the data again).
+    """
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(content=json_dumps(data), **kwargs)
+
 def save_form_data_to_json(form):
     """
     Save form data to JSON format.
@@ -327,13 +413,16 @@ def extract_datatables_search_panes_parameters(post_data):
             extracted_params[field][index].append(value)
     return extracted_params
 
-def extract_datatables_search_builder_parameters(post_data, search_builder_logic):
+def extract_datatables_search_builder_parameters(
+    post_data, search_builder_logic, lookups: dict = None
+):
     """
     Extract search builder parameters from DataTables post data.
 
     Args:
         post_data (QueryDict): The post data.
         search_builder_logic (str): The search builder logic.
+        lookups (dict): The queryset lookups of the fields that are not filtered on their own name.
 
     Returns:
         Q: The Q object representing the search conditions.
@@ -344,6 +433,7 @@ def extract_datatables_search_builder_parameters(post_data, search_builder_logic
     field_name = post_data.get("searchBuilder[criteria][0][origData]", None)
     i = 0
     q_objects = Q()  # Initialize an empty Q object
+    lookups = lookups or {}
     while field_name is not None:
         operator = post_data.get(f"searchBuilder[criteria][{i}][condition]", None)
         value = post_data.get(f"searchBuilder[criteria][{i}][value1]", "")
@@ -352,6 +442,7 @@ def extract_datatables_search_builder_parameters(post_data, search_builder_logic
         logger.debug(
             f"field_name:{field_name};condition:{operator};value1:{value};value2:{value2};data_type:{data_type}"
         )
+        field_name = lookups.get(field_name, field_name)
         # Dynamically build the query lookup
         if operator == "!null":
             q_objects &= Q(**{f"{field_name}__isnull": False})
@@ -395,7 +486,14 @@ def extract_datatables_search_builder_parameters(post_data, search_builder_logic
 
     return q_objects
 
-def set_datatables_response(request, queryset, fields: list, search_keys: list):
+def set_datatables_response(
+    request,
+    queryset,
+    fields: list,
+    search_keys: list,
+    lookups: dict = None,
+    search=None,
+):
     """
     Set the response for DataTables.
 
@@ -404,9 +502,22 @@ def set_datatables_response(request, queryset, fields: list, search_keys: list):
         queryset (QuerySet): The queryset to paginate.
         fields (list): List of fields to include in the response.
         search_keys (list): List of fields to search.
+        lookups (dict): The lookups used to search and sort fields instead of their
+            name, e.g. the indexed column of a section data key (see jsonForm.projections).
+        search (callable): Returns the Q of the rows matching the search value, in
+            addition to the search keys, e.g. the full-text search of the cases (see
+            jsonForm.search.search_cases).
+
+    Pages are read with an offset, or with a cursor (keyset pagination) when the
+    request sends the cursor_next or cursor_prev of the previous response "cursors"
+    for the page next to it: the rows after (or before) the last (or first) row of
+    the previous page in the (order column, pk) order, and the counts of the first
+    page are reused, so the next pages of a large table cost the same as the first.
 
     Returns:
-        dict: The response data.
+        dict: The response data, with the "cursors" of the next and previous pages
+            when the order column can be used for keyset pagination, to return with
+            FastJSONResponse.
 
     Database Operations:
         Read: Various models
@@ -417,44 +528,379 @@ def set_datatables_response(request, queryset, fields: list, search_keys: list):
 
     search_value = request.POST.get("search[value]", None)
     search_builder_logic = request.POST.get("searchBuilder[logic]", None)
+    lookups = lookups or {}
+
+    # the total of the rows before filtering, cached per queryset (the user scope)
+    records_total, estimated = get_datatables_total(queryset)
+    filtered = False
 
     # 处理过滤
     if search_value:
         conditions = reduce(
-            lambda x, y: x | Q(**{f"{y}__icontains": search_value}), search_keys, Q()
+            lambda x, y: x
+            | Q(**{f"{lookups.get(y, y)}__icontains": search_value}),
+            search_keys,
+            Q() if search is None else search(search_value),
         )
         queryset = queryset.filter(conditions)
+        filtered = True
     if search_builder_logic is not None:
         q_objects = extract_datatables_search_builder_parameters(
-            request.POST, search_builder_logic
+            request.POST, search_builder_logic, lookups
         )
-        queryset = queryset.filter(q_objects)
+        if q_objects:
+            queryset = queryset.filter(q_objects)
+            filtered = True
 
     # 处理排序
     order_column = request.POST.get("order[0][column]", None)
-    order_by = None
+    order_lookup = None
+    ascending = True
     if order_column is not None:
-        order_column_name = fields[int(order_column)]
-        order_direction = request.POST.get("order[0][dir]", "asc")
-        order_by = (
-            order_column_name if order_direction == "asc" else f"-{order_column_name}"
-        )
-        queryset = queryset.order_by(order_by)
+        order_lookup = fields[int(order_column)]
+        order_lookup = lookups.get(order_lookup, order_lookup)
+        ascending = request.POST.get("order[0][dir]", "asc") == "asc"
+        queryset = queryset.order_by(*get_keyset_ordering(order_lookup, ascending))
 
     logger.debug(queryset.query)
 
     # 处理分页
-    paginator = Paginator(queryset.values(*fields), request.POST.get("length", 10))
-    page_number = start // length + 1
-    page = paginator.get_page(page_number)
+    keyset = order_lookup is not None and is_keyset_lookup(queryset.model, order_lookup)
+    values = queryset.values(*fields)
+    if keyset:
+        values = values.annotate(cursor_value=F(order_lookup), cursor_pk=F("pk"))
+    signature = get_datatables_signature(request)
+    cursor = get_datatables_cursor(request, start, signature) if keyset else None
+    if cursor is not None:
+        # seek from the row before (next page) or after (previous page) the page
+        forward = cursor["forward"]
+        rows = list(
+            values.filter(
+                get_keyset_filter(
+                    order_lookup,
+                    ascending == forward,
+                    cursor["value"],
+                    cursor["pk"],
+                )
+            ).order_by(*get_keyset_ordering(order_lookup, ascending == forward))[
+                :length
+            ]
+        )
+        if not forward:
+            rows.reverse()
+        records_total, records_filtered = cursor["total"], cursor["filtered"]
+        estimated = cursor.get("estimated", False)
+    else:
+        records_filtered = records_total
+        if filtered:
+            # counted exactly, the plan estimate of a search predicate (icontains,
+            # JSON keys) can be off by orders of magnitude
+            records_filtered = queryset.count()
+        if records_filtered > 0 and start >= records_filtered:  # the last page
+            start = (records_filtered - 1) // length * length
+        rows = list(values[start : start + length])
+
+    response = {
+        "recordsTotal": records_total,
+        "recordsFiltered": records_filtered,
+        "recordsEstimated": estimated,
+    }
+    if keyset:
+        cursors = {"next": None, "prev": None}
+        boundaries = [(row.pop("cursor_value"), row.pop("cursor_pk")) for row in rows]
+        if len(rows) == length and start + length < records_filtered:
+            cursors["next"] = encode_datatables_cursor(
+                start + length, True, boundaries[-1], signature, response
+            )
+        if len(rows) > 0 and start >= length:
+            cursors["prev"] = encode_datatables_cursor(
+                start - length, False, boundaries[0], signature, response
+            )
+        response["cursors"] = cursors
 
-    data = json.dumps(list(page), cls=CustomJSONEncoder)
+    response["data"] = rows  # serialized once by FastJSONResponse
+    return response
+
+
+def count_queryset(queryset):
+    """
+    Count the rows of a queryset, or estimate it from the query plan on PostgreSQL
+    when it is over DATATABLES_COUNT_ESTIMATE_THRESHOLD rows, as an exact COUNT reads
+    every row. Only used for the unfiltered total: the planner estimates the rows of
+    a table from its statistics, not the rows matching a search.
+
+    Args:
+        queryset (QuerySet): The queryset to count.
+
+    Returns:
+        tuple: The number of rows, and True if it is an estimate.
+
+    Database Operations:
+        Read: EXPLAIN of the queryset (PostgreSQL), then COUNT when it is under the threshold
+    """
+    threshold = getattr(settings, "DATATABLES_COUNT_ESTIMATE_THRESHOLD", None)
+    connection = connections[queryset.db]
+    if threshold and connection.vendor == "postgresql":
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            return 0, False
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        # the planner estimate comes from the table statistics (pg_class.reltuples)
+        estimate = int(plan[0]["Plan"]["Plan Rows"])
+        if estimate >= threshold:
+            return estimate, True
+    return queryset.count(), False
+
+
+def get_datatables_total(queryset):
+    """
+    Get the number of rows of an unfiltered DataTables queryset, cached for
+    DATATABLES_TOTAL_CACHE_TIMEOUT seconds. The key is the SQL of the queryset, so
+    each user scope (the permission filters of the view) has its own entry, and the
+    entry is tagged with the models of the tables the queryset reads. It is only
+    cached when all of them are registered cache tags (e.g. the case models, see
+    jsonForm/apps.py), as a save only invalidates the registered tags.
+
+    Args:
+        queryset (QuerySet): The queryset, before the DataTables search.
+
+    Returns:
+        tuple: The number of rows, and True if it is an estimate (see count_queryset).
+
+    Database Operations:
+        Read: COUNT of the queryset, when it is not cached
+    """
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return 0, False
+    key = make_cache_key(
+        "datatables_total",
+        hashlib.blake2b(f"{sql} {params!r}".encode("utf-8"), digest_size=16).hexdigest(),
+    )
+    tags = get_queryset_tags(queryset)
+    if not all(is_cache_tag(tag) for tag in tags):
+        return count_queryset(queryset)
+    total = cache_get(key, tags=tags)
+    if total is None:
+        total = count_queryset(queryset)
+        cache_set(
+            key,
+            total,
+            timeout=getattr(settings, "DATATABLES_TOTAL_CACHE_TIMEOUT", 60),
+            tags=tags,
+        )
+    return tuple(total)
+
+
+def get_queryset_tags(queryset):
+    """
+    Get the labels of the models of the tables joined by a queryset. The automatic
+    many-to-many tables are left out, their changes invalidate the tags of both
+    related models (see base/signals.py).
+    """
+    models_by_table = {m._meta.db_table: m for m in apps.get_models()}
+    tags = set()
+    for join in queryset.query.alias_map.values():
+        model = models_by_table.get(join.table_name)
+        if model is not None and not model._meta.auto_created:
+            tags.add(model._meta.label)
+    tags.add(queryset.model._meta.label)
+    return sorted(tags)
+
+
+def is_keyset_lookup(model, lookup):
+    """
+    Check if a queryset can be paginated with a cursor on a lookup: the lookup is a
+    model field, through relations, and not a key of a JSON field.
+
+    Args:
+        model (Model): The model of the queryset.
+        lookup (str): The order lookup, e.g. "case__created_at".
+
+    Returns:
+        bool: True if the keyset pagination can be used.
+
+    Database Operations:
+        None
+    """
+    for part in lookup.split(LOOKUP_SEP):
+        if model is None:
+            return False
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            return False
+        if isinstance(field, JSONField):
+            return False
+        model = field.related_model if field.is_relation else None
+    return True
+
+
+def get_keyset_ordering(lookup, ascending):
+    """
+    Get the order of a DataTables queryset: the lookup, with NULL values as the
+    largest on every database, then the pk, so the order is total and the pages (and
+    the cursors) are stable.
+
+    Args:
+        lookup (str): The order lookup.
+        ascending (bool): The direction of the order.
+
+    Returns:
+        tuple: The order_by arguments.
+
+    Database Operations:
+        None
+    """
+    if ascending:
+        return F(lookup).asc(nulls_last=True), "pk"
+    return F(lookup).desc(nulls_first=True), "-pk"
+
+
+def get_keyset_filter(lookup, ascending, value, pk):
+    """
+    Get the rows after a row in the (lookup, pk) order, where NULL values are the
+    largest (nulls last ascending, first descending).
+
+    Args:
+        lookup (str): The order lookup.
+        ascending (bool): The direction of the order.
+        value: The lookup value of the row.
+        pk: The pk of the row.
+
+    Returns:
+        Q: The Q object of the rows after the row.
+
+    Database Operations:
+        None
+    """
+    after = "gt" if ascending else "lt"
+    if value is None:
+        q = Q(**{f"{lookup}__isnull": True, f"pk__{after}": pk})
+        return q if ascending else q | Q(**{f"{lookup}__isnull": False})
+    q = Q(**{f"{lookup}__{after}": value}) | Q(**{lookup: value, f"pk__{after}": pk})
+    return q | Q(**{f"{lookup}__isnull": True}) if ascending else q
+
+
+class _CursorEncoder(json.JSONEncoder):
+    # the exact order value (DjangoJSONEncoder would round the microseconds)
+    def default(self, obj):
+        if isinstance(obj, (date, datetime, time)):
+            return obj.isoformat()
+        if isinstance(obj, (Decimal, uuid.UUID)):
+            return str(obj)
+        return super().default(obj)
+
+
+class _CursorSerializer:
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(",", ":"), cls=_CursorEncoder).encode(
+            "latin-1"
+        )
+
+    def loads(self, data):
+        return json.loads(data.decode("latin-1"))
+
+
+def get_datatables_signature(request):
+    """
+    Get the signature of a DataTables request without its page: the path, the page
+    length, the order and the filters. A cursor is only used by the requests with
+    the signature it was created for.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        str: The signature.
+
+    Database Operations:
+        None
+    """
+    params = sorted(
+        (key, value)
+        for key, values in request.POST.lists()
+        if key not in ("draw", "start", "cursor_next", "cursor_prev")
+        for value in values
+    )
+    return hashlib.blake2b(
+        repr((request.path, params)).encode("utf-8"), digest_size=16
+    ).hexdigest()
+
+
+def encode_datatables_cursor(start, forward, row, signature, counts):
+    """
+    Encode an opaque (signed) cursor of the next or previous page of a DataTables
+    response.
+
+    Args:
+        start (int): The start of the page the cursor leads to.
+        forward (bool): True for the next page, False for the previous page.
+        row (tuple): The (order value, pk) of the last row (next page) or first row (previous page) of the current page.
+        signature (str): The signature of the request, see get_datatables_signature.
+        counts (dict): The recordsTotal, recordsFiltered and recordsEstimated, reused by the pages read with the cursor.
+
+    Returns:
+        str: The cursor.
+
+    Database Operations:
+        None
+    """
+    return signing.dumps(
+        {
+            "start": start,
+            "forward": forward,
+            "value": row[0],
+            "pk": row[1],
+            "signature": signature,
+            "total": counts["recordsTotal"],
+            "filtered": counts["recordsFiltered"],
+            "estimated": counts["recordsEstimated"],
+        },
+        salt="datatables-cursor",
+        serializer=_CursorSerializer,
+        compress=True,
+    )
+
+
+def get_datatables_cursor(request, start, signature):
+    """
+    Get the cursor sent with a DataTables request (cursor_next or cursor_prev, from
+    the "cursors" of the previous response) that leads to the requested page.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+        start (int): The requested start.
+        signature (str): The signature of the request.
+
+    Returns:
+        dict: The decoded cursor, or None to read the page with an offset (first
+            request, jump to an arbitrary page, or order and filters changed).
+
+    Database Operations:
+        None
+    """
+    for key in ("cursor_next", "cursor_prev"):
+        value = request.POST.get(key, None)
+        if not value:
+            continue
+        try:
+            cursor = signing.loads(
+                value, salt="datatables-cursor", serializer=_CursorSerializer
+            )
+        except signing.BadSignature:
+            logger.warning(f"Invalid DataTables cursor {key}")
+            continue
+        if cursor.get("start") == start and cursor.get("signature") == signature:
+            return cursor
+    return None
 
-    return {
-        "recordsTotal": queryset.count(),
-        "recordsFiltered": paginator.count,
-        "data": json.loads(data),
-    }
 
 def no_permission_redirect(request, path=None, message=None):
     """
@@ -672,10 +1118,17 @@ def validate_json_with_schema(json_data, schema):
     except ValidationError as e:
         return e.message
 
-@global_cache_decorator(cache_key="normalized_url", timeout=settings.CACHE_TIMEOUT_L3)
+# "/api" prefix of the API urls, normalized_url maps them to the page url
+API_PATH_PREFIX = re.compile(r"^/api(?=/|$)")
+
+
 def normalized_url(path):
     """
-    Normalize a URL path.
+    Normalize a URL path to match menu links: lower case, without the "/api" prefix and,
+    for filter urls (ending with "-filter"), without the filter segments.
+
+    This runs on every request (see MenuMiddleware), so it is a plain string transform,
+    not cached.
 
     Args:
         path (str): The URL path.
@@ -687,20 +1140,16 @@ def normalized_url(path):
         None
     """
     path = path.lower() if path is not None else ""
-    new_path = ""
-    if path.startswith("/api"):
-        path = path.replace("/api", "")
+    path = API_PATH_PREFIX.sub("", path, count=1)
     if path.endswith("-filter"):
-        path_split = path.split("/")
-        for p in path_split:
-            if not p.endswith("-filter") and p != "":
-                new_path = f"{new_path}/{p}"
-
-    if new_path == "":
-        new_path = path
-    return new_path
-
-@global_cache_decorator(cache_key="csoa_app_list", timeout=settings.CACHE_TIMEOUT_L3)
+        segments = [p for p in path.split("/") if p != "" and not p.endswith("-filter")]
+        if len(segments) > 0:
+            return "/" + "/".join(segments)
+    return path
+
+@global_cache_decorator(
+    cache_key="csoa_app_list", timeout=settings.CACHE_TIMEOUT_L3, local=True
+)
 def get_app_list():
     """
     Get the list of installed apps.
@@ -717,7 +1166,9 @@ def get_app_list():
         app_list.add(app._meta.app_label)
     return list(app_list)
 
-@global_cache_decorator(cache_key="csoa_model_list", timeout=settings.CACHE_TIMEOUT_L3)
+@global_cache_decorator(
+    cache_key="csoa_model_list", timeout=settings.CACHE_TIMEOUT_L3, local=True
+)
 def get_model_list():
     """
     Get the list of models in installed apps.
@@ -6,10 +6,14 @@ from django.db.models.fields.related import ForeignKey, ManyToManyField, OneToOn
 from django.conf import settings
 from django.db.models import F, Q
 from .util import get_app_list, get_model_list
+from .constants import GLOBAL_DICTIONARY_CACHE_TAGS
 
 
 @global_cache_decorator(
-    cache_key="global_select_choices", timeout=settings.CACHE_TIMEOUT_L3
+    cache_key="global_select_choices",
+    timeout=settings.CACHE_TIMEOUT_L4,
+    local=True,
+    tags=GLOBAL_DICTIONARY_CACHE_TAGS,
 )
 def get_select_choices(key):
     data = get_dictionary(key)
@@ -45,7 +49,10 @@ def get_select_choices(key):
 
 
 @global_cache_decorator(
-    cache_key="global_select_choices_ids", timeout=settings.CACHE_TIMEOUT_L3
+    cache_key="global_select_choices_ids",
+    timeout=settings.CACHE_TIMEOUT_L4,
+    local=True,
+    tags=GLOBAL_DICTIONARY_CACHE_TAGS,
 )
 def get_select_choices_ids(key):
     data = get_dictionary(key)
@@ -74,7 +81,14 @@ def get_select_choices_ids(key):
     return result
 
 
-@global_cache_decorator(cache_key="global_dict", timeout=settings.CACHE_TIMEOUT_L3)
+@global_cache_decorator(
+    cache_key="global_dict",
+    timeout=settings.CACHE_TIMEOUT_L4,
+    local=True,
+    tags=GLOBAL_DICTIONARY_CACHE_TAGS,
+    single_flight=True,
+    compact=True,
+)
 def get_dictionary(key):
     data = None
     if key == "department_list_active":
@@ -114,7 +128,12 @@ def get_dictionary(key):
 
 
 @global_cache_decorator(
-    cache_key="global_dictionary_item_map", timeout=settings.CACHE_TIMEOUT_L3
+    cache_key="global_dictionary_item_map",
+    timeout=settings.CACHE_TIMEOUT_L4,
+    local=True,
+    tags=GLOBAL_DICTIONARY_CACHE_TAGS,
+    single_flight=True,
+    compact=True,
 )
 def get_dictionary_item_map(key):
     data = None
@@ -259,7 +278,10 @@ def get_dictionary_item_map(key):
 
 
 @global_cache_decorator(
-    cache_key="global_select_choices_from_map", timeout=settings.CACHE_TIMEOUT_L3
+    cache_key="global_select_choices_from_map",
+    timeout=settings.CACHE_TIMEOUT_L4,
+    local=True,
+    tags=GLOBAL_DICTIONARY_CACHE_TAGS,
 )
 def get_select_choices_from_map(map_name, map_field_key, map_field_value=None):
     data = get_dictionary_item_map(map_name)
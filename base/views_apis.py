@@ -1,6 +1,4 @@
 from .util_model import get_select_choices, get_dictionary, get_dictionary_item_map
-from .util import CustomJSONEncoder
-import json
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -9,7 +7,7 @@ from rest_framework.decorators import api_view
 from .decorators import case_decorator
 from django.db.models import Q
 from .util import (
-    CustomJSONEncoder,
+    FastJSONResponse,
     set_datatables_response,
     no_permission_redirect,
     get_model_class,
@@ -17,7 +15,10 @@ from .util import (
 )
 from jsonForm.models import FormTemplate, Workflow
 from .models import FileModel
+from .cache_stats import collect_cache_stats
 from jsonForm import util as formUtil
+from jsonForm.projections import get_projection_lookups
+from jsonForm.search import search_cases
 from django.db.models.functions import Coalesce, Cast
 from django.db.models import TextField
 from userManagement.models import AppMenu
@@ -40,8 +41,21 @@ def get_dictionary_view(request, type, key):
         data = get_dictionary_item_map(key)
     else:
         data = []
-    dictionary_data = json.dumps(data, cls=CustomJSONEncoder)
-    return Response({"data": json.loads(dictionary_data)})
+    return FastJSONResponse({"data": data})
+
+
+@api_view(["GET"])
+def get_cache_stats_view(request):
+    """
+    Cache hit/miss/fill statistics per cache key prefix, summed over all workers.
+    Only available to superusers.
+    """
+    if not request.user.is_superuser:
+        return Response(
+            {"message": "No permission to view cache stats"},
+            status=status.HTTP_403_FORBIDDEN,
+        )
+    return Response({"data": collect_cache_stats()})
 
 
 @api_view(["POST"])
@@ -108,8 +122,14 @@ def get_my_cases_view_data(request, app_name, type):
     else:
         return JsonResponse({"message": "Page not Found"}, status=404)
     field_keys = list(fields.keys())
-    response_data = set_datatables_response(request, cases, field_keys, field_keys)
-    return Response(response_data)  # JsonResponse(response_data, safe=True)
+    response_data = set_datatables_response(
+        request,
+        cases,
+        field_keys,
+        field_keys,
+        search=lambda value: search_cases(model_class, value),
+    )
+    return FastJSONResponse(response_data)
 
 
 @api_view(["POST"])
@@ -194,15 +214,23 @@ def get_cases_search_by_form_view_data(
     fields = case_data_class.selected_fields_info()
     headers = FormTemplate.get_headers_by_code(form_code)
     # to control form template that has more than one section
-    search_keys = []
     for h in headers:
         if h["index"] == index:
             fields[f"section_data__{h['key']}"] = h["label"]
-            search_keys.append(f"section_data__{h['key']}")
     field_names = list(fields.keys())
-    response_data = set_datatables_response(request, queryset, field_names, search_keys)
-    # return JsonResponse(response_data, safe=True)
-    return Response(response_data)
+    # sort and search builder on the indexed columns of the projection of the section data, if any
+    lookups = get_projection_lookups(form.pk, index)
+    # the search box uses the full-text search document of the case instead of the section data keys
+    case_class = case_data_class._meta.get_field("case").related_model
+    response_data = set_datatables_response(
+        request,
+        queryset,
+        field_names,
+        [],
+        lookups,
+        search=lambda value: search_cases(case_class, value, "case"),
+    )
+    return FastJSONResponse(response_data)
 
 
 @api_view(["GET"])
@@ -239,15 +267,13 @@ def get_case_details_history_json(request, context, app_name, form_code, case_id
     form = context["form"]
     case_instance = context["case_instance"]
     data = formUtil.get_case_audit_history(case_instance)
-    data_json = json.dumps(data, cls=CustomJSONEncoder)
     records_total = len(data)
     response_data = {
         "recordsTotal": records_total,
         "recordsFiltered": records_total,
-        "data": json.loads(data_json),
+        "data": data,
     }
-    return Response(response_data)
-    # return JsonResponse(response_data, safe=True)
+    return FastJSONResponse(response_data)
 
 
 @api_view(["POST"])
@@ -272,15 +298,14 @@ def get_case_details_documents_json(request, context, app_name, form_code, case_
             .order_by("-created_at")
             .values(*fields)
         )
-        data_json = json.dumps(list(data), cls=CustomJSONEncoder)
+        data = list(data)
         records_total = len(data)
     else:
-        data_json = "{}"
+        data = {}
         records_total = 0
     response_data = {
         "recordsTotal": records_total,
         "recordsFiltered": records_total,
-        "data": json.loads(data_json),
+        "data": data,
     }
-    return Response(response_data)
-    # return JsonResponse(response_data, safe=True)
+    return FastJSONResponse(response_data)
@@ -6,6 +6,7 @@ from jsonForm.models import FormTemplate, Workflow
 from userManagement.models import AppMenu
 from jsonForm.forms import create_dynamic_task_instance_form
 from jsonForm import util as formUtil
+from jsonForm.CaseTransitionService import CaseTransitionService
 from .models import FileModel
 
 # from jsonForm.tables import create_dynamic_case_table_class, create_dynamic_case_data_table_class, create_dynamic_case_data_filter
@@ -25,10 +26,11 @@ from django.http import JsonResponse, HttpResponse
 from django.contrib import messages
 from django.conf import settings
 from django.db.models import Q
+from django.db import transaction
 from functools import reduce
 from django.urls import reverse
 
-from base.constants import TASK_TYPE_AUTO
+from base.constants import SYSTEM_TASK_TYPES
 
 import json
 
@@ -188,7 +190,7 @@ def get_case_details(request, context, app_name, form_code, case_id, display_typ
         else:
             tasks_queryset = (
                 case_instance.workflow_instance.task_instance_workflow_instance.exclude(
-                    task__task_type=TASK_TYPE_AUTO
+                    task__task_type__in=SYSTEM_TASK_TYPES
                 )
             )
         context["task_instances"] = json.dumps(
@@ -239,19 +241,18 @@ def get_case_details(request, context, app_name, form_code, case_id, display_typ
             if not task_form.is_valid():
                 forms_is_valid = False
         if forms_is_valid:
-            for task_form in pending_task_forms:
-                task_form.save()
-                case_instance.updated_by = request.user
-                try:
-                    case_instance.save()
-                except Exception as e:
-                    for t in pending_task_forms:
-                        task = TaskInstance.objects.get(id=t.instance.id)
-                        task.is_active = True
-                        task.save()
-                        logger.debug(e)
-                        messages.error(request, e)
-                    raise Exception(e)
+            case_instance.updated_by = request.user
+            try:
+                # the completed task instances (and the workflow instance summary) are
+                # rolled back with the transition when it fails
+                with transaction.atomic():
+                    for task_form in pending_task_forms:
+                        task_form.save()
+                    CaseTransitionService().advance(case_instance, tasks_changed=True)
+            except Exception as e:
+                logger.debug(e)
+                messages.error(request, e)
+                raise Exception(e)
             case_instance.remove_lock()
             return redirect("app:app_case_details", app_name, form_code, case_id)
         else:
@@ -5,11 +5,9 @@ from django.contrib import messages
 from django.http import JsonResponse
 import json
 from base.models import ModelDictionaryConfigModel
-from functools import reduce
 from django.db.models import Q
-from .util import CustomJSONEncoder, extract_datatables_search_builder_parameters
+from .util import CustomJSONEncoder, FastJSONResponse, set_datatables_response
 from .util_files import download_file
-from django.core.paginator import Paginator
 from django.urls import reverse
 from django.http import JsonResponse, HttpResponse
 from base.models import FileModel
@@ -84,56 +82,12 @@ def get_model_view_data(request, context, app_name, model):
     model_class = context["model_class"]
 
     fields = model_details.get("list_display", {})
-    search_keys = fields.keys()
     field_names = list(fields.keys())
 
-    queryset = model_class.objects.all().values(*fields)
-
-    draw = int(request.POST.get("draw", 1))
-    start = int(request.POST.get("start", 0))
-    length = int(request.POST.get("length", 10))
-    search_value = request.POST.get("search[value]", None)
-
-    search_builder_logic = request.POST.get("searchBuilder[logic]", None)
-    logger.debug(search_builder_logic)
-
-    # Handle filtering
-    if search_value:
-        conditions = reduce(
-            lambda x, y: x | Q(**{f"{y}__icontains": search_value}), search_keys, Q()
-        )
-        queryset = queryset.filter(conditions)
-    if search_builder_logic is not None:
-        q_objects = extract_datatables_search_builder_parameters(
-            request.POST, search_builder_logic
-        )
-        queryset = queryset.filter(q_objects)
-
-    # Handle sorting
-    order_column = request.POST.get("order[0][column]", None)
-    order_by = None
-    if order_column is not None:
-        order_column_name = field_names[int(order_column)]
-        order_direction = request.POST.get("order[0][dir]", "asc")
-        order_by = (
-            order_column_name if order_direction == "asc" else f"-{order_column_name}"
-        )
-        queryset = queryset.order_by(order_by)
-
-    logger.debug(queryset.query)
-
-    # Handle pagination
-    paginator = Paginator(queryset.values(*field_names), request.POST.get("length", 10))
-    page_number = start // length + 1
-    page = paginator.get_page(page_number)
-
-    data = json.dumps(list(page), cls=CustomJSONEncoder)
-    response_data = {
-        "recordsTotal": queryset.count(),
-        "recordsFiltered": paginator.count,
-        "data": json.loads(data),
-    }
-    return JsonResponse(response_data, safe=True)
+    response_data = set_datatables_response(
+        request, model_class.objects.all(), field_names, field_names
+    )
+    return FastJSONResponse(response_data)
 
 def get_model_details_view(
     request, context, app_name, model, id, department=None, team=None
@@ -233,14 +187,14 @@ def get_model_details_view_sub_table_json(
     filter = {sub_table_field: id}
     record = model_class.objects.filter(**filter).values(*fields)
     if record is not None:
-        record_data = json.dumps(list(record), cls=CustomJSONEncoder)
+        record_data = list(record)
         records_total = len(record_data)
         response_data = {
             "recordsTotal": records_total,
             "recordsFiltered": records_total,
-            "data": json.loads(record_data),
+            "data": record_data,
         }
-    return JsonResponse(response_data, safe=True)
+    return FastJSONResponse(response_data)
 
 @model_decorator
 def get_model_details_file_download_view(
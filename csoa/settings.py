@@ -54,6 +54,8 @@ MIDDLEWARE = [
     "simple_history.middleware.HistoryRequestMiddleware",  # 用于 simple_history 记录历史变更，位置通常放在与数据库操作相关的中间件之前。
     # middleware to required user login
     "csoa.middleware.LoginRequiredMiddleware",
+    # middleware to memoize and batch cache lookups within one request
+    "base.middleware.RequestCacheMiddleware",
     # middleware to print user login/logout log
     "base.middleware.UserActivityMiddleware",
     # middleware to set menu in request
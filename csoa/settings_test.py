@@ -51,6 +51,52 @@ CACHE_TIMEOUT_DEFAULT = 60 * 5  # 5 minutes
 CACHE_TIMEOUT_L1 = 60 * 15  # 15 minutes
 CACHE_TIMEOUT_L2 = 60 * 30  # 30 minutes
 CACHE_TIMEOUT_L3 = 60 * 60  # 60 minutes
+CACHE_TIMEOUT_L4 = 60 * 60 * 24  # 1 day, for entries invalidated by cache tags
+CACHE_SCHEMA_VERSION = 1  # bump to invalidate every cache entry on deploy
+CACHE_KEY_MAX_LENGTH = 200  # longer cache key arguments are hashed
+
+# per-process (L1) cache in front of redis, used by the cache decorators with local=True
+CACHE_L1_ENABLED = True
+CACHE_L1_MAX_ENTRIES = 1024
+CACHE_L1_TIMEOUT = 60  # seconds an entry can live in a worker's memory
+CACHE_L1_SYNC_INTERVAL = 2  # seconds between checks of the cross-worker invalidation version
+
+# stampede protection for entries decorated with single_flight / stale_ttl
+CACHE_LOCK_TIMEOUT = 30  # seconds a rebuild lock is held at most
+CACHE_LOCK_WAIT_TIMEOUT = 10  # seconds a worker waits for another worker's rebuild
+CACHE_LOCK_POLL_INTERVAL = 0.05
+
+# cache hit/miss/fill counters, see "python manage.py cache_stats" and api/global/cache-stats
+CACHE_STATS_ENABLED = True
+CACHE_STATS_PUBLISH_INTERVAL = 30  # seconds between publishing a worker's counters to redis
+CACHE_SLOW_FILL_THRESHOLD = 1  # log a warning when computing a cache entry takes longer (seconds), None to disable
+
+# run the auto tasks of a workflow in the background ("python manage.py run_workflow_jobs")
+# instead of in the request that submits or moves the case
+WORKFLOW_DEFERRED_AUTO_TASKS = False
+WORKFLOW_JOB_MAX_ATTEMPTS = 3  # a failing job is retried, with a backoff, before it is marked failed
+WORKFLOW_JOB_RETRY_DELAY = 30  # seconds before the first retry, doubled on each attempt
+WORKFLOW_JOB_POLL_INTERVAL = 2  # seconds the worker waits when there is no job
+WORKFLOW_JOB_LEASE = 600  # seconds a claimed job can run before it is released for another worker
+
+# reminders and escalations of flow tasks ("python manage.py run_task_timers")
+WORKFLOW_TIMER_BATCH_SIZE = 200  # timers processed per batch
+WORKFLOW_TIMER_MAX_SLEEP = 60  # seconds the worker sleeps at most, to pick up timers created meanwhile
+
+# trace spans of the workflow execution (duration and query count per step), see jsonForm/tracing.py
+# e.g. ["jsonForm.tracing.DatabaseSink"] for the admin trace summary, empty to turn tracing off
+WORKFLOW_TRACE_SINKS = []
+WORKFLOW_TRACE_RING_SIZE = 1000  # spans kept in memory by jsonForm.tracing.RingBufferSink
+WORKFLOW_TRACE_DATABASE = None  # database alias the DatabaseSink saves with, None for the default connection
+
+# full-text search of the cases on their section data, see jsonForm/search.py
+# dotted path of the backend, empty for the backend of the database (tsvector on PostgreSQL, FTS5 on SQLite)
+CASE_SEARCH_BACKEND = None
+
+# DataTables counts, see base.util.set_datatables_response
+DATATABLES_TOTAL_CACHE_TIMEOUT = 60  # seconds the unfiltered total of a list is cached
+# PostgreSQL: the counts over this number of rows are estimated from the query plan, None for exact counts
+DATATABLES_COUNT_ESTIMATE_THRESHOLD = 100000
 
 STATIC_URL = "/static/"
 
@@ -0,0 +1,320 @@
+from django.db import transaction
+from django.db.models import Count, Q
+from base import constants
+from base.util import get_model_class
+from .WorkflowExecutor import WorkflowExecutor
+from .tracing import trace_span
+
+import logging
+
+logger = logging.getLogger("django")
+
+
+class CaseTransitionService:
+    """
+    Advances the workflow of cases: starts it when a case is submitted, moves it to
+    the next task when the task instances of the current task are done, and stops it
+    when a case is cancelled.
+
+    Views call it explicitly after saving a case (it replaces the Case pre_save signal),
+    and it only works when a field relevant to the workflow changed (see
+    CaseBaseModel.get_transition_changes) or when task instances were completed.
+    It works with any case model built on CaseBaseModel (jsonForm, modelBase, ...).
+    """
+
+    def __init__(self, executor=None):
+        self.executor = executor or WorkflowExecutor()
+
+    def advance(self, case, tasks_changed=False, save=True):
+        """
+        Advances the workflow of a case and saves it.
+
+        Args:
+            case: The Case instance (saved, with its case data).
+            tasks_changed: True when task instances of the case were completed.
+            save: Save the case, False when the caller saves it.
+
+        Returns:
+            True if the workflow of the case moved (started, next task, completed or stopped).
+
+        Database Operations:
+            - Read: the WorkflowInstance summary of the case, when tasks_changed
+            - Write: WorkflowInstance, TaskInstance, Case
+        """
+        if case.form_id is None:  # Check if the form is set
+            raise ValueError("The 'form' cannot be empty.")
+        with trace_span("case.advance", case_id=case.pk, status=case.status) as span:
+            changes = case.get_transition_changes()
+            pending = None
+            if tasks_changed and case.workflow_instance_id is not None:
+                pending = self.get_pending(case)
+            moved = self.transition(case, changes, pending)
+            if save:
+                case.save()
+            case.mark_transition_state()
+            span.set(moved=moved, next_status=case.status)
+        return moved
+
+    def advance_many(self, cases):
+        """
+        Advances the workflow of many cases whose task instances may have been completed,
+        e.g. from back-office jobs. The workflow instance summaries of all cases are
+        read with one query, and each case is advanced in its own transaction, so a
+        failing case does not stop the others.
+
+        Args:
+            cases: A list or queryset of cases of the same model.
+
+        Returns:
+            A dict with the number of cases advanced and unchanged, and the errors by case id.
+
+        Database Operations:
+            - Read: Case (with form and workflow instance), WorkflowInstance summaries (1 query)
+            - Write: WorkflowInstance, TaskInstance, Case, for the cases that move
+        """
+        if hasattr(cases, "select_related"):
+            cases = cases.select_related("form", "workflow_instance")
+        cases = list(cases)
+        result = {"advanced": 0, "unchanged": 0, "errors": {}}
+        if len(cases) == 0:
+            return result
+        pendings = self.get_pending_many(cases)
+        for case in cases:
+            try:
+                with transaction.atomic(), trace_span(
+                    "case.advance", case_id=case.pk, status=case.status
+                ):
+                    changes = case.get_transition_changes()
+                    pending = (
+                        pendings.get(case.pk, (0, None))
+                        if case.workflow_instance_id is not None
+                        else None
+                    )
+                    if self.transition(case, changes, pending):
+                        case.save()
+                        result["advanced"] += 1
+                    else:
+                        result["unchanged"] += 1
+                    case.mark_transition_state()
+            except Exception as e:
+                logger.error(f"Unable to advance case {case.pk}: {e}")
+                result["errors"][case.pk] = str(e)
+        return result
+
+    def run_job(self, job):
+        """
+        Runs the auto tasks of a WorkflowJob (see WorkflowExecutor.enqueue_auto_tasks)
+        and moves its case to the task they lead to. The case row is locked while the
+        job runs, so the case cannot be changed at the same time by a user.
+
+        Args:
+            job: The WorkflowJob, claimed by the worker.
+
+        Returns:
+            True if the case moved, False when the job is obsolete (the case was
+            cancelled, deleted or has already moved on).
+
+        Database Operations:
+            - Read: Case (locked), WorkflowInstance
+            - Write: TaskInstance, Case, WorkflowJob
+        """
+        Case = job.get_case_model()
+        with transaction.atomic(), trace_span(
+            "workflow.job", case_id=job.case_id, task_id=job.task_id
+        ):
+            # lock the case row only, its form and workflow instance are read after
+            case = Case.objects.select_for_update().filter(pk=job.case_id).first()
+            moved = False
+            if case is None:
+                logger.warning(f"Case of {job} is not found")
+            elif (
+                case.status in (constants.CASE_CANCELLED, constants.CASE_COMPLETED)
+                or case.workflow_instance is None
+                or not case.workflow_instance.is_active
+            ):
+                logger.info(f"Skipped {job}, the case is {case.status}")
+            else:
+                task = self.executor.get_graph(case.form.workflow_id).get_task(
+                    job.task_id
+                )
+                next_task = self.executor.execute(
+                    case, task, defer=False, idempotency_key=job.idempotency_key
+                )
+                if next_task is not None:  # If there is a next task
+                    case.status = next_task.name
+                else:  # If there is no next task, the workflow is complete
+                    case.set_case_completed()
+                case.save()
+                case.mark_transition_state()
+                moved = True
+            job.status = job.DONE
+            job.last_error = None
+            job.save(update_fields=["status", "last_error", "updated_at"])
+        return moved
+
+    def get_pending(self, case):
+        """
+        Returns (number of active task instances, priority DecisionPoint or None) of a
+        case, from the summary of its WorkflowInstance (see WorkflowInstanceBaseModel).
+
+        Database Operations:
+            - Read: WorkflowInstance summary (one query, the decision point comes from the workflow graph)
+        """
+        WorkflowInstance = case._meta.get_field("workflow_instance").related_model
+        summary = (
+            WorkflowInstance.objects.filter(pk=case.workflow_instance_id)
+            .values_list(
+                "active_task_count", "pending_decision_point_id", "join_task_id"
+            )
+            .first()
+        )
+        if summary is None:
+            return 0, None
+        return self.get_summary_pending(case, *summary)
+
+    def get_pending_many(self, cases):
+        """
+        Returns the get_pending values of many cases (of the same model) by case id,
+        with one query for the summaries of their workflow instances.
+        """
+        WorkflowInstance = cases[0]._meta.get_field("workflow_instance").related_model
+        summaries = {
+            row[0]: row[1:]
+            for row in WorkflowInstance.objects.filter(
+                pk__in=[c.workflow_instance_id for c in cases]
+            ).values_list(
+                "pk", "active_task_count", "pending_decision_point_id", "join_task_id"
+            )
+        }
+        return {
+            case.pk: self.get_summary_pending(case, *summaries[case.workflow_instance_id])
+            for case in cases
+            if case.workflow_instance_id in summaries
+        }
+
+    def get_summary_pending(
+        self, case, active_task_count, decision_point_id, join_task_id=None
+    ):
+        if active_task_count > 0:
+            if join_task_id is None:
+                return active_task_count, None
+            active_task_count = self.check_join(case, join_task_id)
+            if active_task_count > 0:
+                return active_task_count, None
+        if decision_point_id is None:
+            return 0, None
+        decision_point = self.executor.get_graph(
+            case.form.workflow_id
+        ).get_decision_point(decision_point_id)
+        if decision_point is None:  # the decision point is no longer in the workflow
+            DecisionPoint = get_model_class("jsonForm", "DecisionPoint")
+            decision_point = DecisionPoint.objects.filter(pk=decision_point_id).first()
+        return 0, decision_point
+
+    def check_join(self, case, join_task_id):
+        """
+        Checks if enough parallel flow tasks (branches) of a fork are completed for
+        its Join task (Task.join_quorum, all of them by default). A branch is completed
+        when all its task instances are. When the quorum is reached, the task instances
+        of the other branches are closed.
+
+        Returns:
+            The number of branches still to complete, 0 when the join can continue.
+
+        Database Operations:
+            - Read: the task instances of the case counted by task (one aggregate query)
+            - Write: TaskInstance (closes the active ones), when the quorum is reached
+        """
+        branches = list(
+            case.task_instances.values("task_id").annotate(
+                active=Count("id", filter=Q(is_active=True))
+            )
+        )
+        completed = sum(1 for branch in branches if branch["active"] == 0)
+        join_task = self.executor.get_graph(case.form.workflow_id).get_task(
+            join_task_id
+        )
+        quorum = len(branches)
+        if join_task is not None and join_task.join_quorum is not None:
+            quorum = min(join_task.join_quorum, quorum)
+        if completed < quorum:
+            return quorum - completed
+        case.task_instances.filter(is_active=True).update(
+            is_active=False,
+            comment=f"Closed, {completed} of {len(branches)} parallel tasks completed",
+        )
+        return 0
+
+    def transition(self, case, changes, pending=None):
+        """
+        Applies the workflow transition of a case, without saving the case.
+
+        Args:
+            case: The Case instance.
+            changes: The transition fields changed since the last transition.
+            pending: (active task instances, priority DecisionPoint) when task instances
+                were completed, see get_pending.
+
+        Returns:
+            True if the workflow of the case moved.
+        """
+        # Case was cancelled or only saved as draft
+        if case.status == constants.CASE_CANCELLED:
+            if "status" not in changes:
+                return False
+            for task_instance in case.task_instances.filter(is_active=True):
+                task_instance.is_active = False  # Deactivate the task instance
+                task_instance.save()
+            if case.workflow_instance is not None:
+                workflow_instance = case.workflow_instance
+                workflow_instance.is_active = False  # Deactivate the workflow instance
+                workflow_instance.save()
+            return True
+        elif not case.is_submited:  # If the case is saved as a draft
+            case.status = constants.CASE_DRAFT
+            return False
+
+        # Initial the workflow and task when user submit the form case
+        elif case.workflow_instance_id is None:
+            form = case.form
+            # started whenever a submitted case has no workflow, also when a failed
+            # transition left it submitted
+            if form.workflow_id is None:
+                return False
+            WorkflowInstance = case._meta.get_field("workflow_instance").related_model
+            workflow_instance = WorkflowInstance.objects.create(
+                workflow_id=form.workflow_id
+            )
+            case.workflow_instance = workflow_instance
+            current_task = self.executor.get_first_task(form.workflow)
+            case.workflow_name = form.workflow.name
+            next_task = self.executor.execute(case, current_task)
+            if next_task is not None:  # If there is a next task
+                case.status = next_task.name
+            else:  # If there is no next task, the workflow is complete
+                case.set_case_completed()
+            return True
+
+        # Update workflow and task when user worked on the case
+        elif pending is not None:
+            remain_task, priority_decision = pending
+            if remain_task > 0 or case.status == constants.CASE_COMPLETED:
+                return False  # the current task is not done yet, or nothing is left to do
+            if (
+                priority_decision is not None
+                and priority_decision.next_task_id is not None
+            ):
+                graph = self.executor.get_graph(case.form.workflow_id)
+                next_task = (
+                    graph.get_task(priority_decision.next_task_id)
+                    or priority_decision.next_task
+                )
+                next_task = self.executor.execute(case, next_task)
+                if next_task is not None:  # If there is a next task
+                    case.status = next_task.name
+                else:  # If no next task, workflow is complete
+                    case.set_case_completed()
+            else:  # If no decision point or next task, workflow is complete
+                case.set_case_completed()
+            return True
+        return False
@@ -0,0 +1,258 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.utils import timezone
+from simple_history.utils import bulk_update_with_history
+from base.util import get_model_class
+
+import logging
+
+logger = logging.getLogger("django")
+
+
+class TaskTimerService:
+    """
+    Schedules and processes the SLA timers of flow tasks (Task.remind_in, Task.due_in
+    and Task.escalate_to).
+
+    A TaskTimer row is created per task instance and timer when the task instances of
+    a flow task are created, so the worker (the run_task_timers command) only reads
+    the timers that are due, through the (status, due_at) index, instead of scanning
+    the active task instances. Due timers are processed in batches: the task
+    instances, the recipients and the cases of a batch are read with a few queries,
+    the escalated task instances are updated with one bulk update and the emails are
+    sent over one connection.
+    """
+
+    def schedule(self, task, task_instances):
+        """
+        Creates the timers of new task instances of a flow task.
+
+        Args:
+            task: The Task instance.
+            task_instances: The TaskInstance instances created for the task.
+
+        Returns:
+            The TaskTimer instances created.
+
+        Database Operations:
+            - Write: TaskTimer (one bulk insert), when the task has a reminder or a due time
+        """
+        if task.remind_in is None and task.due_in is None:
+            return []
+        TaskTimer = get_model_class("jsonForm", "TaskTimer")
+        now = timezone.now()
+        timers = []
+        for task_instance in task_instances:
+            for kind, delay in (
+                (TaskTimer.REMIND, task.remind_in),
+                (TaskTimer.ESCALATE, task.due_in),
+            ):
+                if delay is None:
+                    continue
+                timers.append(
+                    TaskTimer(
+                        kind=kind,
+                        task_instance_app_label=task_instance._meta.app_label,
+                        task_instance_model=task_instance._meta.model_name,
+                        task_instance_id=task_instance.pk,
+                        task=task,
+                        due_at=now + delay,
+                    )
+                )
+        return TaskTimer.objects.bulk_create(timers)
+
+    def get_next_due_at(self):
+        """
+        Returns the due time of the earliest pending timer, or None.
+
+        Database Operations:
+            - Read: TaskTimer (one index lookup)
+        """
+        TaskTimer = get_model_class("jsonForm", "TaskTimer")
+        return (
+            TaskTimer.objects.filter(status=TaskTimer.PENDING)
+            .order_by("due_at")
+            .values_list("due_at", flat=True)
+            .first()
+        )
+
+    def process_due(self, batch_size=None, now=None):
+        """
+        Processes a batch of due timers: reminds the assignees of the task instances
+        still active, and reassigns the overdue ones to the escalation user group.
+
+        Args:
+            batch_size: The maximum number of timers to process, WORKFLOW_TIMER_BATCH_SIZE when None.
+            now: The current time, timezone.now() when None.
+
+        Returns:
+            A dict with the number of timers "processed", and of task instances
+            "reminded", "escalated" and "skipped" (already completed).
+
+        Database Operations:
+            - Read: TaskTimer, task instances and their cases, assignee emails
+            - Write: TaskTimer, task instances (escalated ones, with history)
+        """
+        TaskTimer = get_model_class("jsonForm", "TaskTimer")
+        batch_size = batch_size or getattr(settings, "WORKFLOW_TIMER_BATCH_SIZE", 200)
+        now = now or timezone.now()
+        result = {"processed": 0, "reminded": 0, "escalated": 0, "skipped": 0}
+        with transaction.atomic():
+            queryset = (
+                TaskTimer.objects.filter(status=TaskTimer.PENDING, due_at__lte=now)
+                .select_related(
+                    "task__workflow",
+                    "task__escalate_to__role",
+                    "task__escalate_to__app",
+                    "task__escalate_to__company",
+                    "task__escalate_to__department",
+                    "task__escalate_to__team__first_support",
+                )
+                .order_by("due_at")
+            )
+            if connection.features.has_select_for_update_skip_locked:
+                # several workers never process the same timers
+                lock = {"skip_locked": True}
+                if connection.features.has_select_for_update_of:
+                    lock["of"] = ("self",)  # not the (nullable) escalation joins
+                queryset = queryset.select_for_update(**lock)
+            timers = list(queryset[:batch_size])
+            if len(timers) == 0:
+                return result
+
+            task_instances = self.get_task_instances(timers)
+            emails = self.get_emails(task_instances.values(), timers)
+            messages = []
+            escalated = []
+            for timer in timers:
+                task_instance = task_instances.get(timer.task_instance_id)
+                timer.processed_at = now
+                if task_instance is None:  # completed, or the case was cancelled
+                    timer.status = TaskTimer.SKIPPED
+                    result["skipped"] += 1
+                    continue
+                task = timer.task
+                case_ids = ", ".join(
+                    str(case.pk) for case in task_instance.case_task_instances.all()
+                )
+                if timer.kind == TaskTimer.REMIND:
+                    subject = f"[Reminder] {task.name} - case {case_ids}"
+                    content = f"The task {task.name} of the workflow {task.workflow.name} on case {case_ids} is waiting for your decision."
+                    result["reminded"] += 1
+                else:
+                    subject = f"[Overdue] {task.name} - case {case_ids}"
+                    content = f"The task {task.name} of the workflow {task.workflow.name} on case {case_ids} is overdue since {timer.due_at:%Y-%m-%d %H:%M}."
+                    if (
+                        task.escalate_to_id is not None
+                        and task_instance.assign_to_id != task.escalate_to_id
+                    ):
+                        previous = self.get_recipients(task_instance, emails)
+                        task_instance.assign_to = task.escalate_to
+                        task_instance.assign_to_user = (
+                            task.escalate_to.team.first_support
+                            if task.escalate_to.team
+                            else None
+                        )
+                        escalated.append(task_instance)
+                        content += f" It is escalated to {task.escalate_to}."
+                        messages.append(
+                            self.build_message(subject, content, previous)
+                        )
+                    result["escalated"] += 1
+                messages.append(
+                    self.build_message(
+                        subject, content, self.get_recipients(task_instance, emails)
+                    )
+                )
+                timer.status = TaskTimer.DONE
+
+            self.update_escalated(escalated)
+            error = self.send(messages)
+            for timer in timers:
+                timer.last_error = error
+            TaskTimer.objects.bulk_update(
+                timers, ["status", "processed_at", "last_error"]
+            )
+        result["processed"] = len(timers)
+        return result
+
+    def get_task_instances(self, timers):
+        """
+        Returns the active task instances of the timers by id, with one query per task
+        instance model (and one for their cases).
+        """
+        ids_by_model = {}
+        for timer in timers:
+            ids_by_model.setdefault(
+                (timer.task_instance_app_label, timer.task_instance_model), []
+            ).append(timer.task_instance_id)
+        task_instances = {}
+        for (app_label, model_name), ids in ids_by_model.items():
+            TaskInstance = apps.get_model(app_label, model_name)
+            for task_instance in (
+                TaskInstance.objects.filter(pk__in=ids, is_active=True)
+                .select_related("assign_to", "assign_to_user")
+                .prefetch_related("case_task_instances")
+            ):
+                task_instances[task_instance.pk] = task_instance
+        return task_instances
+
+    def get_emails(self, task_instances, timers):
+        """
+        Returns the emails of the active users by Permission id, for the assignees of
+        the task instances and the escalation user groups, with one query.
+        """
+        CustomUser = get_model_class("userManagement", "CustomUser")
+        permission_ids = {ti.assign_to_id for ti in task_instances} | {
+            timer.task.escalate_to_id for timer in timers
+        }
+        permission_ids.discard(None)
+        emails = {}
+        for permission_id, email in CustomUser.objects.filter(
+            permissions__in=permission_ids, is_active=True
+        ).values_list("permissions", "email"):
+            if email:
+                emails.setdefault(permission_id, []).append(email)
+        return emails
+
+    def get_recipients(self, task_instance, emails):
+        """
+        The user working on the task instance, or the users of its user group.
+        """
+        if task_instance.assign_to_user is not None and task_instance.assign_to_user.email:
+            return [task_instance.assign_to_user.email]
+        return emails.get(task_instance.assign_to_id, [])
+
+    def build_message(self, subject, content, recipients):
+        return EmailMessage(subject, content, settings.DEFAULT_FROM_EMAIL, recipients)
+
+    def update_escalated(self, task_instances):
+        """
+        Saves the new assignees of the escalated task instances, with one bulk update
+        per task instance model.
+        """
+        by_model = {}
+        for task_instance in task_instances:
+            by_model.setdefault(type(task_instance), []).append(task_instance)
+        for TaskInstance, objs in by_model.items():
+            bulk_update_with_history(objs, TaskInstance, ["assign_to", "assign_to_user"])
+
+    def send(self, messages):
+        """
+        Sends the emails of a batch over one connection.
+
+        Returns:
+            None, or the error when the emails could not be sent (the timers are not
+            retried, the reminders and escalations are done).
+        """
+        messages = [m for m in messages if len(m.to) > 0]
+        if len(messages) == 0:
+            return None
+        try:
+            get_connection().send_messages(messages)
+        except Exception as e:
+            logger.exception(e)
+            return f"Error sending email: {e}"
+        return None
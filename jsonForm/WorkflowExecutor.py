@@ -1,6 +1,10 @@
 import json
-from django.db.models import Q
+from django.conf import settings
+from simple_history.utils import bulk_create_with_history
 from base import constants
+from .conditions import compile_condition, ConditionError
+from .TaskTimerService import TaskTimerService
+from .tracing import trace_span
 from base.util import get_model_class
 
 import logging
@@ -9,55 +13,190 @@ logger = logging.getLogger("django")
 
 
 class WorkflowExecutor:
-    def execute(self, case, current_task):
+    def get_graph(self, workflow_id):
+        """
+        Gets the cached WorkflowGraph of a workflow, see Workflow.get_graph_by_id.
+        """
+        Workflow = get_model_class("jsonForm", "Workflow")
+        return Workflow.get_graph_by_id(workflow_id)
+
+    def execute(self, case, current_task, defer=None, idempotency_key=None):
         """
         Executes the workflow, handling both the start and middle stages.
 
         Args:
             case: The Case instance.
             current_task: The current Task instance to be executed.
+            defer: Enqueue the auto tasks as a WorkflowJob instead of running them,
+                WORKFLOW_DEFERRED_AUTO_TASKS when None.
+            idempotency_key: The key of the WorkflowJob running the tasks, the task
+                instances already created by a previous run of the job are reused.
 
         Returns:
             The next Task instance to be executed, or None if the workflow is complete.
+            When the auto tasks are deferred, the current (auto) task.
         """
-        application = case.form.application
-        workflow_instance = case.workflow_instance
-        TaskInstance = (
-            case.get_task_instances_model()
-        )  # Get the TaskInstance model from the Case model
-        request_data = {}
+        with trace_span(
+            "workflow.execute",
+            case_id=case.pk,
+            task_id=current_task.id if current_task else None,
+            task=current_task.name if current_task else None,
+        ):
+            application = case.form.application
+            workflow_instance = case.workflow_instance
+            TaskInstance = (
+                case.get_task_instances_model()
+            )  # Get the TaskInstance model from the Case model
+            request_data = {}
+            graph = self.get_graph(current_task.workflow_id) if current_task else None
+            if graph is not None:  # use the graph tasks, their decision points are loaded
+                current_task = graph.get_task(current_task.id) or current_task
+
+            if current_task and current_task.task_type in constants.SYSTEM_TASK_TYPES:
+                if defer is None:
+                    defer = getattr(settings, "WORKFLOW_DEFERRED_AUTO_TASKS", False)
+                if defer:
+                    self.enqueue_auto_tasks(case, current_task)
+                    return current_task
+                request_data = case.get_case_data_in_json()  # Get case data for auto tasks
+
+            position = 0  # position of the task in the chain, for the idempotency keys
+            while current_task:  # Loop for chained auto tasks
+                position += 1
+                task_key = (
+                    f"{idempotency_key}:{position}" if idempotency_key is not None else None
+                )
+                if current_task.task_type in constants.SYSTEM_TASK_TYPES:
+                    # a Join task is reached when its parallel flow tasks are completed,
+                    # it chooses the next task like an auto task
+                    with trace_span(
+                        f"task.{current_task.task_type.lower()}",
+                        task_id=current_task.id,
+                        task=current_task.name,
+                    ) as span:
+                        if task_key is not None:
+                            task_instance, created = TaskInstance.objects.get_or_create(
+                                idempotency_key=task_key,
+                                defaults={
+                                    "workflow_instance": workflow_instance,
+                                    "task": current_task,
+                                },
+                            )
+                            executed = not created and not task_instance.is_active
+                        else:
+                            task_instance = TaskInstance.objects.create(  # Create a TaskInstance
+                                workflow_instance=workflow_instance,
+                                task=current_task,
+                            )
+                            executed = False
+                        if current_task.task_type == constants.TASK_TYPE_FORK:
+                            branches = self.execute_fork_task(
+                                current_task, request_data, task_instance, graph
+                            )
+                            span.set(branches=len(branches))
+                        elif executed:
+                            # already executed by a previous run of the job
+                            next_task = (
+                                graph.get_task(task_instance.decision_point.next_task_id)
+                                if task_instance.decision_point_id is not None
+                                and task_instance.decision_point.next_task_id is not None
+                                else None
+                            )
+                        else:
+                            next_task = self.execute_auto_task(
+                                current_task, request_data, task_instance, graph
+                            )  # Execute the auto task
+                            span.set(
+                                decision_point_id=task_instance.decision_point_id,
+                                decision_point=(
+                                    task_instance.decision_point.decision
+                                    if task_instance.decision_point_id
+                                    else None
+                                ),
+                            )
+                        if not executed:
+                            task_instance.is_active = False  # Deactivate the TaskInstance
+                            task_instance.save()  # Save the TaskInstance
+                    if current_task.task_type == constants.TASK_TYPE_FORK:
+                        with trace_span(
+                            "task.flow", task_id=current_task.id, task=current_task.name
+                        ):
+                            self.create_flow_task_instances(
+                                application,
+                                case,
+                                branches,
+                                workflow_instance,
+                                idempotency_key=task_key,
+                                join_task=self.get_join_task(current_task, branches, graph),
+                            )  # Start the parallel flow tasks
+                        return current_task
+                    current_task = next_task  # Move to the next task
+                elif current_task.task_type == constants.TASK_TYPE_FLOW:
+                    with trace_span(
+                        "task.flow", task_id=current_task.id, task=current_task.name
+                    ):
+                        self.create_flow_task_instance(
+                            application,
+                            case,
+                            current_task,
+                            workflow_instance,
+                            idempotency_key=task_key,
+                        )  # Handle flow task
+                    return current_task
+                elif current_task.task_type == constants.TASK_TYPE_MANUAL:
+                    raise ValueError(
+                        f"Next task should not be Manual Task, Manual Task is for user to create"
+                    )  # Manual tasks are user-created
+                else:
+                    raise ValueError(
+                        f"Unknown task type: {current_task.task_type}"
+                    )  # Handle unknown task types
+            return None  # Workflow is complete
 
-        if current_task and current_task.task_type == constants.TASK_TYPE_AUTO:
-            request_data = case.get_case_data_in_json()  # Get case data for auto tasks
+    def enqueue_auto_tasks(self, case, task):
+        """
+        Enqueues a WorkflowJob running the auto tasks of a case from task, see the
+        run_workflow_jobs command.
 
-        while current_task:  # Loop for chained auto tasks
-            if current_task.task_type == constants.TASK_TYPE_AUTO:
-                task_instance = TaskInstance.objects.create(  # Create a TaskInstance
-                    workflow_instance=workflow_instance,
-                    task=current_task,
-                )
-                next_task = self.execute_auto_task(
-                    current_task, request_data, task_instance
-                )  # Execute the auto task
-                task_instance.is_active = False  # Deactivate the TaskInstance
-                task_instance.save()  # Save the TaskInstance
-                current_task = next_task  # Move to the next task
-            elif current_task.task_type == constants.TASK_TYPE_FLOW:
-                self.create_flow_task_instance(
-                    application, case, current_task, workflow_instance
-                )  # Handle flow task
-                return current_task
-            elif current_task.task_type == constants.TASK_TYPE_MANUAL:
-                raise ValueError(
-                    f"Next task should not be Manual Task, Manual Task is for user to create"
-                )  # Manual tasks are user-created
-            else:
-                raise ValueError(
-                    f"Unknown task type: {current_task.task_type}"
-                )  # Handle unknown task types
-        return None  # Workflow is complete
+        The job is inserted in the transaction saving the case, so workers only see it
+        once the transaction is committed, and never if it is rolled back. Its
+        idempotency key identifies the transition (workflow instance, task and the
+        number of task instances already created), so enqueuing the same transition
+        again returns the existing job.
+
+        Args:
+            case: The Case instance (saved).
+            task: The auto Task to start from.
 
-    def create_flow_task_instance(self, application, case, task, workflow_instance):
+        Returns:
+            The WorkflowJob.
+
+        Database Operations:
+            - Read: the number of task instances of the workflow instance
+            - Write: WorkflowJob
+        """
+        WorkflowJob = get_model_class("jsonForm", "WorkflowJob")
+        if case.pk is None:
+            raise ValueError("The case must be saved before its auto tasks are enqueued")
+        workflow_instance = case.workflow_instance
+        TaskInstance = case.get_task_instances_model()
+        done = TaskInstance.objects.filter(workflow_instance=workflow_instance).count()
+        job, created = WorkflowJob.objects.get_or_create(
+            idempotency_key=f"{workflow_instance.pk}:{task.pk}:{done}",
+            defaults={
+                "case_app_label": case._meta.app_label,
+                "case_model": case._meta.model_name,
+                "case_id": str(case.pk),
+                "task": task,
+            },
+        )
+        if created:
+            logger.debug(f"Enqueued {job}")
+        return job
+
+    def create_flow_task_instance(
+        self, application, case, task, workflow_instance, idempotency_key=None
+    ):
         """
         Creates TaskInstances for a flow task, assigning them to appropriate users/permissions.
 
@@ -66,22 +205,108 @@ class WorkflowExecutor:
             case: The Case instance.
             task: The Task instance (flow task).
             workflow_instance: The WorkflowInstance.
+            idempotency_key: The key of the flow task in a WorkflowJob, nothing is
+                created when its task instances already exist.
 
         Returns:
             None
+
+        Database Operations:
+            - Write: TaskInstance (and its history) in one bulk insert, Case.task_instances in one insert,
+              the WorkflowInstance summary in one update, TaskTimer in one bulk insert (tasks with a SLA)
+        """
+        self.create_flow_task_instances(
+            application, case, [task], workflow_instance, idempotency_key
+        )
+        return None
+
+    def create_flow_task_instances(
+        self,
+        application,
+        case,
+        tasks,
+        workflow_instance,
+        idempotency_key=None,
+        join_task=None,
+    ):
+        """
+        Creates the TaskInstances of flow tasks running in parallel (the branches of a
+        fork, or a single flow task), replacing the task instances of the case.
+
+        Args:
+            application: The Application instance.
+            case: The Case instance.
+            tasks: The flow Task instances.
+            workflow_instance: The WorkflowInstance.
+            idempotency_key: The key of the tasks in a WorkflowJob, nothing is
+                created when their task instances already exist.
+            join_task: The Join task waiting on the tasks, for the branches of a fork.
+
+        Database Operations:
+            - Read: the Permissions of the tasks assigned to a role
+            - Write: TaskInstance (and its history) in one bulk insert, Case.task_instances in one insert,
+              the WorkflowInstance summary in one update, TaskTimer in one bulk insert per task with a SLA
         """
+        TaskInstance = case.get_task_instances_model()
+        if (
+            idempotency_key is not None
+            and TaskInstance.objects.filter(
+                idempotency_key__startswith=f"{idempotency_key}:"
+            ).exists()
+        ):
+            return None  # created by a previous run of the job
         case.task_instances.clear()  # Clear existing task instances
+        task_instances = {}
+        for task in tasks:
+            task_instances[task] = self.build_flow_task_instances(
+                application,
+                case,
+                task,
+                workflow_instance,
+                (
+                    f"{idempotency_key}:{task.pk}"
+                    if idempotency_key is not None and len(tasks) > 1
+                    else idempotency_key
+                ),
+            )
+        all_task_instances = [ti for tis in task_instances.values() for ti in tis]
+        with trace_span(
+            "task_instance.write",
+            task_id=tasks[0].id if len(tasks) == 1 else None,
+            task=", ".join(task.name for task in tasks),
+        ):
+            # one insert for the task instances (and their history), one for the case links
+            bulk_create_with_history(all_task_instances, TaskInstance)
+            case.task_instances.add(*all_task_instances)
+            type(workflow_instance).start_flow_task(
+                workflow_instance, len(all_task_instances), join_task
+            )
+            for task, tis in task_instances.items():
+                TaskTimerService().schedule(task, tis)
+        return None
+
+    def build_flow_task_instances(
+        self, application, case, task, workflow_instance, idempotency_key=None
+    ):
+        """
+        Returns the (unsaved) TaskInstances of a flow task, one per assignee Permission.
+
+        Raises:
+            ValueError: If no Permission is found for the task.
+        """
         TaskInstance = case.get_task_instances_model()
         Permission = get_model_class("userManagement", "Permission")
-        pers = []  # List to store Permission objects
-        if task.assign_to_role is not None:
-            per = Permission.get_assign_to_role(
-                application, task.assign_to_role, case
-            )  # Get Permission by role
-            if per is not None:
-                pers.append(per)
-        elif task.assign_to is not None:
-            pers = task.assign_to.all()  # Get Permissions directly
+        with trace_span("permission.resolve", task_id=task.id, task=task.name) as span:
+            pers = []  # List to store Permission objects
+            if task.assign_to_role is not None:
+                per = Permission.get_assign_to_role(
+                    application, task.assign_to_role, case
+                )  # Get Permission by role
+                if per is not None:
+                    pers.append(per)
+            elif task.assign_to is not None:
+                pers = task.assign_to.all()  # Get Permissions directly
+            span.set(assignees=len(pers))
         if len(pers) == 0:
             assign_to = task.assign_to_role or task.assign_to  # Get assign_to value
             raise ValueError(
@@ -90,30 +315,87 @@ class WorkflowExecutor:
 
         logger.debug(pers)  # Log the assigned Permissions
 
+        task_instances = []
         for per in pers:  # Create TaskInstance for each assignee
             if (
                 task.assign_to_role is not None
                 and task.assign_to_role.name == constants.ROLE_CASE_OWNER
             ):
-                task_instance = TaskInstance.objects.create(
-                    task=task,
-                    assign_to=per,
-                    workflow_instance=workflow_instance,
-                    assign_to_user=case.created_by,
-                )  # Assign to case owner
+                assign_to_user = case.created_by  # Assign to case owner
             else:
-                team_support = (
-                    per.team.first_support() if per.team else None
+                assign_to_user = (
+                    per.team.first_support if per.team else None
                 )  # Get first support user in team
-                task_instance = TaskInstance.objects.create(
+            task_instances.append(
+                TaskInstance(
                     task=task,
                     assign_to=per,
                     workflow_instance=workflow_instance,
-                    assign_to_user=team_support,
-                )  # Assign to Permission
-            task_instance.save()
-            case.task_instances.add(task_instance)  # Add task instance to case
-        return None
+                    assign_to_user=assign_to_user,
+                    idempotency_key=(
+                        f"{idempotency_key}:{per.pk}"
+                        if idempotency_key is not None
+                        else None
+                    ),
+                )
+            )
+        return task_instances
+
+    def execute_fork_task(self, task, request_data, task_instance, graph=None):
+        """
+        Executes a fork task: every decision point whose condition matches the case data
+        starts its next task, a flow task, in parallel with the others.
+
+        Args:
+            task: The Task instance (fork task).
+            request_data: The request data (from the Case).
+            task_instance: The TaskInstance of the fork.
+            graph: The WorkflowGraph of the workflow, loaded when not given.
+
+        Returns:
+            The flow Task instances to start.
+
+        Raises:
+            ValueError: If no decision point matches, or a branch is not a flow task.
+        """
+        if graph is None:
+            graph = self.get_graph(task.workflow_id)
+        branches = []
+        for dp in graph.get_decision_points(task):
+            if dp.next_task is None or dp.next_task in branches:
+                continue
+            if self.evaluate_condition(dp.condition, request_data, task_instance):
+                if dp.next_task.task_type != constants.TASK_TYPE_FLOW:
+                    raise ValueError(
+                        f"The decision point {dp.decision} of fork task {task.name} should lead to a Flow Task"
+                    )
+                branches.append(dp.next_task)
+        if len(branches) == 0:
+            raise ValueError(f"No branch of fork task {task.name} matches the case")
+        task_instance.comment = f"Branches: {', '.join(b.name for b in branches)}"
+        return branches
+
+    def get_join_task(self, fork_task, branches, graph):
+        """
+        Returns the Join task the branches of a fork lead to (through their decision
+        points), or None when they do not lead to a join (the first completed decision,
+        by priority, then moves the case like for a single flow task).
+
+        Raises:
+            ValueError: If the branches lead to different Join tasks.
+        """
+        joins = {
+            dp.next_task
+            for branch in branches
+            for dp in graph.get_decision_points(branch)
+            if dp.next_task is not None
+            and dp.next_task.task_type == constants.TASK_TYPE_JOIN
+        }
+        if len(joins) > 1:
+            raise ValueError(
+                f"The branches of fork task {fork_task.name} should lead to one Join Task"
+            )
+        return joins.pop() if joins else None
 
     def get_first_task(self, workflow):
         """
@@ -125,35 +407,37 @@ class WorkflowExecutor:
         Returns:
             The first Task instance, ordered by index.
         """
-        return workflow.task_workflow.order_by("index").first()
+        return self.get_graph(workflow.pk).first_task
 
     def get_priority_decision(self, case):
         """
         Gets the highest priority DecisionPoint associated with a Case.
+        CaseTransitionService reads it from the WorkflowInstance summary instead, this
+        is the query the summary is built from.
 
         Args:
             case: The Case instance.
 
         Returns:
-            The highest priority DecisionPoint, or None if none are found.
+            The highest priority DecisionPoint (with its next task), or None if none are found.
         Raises:
             ValueError: If an error occurs during the database query.
+
+        Database Operations:
+            - Read: the task instance of the Case with the highest priority decision (one query)
         """
         try:
-            task_instances = case.task_instances.all()
-            decision_points = []
-            for task_instance in task_instances:
-                if task_instance.decision_point:
-                    decision_points.append(task_instance.decision_point)
-
-            decision_points.sort(key=lambda dp: dp.priority)  # Sort by priority
-            return (
-                decision_points[0] if len(decision_points) > 0 else None
-            )  # Return the highest priority or None
+            task_instance = (
+                case.task_instances.filter(decision_point__isnull=False)
+                .select_related("decision_point__next_task")
+                .order_by("decision_point__priority")
+                .first()
+            )
+            return task_instance.decision_point if task_instance else None
         except Exception as e:
             raise ValueError(f"An error occurred on case {case.pk}: {e}")
 
-    def execute_auto_task(self, task, request_data, task_instance):
+    def execute_auto_task(self, task, request_data, task_instance, graph=None):
         """
         Executes an auto task, evaluating conditions and determining the next task.
 
@@ -161,47 +445,34 @@ class WorkflowExecutor:
             task: The Task instance (auto task).
             request_data: The request data (from the Case).
             task_instance: The TaskInstance.
+            graph: The WorkflowGraph of the workflow, loaded when not given.
 
         Returns:
             The next Task instance, or None if no matching condition is found.
         """
-        decision_points = task.decision_points_task.order_by(
-            "priority"
-        )  # Order by priority
+        if graph is None:
+            graph = self.get_graph(task.workflow_id)
+        decision_points = graph.get_decision_points(task)  # Ordered by priority
         for dp in decision_points:
-            if self.evaluate_condition(
-                dp.condition, request_data, task_instance
-            ):  # Evaluate the condition
+            with trace_span(
+                "decision_point.evaluate",
+                task_id=task.id,
+                task=task.name,
+                decision_point_id=dp.id,
+                decision_point=dp.decision,
+            ) as span:
+                matched = self.evaluate_condition(
+                    dp.condition, request_data, task_instance
+                )  # Evaluate the condition
+                span.set(matched=matched)
+            if matched:
                 task_instance.decision_point = dp  # Assign the DecisionPoint
 
-                try:  # Extract matched values for the comment
-                    # Safely load JSON data.  Handles cases where the JSONField might be None or contain invalid JSON
-                    if isinstance(
-                        dp.condition, str
-                    ):  # Check if it's a string (older Django versions might store JSON as strings)
-                        condition_data = json.loads(dp.condition)  # Load JSON
-                    if isinstance(
-                        dp.condition, dict
-                    ):  # Make sure it's a dictionary before merging
-                        condition_data = dp.condition
-                    matched_values = {}
-                    if "conditions" in condition_data:
-                        for cond in condition_data["conditions"]:
-                            field_name = cond["field_name"]
-                            if field_name in request_data:
-                                matched_values[field_name] = request_data[field_name]
-                    elif "field_name" in condition_data:
-                        field_name = condition_data["field_name"]
-                        if field_name in request_data:
-                            matched_values[field_name] = request_data[field_name]
-
-                    task_instance.comment = f"Condition: {dp.condition}, Matched Values: {json.dumps(matched_values)}"  # Add comment
-
-                except json.JSONDecodeError as e:
-                    task_instance.comment = f"[ERROR] Condition: {dp.condition}; Request_Data: {request_data}; Error:{e}"  # Error comment
-                    logger.error(
-                        f"Invalid JSON format in condition: {dp.condition}. Error: {e}"
-                    )  # Log the error
+                compiled = compile_condition(dp.condition)
+                matched_values = (
+                    compiled.matched_values(request_data) if compiled else {}
+                )
+                task_instance.comment = f"Condition: {dp.condition}, Matched Values: {json.dumps(matched_values, default=str)}"  # Add comment
 
                 task_instance.save()  # Save immediately
                 return dp.next_task  # Return next task
@@ -211,131 +482,183 @@ class WorkflowExecutor:
     def evaluate_condition(self, condition_json, request_data, task_instance):
         """
         Evaluates a condition against the request data.
+        The condition is compiled once (see jsonForm.conditions) and cached by content.
 
         Args:
-            condition_json: The JSON string representing the condition.
+            condition_json: The condition, a dict or a JSON string.
             request_data: The request data (from the Case).
             task_instance: The TaskInstance.
 
         Returns:
             True if the condition is met, False otherwise.
         """
-        if not condition_json:
+        try:
+            compiled = compile_condition(condition_json)
+        except ConditionError as e:
+            task_instance.comment = f"[ERROR] {e}"  # Error comment
+            task_instance.save()
+            logger.debug(str(e))
+            raise ValueError(str(e))
+
+        if compiled is None:
             return True  # Empty condition
 
-        try:
-            # Safely load JSON data.  Handles cases where the JSONField might be None or contain invalid JSON
-            if isinstance(
-                condition_json, str
-            ):  # Check if it's a string (older Django versions might store JSON as strings)
-                condition_data = json.loads(condition_json)  # Load JSON
-            if isinstance(
-                condition_json, dict
-            ):  # Make sure it's a dictionary before merging
-                condition_data = condition_json
-        except json.JSONDecodeError as e:
-            task_instance.comment = (
-                f"[ERROR] Invalid Task Condition format json: {e}"  # Error comment
-            )
+        if len(compiled.errors) > 0:
+            task_instance.comment = f"[ERROR] Invalid Task Condition format {condition_json}; {compiled.errors[-1]}"
             task_instance.save()
-            logger.debug(
-                f"Invalid Task Condition format json: {condition_json}. Error: {e}"
-            )  # Log
-            raise ValueError(
-                f"Invalid Task Condition format json: {condition_json}. Error: {e}"
-            )  # Raise error
-            # return False
-
-        q = Q()
-
-        def build_query(cond):
-            field_name = cond["field_name"]
-            comparison_operator = cond["comparison_operator"]
-            compare_value = cond.get(
-                "compare_value"
-            )  # 使用get方法，避免key不存在的错误
-            actual_value = request_data.get(field_name)
-
-            if actual_value is None and comparison_operator != "isnull":
-                return (
-                    Q()
-                )  # 如果actual_value不存在，且不是isnull查询，则直接返回空Q对象
-
-            kwargs = {}
-
-            if comparison_operator == "in":
-                if isinstance(compare_value, list):
-                    kwargs = {f"{field_name}__in": compare_value}
-                else:
-                    task_instance.comment = f"[ERROR] Invalid Task Condition format {condition_json} Invalid compare_value for 'in' operator: {compare_value}"
-                    task_instance.save()
-                    logger.debug(
-                        f"Invalid compare_value for 'in' operator: {compare_value} in condition: {cond}"
-                    )  # 添加日志
-                    return Q()
-            elif comparison_operator == "range":
-                if isinstance(compare_value, list) and len(compare_value) == 2:
-                    kwargs = {f"{field_name}__range": compare_value}
-                else:
-                    task_instance.comment = f"[ERROR] Invalid Task Condition format {condition_json} Invalid compare_value for 'range' operator: {compare_value}"
-                    task_instance.save()
-                    return Q()
-            elif comparison_operator == "isnull":
-                kwargs = {
-                    f"{field_name}__isnull": compare_value
-                }  #  compare_value 应该为布尔值
-            elif comparison_operator == "regex":
-                kwargs = {f"{field_name}__regex": compare_value}
-            elif comparison_operator == "iregex":
-                kwargs = {f"{field_name}__iregex": compare_value}
-            else:  # 其他比较运算符
-                kwargs = {f"{field_name}__{comparison_operator}": compare_value}
-
-            return Q(**kwargs)
-
-        if "operator" in condition_data and "conditions" in condition_data:
-            operator = condition_data["operator"].upper()  # 转换为大写，忽略大小写
-            conditions = condition_data["conditions"]
-
-            for condition in conditions:
-                q_condition = build_query(condition)
-
-                if operator == "AND":
-                    q &= q_condition
-                elif operator == "OR":
-                    q |= q_condition
-                elif operator == "NOT":
-                    q = ~q_condition
-                else:
-                    task_instance.comment = f"[ERROR] Invalid Task Condition format {condition_json};Invalid operator: {operator}"
-                    task_instance.save()
-                    logger.error(
-                        f"Invalid operator: {operator} in condition: {condition_json}"
+            logger.error(f"{compiled.errors[-1]} in condition: {condition_json}")
+
+        return compiled(request_data)
+
+    def simulate(self, workflow, case_data, decisions=None, max_steps=100, graph=None):
+        """
+        Walks the workflow graph against case data without creating a case or any task
+        instance (dry run), to validate a workflow or replay historical cases.
+
+        Args:
+            workflow: The Workflow instance or id.
+            case_data: The case data (as returned by get_case_data_in_json).
+            decisions: Optional dict of flow task name to the decision taken by the
+                assignees, to continue the simulation after flow tasks.
+            max_steps: The maximum number of tasks to walk, to stop looping workflows.
+            graph: The WorkflowGraph of the workflow, loaded when not given.
+
+        Returns:
+            A dict with:
+                - status: "completed", "waiting" (stopped at a flow task), or "error"
+                - path: the names of the tasks walked
+                - steps: per task, the decision point matched and the assignees
+                - next_task: the name of the flow task the case would wait on (the
+                  names of the parallel flow tasks after a fork)
+                - message: the error message, if any
+
+        Database Operations:
+            - Read: the workflow graph when it is not cached (see Workflow.get_graph_by_id)
+        """
+        if graph is None:
+            graph = self.get_graph(getattr(workflow, "pk", workflow))
+        decisions = decisions or {}
+        result = {
+            "status": "completed",
+            "path": [],
+            "steps": [],
+            "next_task": None,
+            "message": None,
+        }
+        current_task = graph.first_task
+        while current_task is not None:
+            if len(result["path"]) >= max_steps:
+                result["status"] = "error"
+                result["message"] = f"Stopped after {max_steps} tasks, the workflow may loop"
+                break
+            result["path"].append(current_task.name)
+            step = {
+                "task": current_task.name,
+                "task_type": current_task.task_type,
+                "decision_point": None,
+                "decision_point_id": None,
+                "matched_values": {},
+                "assign_to": [],
+            }
+            result["steps"].append(step)
+
+            if current_task.task_type in (
+                constants.TASK_TYPE_AUTO,
+                constants.TASK_TYPE_JOIN,
+            ):
+                try:
+                    dp, compiled = self.match_decision_point(
+                        graph.get_decision_points(current_task), case_data
                     )
-                    return False
-        elif (
-            "field_name" in condition_data and "comparison_operator" in condition_data
-        ):  # 兼容单个condition的情况
-            q = build_query(condition_data)
-        else:
-            task_instance.comment = (
-                f"[ERROR] Invalid Task Condition format {condition_json}"
-            )
-            task_instance.save()
-            logger.error(f"Invalid operator: {operator} in condition: {condition_json}")
-            return False
-
-        if isinstance(request_data, dict):
-            # 遍历 condition 中用到的字段，检查是否都在 request_data 中
-            fields_in_condition = set()
-            if "conditions" in condition_data:
-                for cond in condition_data["conditions"]:
-                    fields_in_condition.add(cond["field_name"])
-            elif "field_name" in condition_data:
-                fields_in_condition.add(condition_data["field_name"])
-            for field in fields_in_condition:
-                if field not in request_data:
-                    return False  # 只要有一个字段不存在，就返回False
-            return q.check(request_data)  # 直接使用 request_data 字典进行判断
-        else:
-            return False
+                except ConditionError as e:
+                    result["status"] = "error"
+                    result["message"] = str(e)
+                    break
+            elif current_task.task_type == constants.TASK_TYPE_FORK:
+                try:
+                    branches = [
+                        d.next_task
+                        for d in graph.get_decision_points(current_task)
+                        if d.next_task is not None
+                        and self.match_decision_point([d], case_data)[0] is not None
+                    ]
+                except ConditionError as e:
+                    result["status"] = "error"
+                    result["message"] = str(e)
+                    break
+                step["branches"] = [b.name for b in branches]
+                if any(decisions.get(b.name) is None for b in branches):
+                    result["status"] = "waiting"
+                    result["next_task"] = ", ".join(step["branches"])
+                    break
+                # like completed task instances, the highest priority decision moves the case
+                taken = [
+                    d
+                    for b in branches
+                    for d in graph.get_decision_points(b)
+                    if d.decision == decisions[b.name]
+                ]
+                if len(taken) == 0:
+                    result["status"] = "error"
+                    result["message"] = f"No decision of the branches of fork task {current_task.name} is found"
+                    break
+                dp = min(taken, key=lambda d: d.priority)
+                compiled = None
+            elif current_task.task_type == constants.TASK_TYPE_FLOW:
+                step["assign_to"] = self.describe_assignees(current_task)
+                decision = decisions.get(current_task.name)
+                if decision is None:
+                    result["status"] = "waiting"
+                    result["next_task"] = current_task.name
+                    break
+                dp = next(
+                    (
+                        d
+                        for d in graph.get_decision_points(current_task)
+                        if d.decision == decision
+                    ),
+                    None,
+                )
+                compiled = None
+                if dp is None:
+                    result["status"] = "error"
+                    result["message"] = f"Decision {decision} is not found in task {current_task.name}"
+                    break
+            else:
+                result["status"] = "error"
+                result["message"] = f"Unexpected {current_task.task_type} task: {current_task.name}"
+                break
+
+            if dp is not None:
+                step["decision_point"] = dp.decision
+                step["decision_point_id"] = str(dp.id)
+                if compiled is not None:
+                    step["matched_values"] = compiled.matched_values(case_data)
+            current_task = dp.next_task if dp is not None else None
+        return result
+
+    def match_decision_point(self, decision_points, request_data):
+        """
+        Finds the first decision point (by priority) whose condition matches the data,
+        without recording anything on a task instance, see simulate.
+
+        Returns:
+            A tuple of the DecisionPoint and its compiled condition, or (None, None).
+
+        Raises:
+            ConditionError: If a condition is not valid JSON.
+        """
+        for dp in decision_points:
+            compiled = compile_condition(dp.condition)
+            if compiled is None or compiled(request_data):
+                return dp, compiled
+        return None, None
+
+    def describe_assignees(self, task):
+        """
+        Describes who a flow task would be assigned to. Roles are resolved per case
+        (see Permission.get_assign_to_role), so only the role name is given for them.
+        """
+        if task.assign_to_role is not None:
+            return [f"[role:{task.assign_to_role.name}]"]
+        return [str(per) for per in task.assign_to.all()]
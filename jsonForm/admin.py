@@ -1,4 +1,8 @@
+from datetime import timedelta
 from django.contrib import admin
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
 from .models import (
     FormSection,
     FormTemplate,
@@ -9,9 +13,14 @@ from .models import (
     TaskInstance,
     Case,
     CaseData,
+    WorkflowJob,
+    TaskTimer,
+    SectionProjection,
+    WorkflowTraceSpan,
 )
 from base.admin import BaseAuditAdmin, default_readonly_fields
 from userManagement.models import AppMenu
+from .tracing import RingBufferSink, summarize_recent_spans, summarize_spans
 from .forms import (
     FormTemplateForm,
     FormSectionInlineFormSet,
@@ -196,6 +205,138 @@ class WorkflowInstanceAdmin(BaseAuditAdmin):
 admin.site.register(WorkflowInstance, WorkflowInstanceAdmin)
 
 
+class WorkflowJobAdmin(admin.ModelAdmin):
+    list_display = [
+        "id",
+        "case_model",
+        "case_id",
+        "task",
+        "status",
+        "attempts",
+        "run_after",
+        "updated_at",
+    ]
+    list_filter = ["status", "case_model"]
+    search_fields = ["id", "case_id", "idempotency_key", "last_error"]
+    readonly_fields = ["idempotency_key", "created_at", "updated_at"]
+    ordering = ["-created_at"]
+    list_per_page = 20
+
+
+admin.site.register(WorkflowJob, WorkflowJobAdmin)
+
+
+class TaskTimerAdmin(admin.ModelAdmin):
+    list_display = [
+        "id",
+        "kind",
+        "task",
+        "task_instance_id",
+        "due_at",
+        "status",
+        "processed_at",
+    ]
+    list_filter = ["kind", "status"]
+    search_fields = ["id", "task_instance_id", "last_error"]
+    ordering = ["-due_at"]
+    list_per_page = 20
+
+
+admin.site.register(TaskTimer, TaskTimerAdmin)
+
+
+class WorkflowTraceSpanAdmin(admin.ModelAdmin):
+    list_display = [
+        "started_at",
+        "name",
+        "task_name",
+        "decision_point_name",
+        "case_id",
+        "duration_ms",
+        "queries",
+    ]
+    list_filter = ["name"]
+    search_fields = ["trace_id", "case_id", "task_name", "decision_point_name"]
+    ordering = ["-started_at"]
+    list_per_page = 50
+    change_list_template = "admin/jsonForm/workflowtracespan/change_list.html"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                "summary/",
+                self.admin_site.admin_view(self.summary_view),
+                name="jsonForm_workflowtracespan_summary",
+            )
+        ] + super().get_urls()
+
+    def summary_view(self, request):
+        """
+        The slowest tasks and decision points over the last ?hours= (24 by default),
+        from the saved spans, or from the spans in memory of this worker (?source=memory).
+        """
+        try:
+            hours = max(int(request.GET.get("hours", 24)), 1)
+        except ValueError:
+            hours = 24
+        source = request.GET.get("source", "database")
+        if source == "memory":
+            summary = summarize_recent_spans()
+            span_count = len(RingBufferSink.recent())
+        else:
+            summary = summarize_spans(timezone.now() - timedelta(hours=hours))
+            span_count = sum(row["count"] for row in summary["steps"])
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Workflow trace summary",
+            "summary": summary,
+            "hours": hours,
+            "source": source,
+            "span_count": span_count,
+        }
+        return TemplateResponse(
+            request, "admin/jsonForm/workflowtracespan/summary.html", context
+        )
+
+
+admin.site.register(WorkflowTraceSpan, WorkflowTraceSpanAdmin)
+
+
+class SectionProjectionAdmin(admin.ModelAdmin):
+    list_display = ["template", "index", "table_name", "status", "built_at"]
+    list_filter = ["status"]
+    search_fields = ["template__code", "template__name", "table_name"]
+    readonly_fields = [
+        "template",
+        "index",
+        "table_name",
+        "columns",
+        "status",
+        "built_at",
+        "created_at",
+        "updated_at",
+    ]
+    ordering = ["template", "index"]
+    list_per_page = 20
+
+    # projections are built and dropped by the build_section_projections command
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+admin.site.register(SectionProjection, SectionProjectionAdmin)
+
+
 # from .models import  CaseData
 # from .forms import CaseDataForm
 # class CaseDataAdmin(BaseAuditAdmin):
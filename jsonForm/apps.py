@@ -7,3 +7,26 @@ class JsonformConfig(AppConfig):
 
     def ready(self):
         import jsonForm.signals
+        from django.apps import apps
+        from base.cache import register_cache_tags
+        from .models import (
+            CaseBaseModel,
+            CaseDataBaseModel,
+            TaskInstanceBaseModel,
+            WorkflowInstanceBaseModel,
+        )
+
+        # the case lists cache their DataTables totals with the tags of the case
+        # models (see base.util.get_datatables_total), registered in every process so
+        # that a save invalidates them before the process served a list
+        instance_models = (
+            CaseBaseModel,
+            CaseDataBaseModel,
+            TaskInstanceBaseModel,
+            WorkflowInstanceBaseModel,
+        )
+        register_cache_tags(
+            model._meta.label
+            for model in apps.get_models()
+            if issubclass(model, instance_models)
+        )
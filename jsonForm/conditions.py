@@ -0,0 +1,304 @@
+"""
+Compiles DecisionPoint conditions into Python predicates.
+
+A condition is either a single comparison:
+    {"field_name": "amount", "comparison_operator": "gt", "compare_value": 100}
+or a list of comparisons combined with an operator (AND, OR, NOT):
+    {"operator": "AND", "conditions": [{...}, {...}]}
+
+comparison_operator is a Django field lookup (exact, iexact, contains, icontains, in, gt,
+gte, lt, lte, startswith, istartswith, endswith, iendswith, range, isnull, regex, iregex).
+
+The predicates behave like the Q(**{f"{field_name}__{comparison_operator}": compare_value})
+objects conditions used to be checked with:
+- a comparison of a field without value (None) is ignored, except for isnull, like an empty Q;
+- the condition is False if a field is missing from the data;
+- NOT negates the last condition of the list.
+"""
+
+from functools import lru_cache
+import json
+import logging
+import re
+
+logger = logging.getLogger("django")
+
+
+class ConditionError(ValueError):
+    pass
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _parse_number(value):
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def _to_numbers(value, other):
+    """
+    Returns value and other as numbers when one is a number and the other a numeric
+    string, e.g. case data "100" with compare_value 50, or case data 7 with
+    compare_value "5".
+    """
+    if isinstance(value, str) and _is_number(other):
+        return _parse_number(value), other
+    if isinstance(other, str) and _is_number(value):
+        return value, _parse_number(other)
+    return value, other
+
+
+def _compare(compare):
+    def decorator(func):
+        def check(actual):
+            try:
+                return func(*_to_numbers(actual, compare))
+            except TypeError:  # values that cannot be compared, e.g. str and int
+                return False
+
+        return check
+
+    return decorator
+
+
+def _in(compare_value):
+    values = list(compare_value)
+    try:
+        value_set = frozenset(values)
+    except TypeError:
+        value_set = None
+
+    def check(actual):
+        if value_set is not None:
+            try:
+                if actual in value_set:
+                    return True
+            except TypeError:
+                pass
+        for v in values:
+            a, b = _to_numbers(actual, v)
+            if a == b:
+                return True
+        return False
+
+    return check
+
+
+def _regex(compare_value, flags=0):
+    try:
+        pattern = re.compile(str(compare_value), flags)
+    except re.error as e:
+        raise ConditionError(f"Invalid regex {compare_value}: {e}")
+    return lambda actual: pattern.search(str(actual)) is not None
+
+
+def _build_check(comparison_operator, compare_value):
+    """
+    Returns the function checking a (not None) field value for comparison_operator.
+    """
+    c = compare_value
+    if comparison_operator == "exact":
+        return _compare(c)(lambda a, b: a == b)
+    if comparison_operator == "iexact":
+        return lambda a: str(a).casefold() == str(c).casefold()
+    if comparison_operator == "contains":
+        return lambda a: str(c) in str(a)
+    if comparison_operator == "icontains":
+        return lambda a: str(c).casefold() in str(a).casefold()
+    if comparison_operator == "startswith":
+        return lambda a: str(a).startswith(str(c))
+    if comparison_operator == "istartswith":
+        return lambda a: str(a).casefold().startswith(str(c).casefold())
+    if comparison_operator == "endswith":
+        return lambda a: str(a).endswith(str(c))
+    if comparison_operator == "iendswith":
+        return lambda a: str(a).casefold().endswith(str(c).casefold())
+    if comparison_operator == "gt":
+        return _compare(c)(lambda a, b: a > b)
+    if comparison_operator == "gte":
+        return _compare(c)(lambda a, b: a >= b)
+    if comparison_operator == "lt":
+        return _compare(c)(lambda a, b: a < b)
+    if comparison_operator == "lte":
+        return _compare(c)(lambda a, b: a <= b)
+    if comparison_operator == "regex":
+        return _regex(c)
+    if comparison_operator == "iregex":
+        return _regex(c, re.IGNORECASE)
+    raise ConditionError(f"Invalid comparison_operator: {comparison_operator}")
+
+
+def _compile_comparison(cond, errors):
+    """
+    Returns a predicate of the data returning True/False, or None when the comparison
+    is ignored (no value, or an invalid compare_value, like an empty Q).
+    """
+    field_name = cond["field_name"]
+    comparison_operator = cond["comparison_operator"]
+    compare_value = cond.get("compare_value")
+
+    if comparison_operator == "isnull":
+        expected = bool(compare_value)
+        return lambda data: (data.get(field_name) is None) == expected
+
+    if comparison_operator == "in" and not isinstance(compare_value, list):
+        errors.append(
+            f"Invalid compare_value for 'in' operator: {compare_value} in condition: {cond}"
+        )
+        return lambda data: None
+    if comparison_operator == "range":
+        if not isinstance(compare_value, list) or len(compare_value) != 2:
+            errors.append(
+                f"Invalid compare_value for 'range' operator: {compare_value} in condition: {cond}"
+            )
+            return lambda data: None
+        low, high = compare_value
+        check_low = _build_check("gte", low)
+        check_high = _build_check("lte", high)
+        check = lambda actual: check_low(actual) and check_high(actual)
+    elif comparison_operator == "in":
+        check = _in(compare_value)
+    else:
+        check = _build_check(comparison_operator, compare_value)
+
+    def predicate(data):
+        actual = data.get(field_name)
+        if actual is None:
+            return None
+        return check(actual)
+
+    return predicate
+
+
+def _all(predicates):
+    def predicate(data):
+        result = None
+        for p in predicates:
+            r = p(data)
+            if r is False:
+                return False
+            if r is True:
+                result = True
+        return result
+
+    return predicate
+
+
+def _any(predicates):
+    def predicate(data):
+        result = None
+        for p in predicates:
+            r = p(data)
+            if r is True:
+                return True
+            if r is False:
+                result = False
+        return result
+
+    return predicate
+
+
+def _not(predicate):
+    def negated(data):
+        r = predicate(data)
+        return None if r is None else not r
+
+    return negated
+
+
+class CompiledCondition:
+    """
+    A compiled condition, call it with the case data (dict) to evaluate it.
+
+    Attributes:
+        fields: The field names the condition uses, all must be in the data.
+        errors: The errors found in the condition, the invalid parts are ignored (or
+            the condition is always False when its format is invalid).
+    """
+
+    __slots__ = ("predicate", "fields", "errors", "valid")
+
+    def __init__(self, predicate, fields, errors, valid=True):
+        self.predicate = predicate
+        self.fields = fields
+        self.errors = errors
+        self.valid = valid
+
+    def __call__(self, data):
+        if not self.valid or not isinstance(data, dict):
+            return False
+        for field in self.fields:
+            if field not in data:
+                return False
+        return self.predicate(data) is not False
+
+    def matched_values(self, data):
+        return {f: data[f] for f in self.fields if f in data}
+
+
+def _compile(condition_data):
+    errors = []
+    try:
+        if "operator" in condition_data and "conditions" in condition_data:
+            operator = condition_data["operator"].upper()
+            conditions = condition_data["conditions"]
+            fields = tuple(dict.fromkeys(c["field_name"] for c in conditions))
+            predicates = [_compile_comparison(c, errors) for c in conditions]
+            if operator == "AND":
+                predicate = _all(predicates)
+            elif operator == "OR":
+                predicate = _any(predicates)
+            elif operator == "NOT":
+                predicate = (
+                    _not(predicates[-1]) if len(predicates) > 0 else lambda data: None
+                )
+            else:
+                return CompiledCondition(
+                    None, fields, [f"Invalid operator: {operator}"], valid=False
+                )
+        elif (
+            "field_name" in condition_data and "comparison_operator" in condition_data
+        ):
+            fields = (condition_data["field_name"],)
+            predicate = _compile_comparison(condition_data, errors)
+        else:
+            return CompiledCondition(None, (), ["Invalid format"], valid=False)
+    except (ConditionError, KeyError, TypeError, AttributeError) as e:
+        return CompiledCondition(None, (), [f"Invalid condition: {e}"], valid=False)
+    return CompiledCondition(predicate, fields, errors)
+
+
+@lru_cache(maxsize=1024)
+def _compile_text(text):
+    return _compile(json.loads(text))
+
+
+def compile_condition(condition):
+    """
+    Compiles a DecisionPoint condition (dict or JSON string). Compiled conditions are
+    cached by content, so a DecisionPoint is compiled again only when its condition changes.
+
+    Args:
+        condition: The condition, a dict or a JSON string.
+
+    Returns:
+        The CompiledCondition, or None for an empty condition (always True).
+
+    Raises:
+        ConditionError: If the condition is not valid JSON.
+    """
+    if not condition:
+        return None
+    try:
+        if isinstance(condition, str):
+            condition = json.loads(condition)
+        text = json.dumps(condition, sort_keys=True, default=str)
+    except (json.JSONDecodeError, TypeError) as e:
+        raise ConditionError(f"Invalid Task Condition format json: {condition}. Error: {e}")
+    if not isinstance(condition, dict):
+        return CompiledCondition(None, (), ["Invalid format"], valid=False)
+    return _compile_text(text)
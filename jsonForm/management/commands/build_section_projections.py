@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand, CommandError
+from jsonForm.models import FormTemplate, SectionProjection
+from jsonForm import projections
+
+
+class Command(BaseCommand):
+    help = (
+        "Builds the typed projection tables of the section data of forms (one per form "
+        "section index), so the case data search uses indexed columns. Run it again "
+        "after publishing a new section version, the tables whose columns changed are "
+        "re-created."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("forms", nargs="+", help="Form template codes")
+        parser.add_argument(
+            "--index",
+            type=int,
+            action="append",
+            help="Form section index, all the published section indexes by default",
+        )
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Re-create the tables even when their columns did not change",
+        )
+        parser.add_argument(
+            "--drop",
+            action="store_true",
+            help="Drop the projections, the search goes back to the JSON lookups",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of case data projected at once",
+        )
+
+    def handle(self, *args, **options):
+        for code in options["forms"]:
+            template = FormTemplate.objects.filter(code=code).first()
+            if template is None:
+                raise CommandError(f"Form {code} is not found")
+            indexes = options["index"] or sorted(
+                set(
+                    template.form_section_form_template.filter(
+                        is_publish=True
+                    ).values_list("index", flat=True)
+                )
+            )
+            for index in indexes:
+                if options["drop"]:
+                    self.drop(template, index)
+                    continue
+                projection, count = projections.build_projection(
+                    template,
+                    index,
+                    rebuild=options["rebuild"],
+                    batch_size=max(options["batch_size"], 1),
+                )
+                self.stdout.write(
+                    f"{code} section {index}: {len(projection.columns)} columns, "
+                    f"{count} case data projected to {projection.table_name}"
+                )
+
+    def drop(self, template, index):
+        projection = SectionProjection.objects.filter(
+            template=template, index=index
+        ).first()
+        if projection is None:
+            return
+        projection.delete()
+        projections.drop_table(projection)
+        self.stdout.write(f"{template.code} section {index}: {projection.table_name} dropped")
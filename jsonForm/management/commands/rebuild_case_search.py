@@ -0,0 +1,59 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from jsonForm.models import CaseDataBaseModel
+from jsonForm import search
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the full-text search documents of the cases from their section data "
+        "(the documents are kept up to date when case data are saved)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "models",
+            nargs="*",
+            help="Case data models (app_label.Model), all of them by default",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of cases saved at once",
+        )
+
+    def handle(self, *args, **options):
+        if options["models"]:
+            try:
+                models = [apps.get_model(label) for label in options["models"]]
+            except (LookupError, ValueError) as e:
+                raise CommandError(e)
+        else:
+            models = [
+                model
+                for model in apps.get_models()
+                if issubclass(model, CaseDataBaseModel)
+            ]
+        batch_size = max(options["batch_size"], 1)
+        for model in models:
+            case_class = model._meta.get_field("case").related_model
+            count = 0
+            section_datas_by_case = {}
+            for case_id, section_data in (
+                model.objects.order_by("case_id", "form_section__index")
+                .values_list("case_id", "section_data")
+                .iterator(chunk_size=2000)
+            ):
+                if (
+                    case_id not in section_datas_by_case
+                    and len(section_datas_by_case) >= batch_size
+                ):
+                    search.save_documents(case_class, section_datas_by_case)
+                    count += len(section_datas_by_case)
+                    section_datas_by_case = {}
+                section_datas_by_case.setdefault(case_id, []).append(section_data)
+            if len(section_datas_by_case) > 0:
+                search.save_documents(case_class, section_datas_by_case)
+                count += len(section_datas_by_case)
+            self.stdout.write(f"{model._meta.label}: {count} case documents rebuilt")
@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+from jsonForm.TaskTimerService import TaskTimerService
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        "Sends the reminders and escalates the overdue flow task instances "
+        "(Task.remind_in, Task.due_in and Task.escalate_to). The worker sleeps until "
+        "the earliest due timer instead of polling the active task instances."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=getattr(settings, "WORKFLOW_TIMER_BATCH_SIZE", 200),
+            help="Number of timers processed per batch",
+        )
+        parser.add_argument(
+            "--max-sleep",
+            type=float,
+            default=getattr(settings, "WORKFLOW_TIMER_MAX_SLEEP", 60),
+            help="Seconds the worker sleeps at most, to pick up timers created meanwhile",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Process the due timers and exit",
+        )
+
+    def handle(self, *args, **options):
+        service = TaskTimerService()
+        totals = {"processed": 0, "reminded": 0, "escalated": 0, "skipped": 0}
+        while True:
+            close_old_connections()
+            result = service.process_due(batch_size=options["batch_size"])
+            for key, value in result.items():
+                totals[key] += value
+            if result["processed"] >= options["batch_size"]:
+                continue  # more timers may be due
+            if options["once"]:
+                break
+            next_due_at = service.get_next_due_at()
+            sleep = options["max_sleep"]
+            if next_due_at is not None:
+                sleep = min(
+                    max((next_due_at - timezone.now()).total_seconds(), 0), sleep
+                )
+            time.sleep(sleep)
+        self.stdout.write(
+            f"{totals['processed']} timers processed: {totals['reminded']} reminded, "
+            f"{totals['escalated']} escalated, {totals['skipped']} skipped"
+        )
@@ -0,0 +1,148 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from jsonForm.models import WorkflowJob
+from jsonForm.CaseTransitionService import CaseTransitionService
+import time
+
+import logging
+
+logger = logging.getLogger("django")
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the pending workflow jobs (auto tasks enqueued when "
+        "WORKFLOW_DEFERRED_AUTO_TASKS is on), with N concurrent workers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency", type=int, default=1, help="Number of jobs run at the same time"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=50, help="Number of jobs claimed at once"
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=getattr(settings, "WORKFLOW_JOB_POLL_INTERVAL", 2),
+            help="Seconds to wait when there is no job",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Run the pending jobs and exit instead of waiting for new ones",
+        )
+
+    def handle(self, *args, **options):
+        self.max_attempts = getattr(settings, "WORKFLOW_JOB_MAX_ATTEMPTS", 3)
+        self.retry_delay = getattr(settings, "WORKFLOW_JOB_RETRY_DELAY", 30)
+        self.lease = getattr(settings, "WORKFLOW_JOB_LEASE", 600)
+        concurrency = max(options["concurrency"], 1)
+        totals = {"done": 0, "retried": 0, "failed": 0}
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            while True:
+                self.reclaim_expired_jobs()
+                jobs = self.claim_jobs(options["batch_size"])
+                if len(jobs) == 0:
+                    if options["once"]:
+                        break
+                    time.sleep(options["poll_interval"])
+                    continue
+                for result in pool.map(self.run_job, jobs):
+                    totals[result] += 1
+        self.stdout.write(
+            f"{totals['done']} jobs done, {totals['retried']} to retry, {totals['failed']} failed"
+        )
+
+    def reclaim_expired_jobs(self):
+        """
+        Releases the jobs running for longer than WORKFLOW_JOB_LEASE seconds, left by
+        a worker that crashed or was killed after claiming them. They are pending
+        again, or failed when they used all their attempts (the attempt of the lost
+        run was counted when it was claimed).
+
+        Returns:
+            The number of jobs released.
+
+        Database Operations:
+            - Write: WorkflowJob (two updates)
+        """
+        now = timezone.now()
+        expired = WorkflowJob.objects.filter(
+            status=WorkflowJob.RUNNING, updated_at__lt=now - timedelta(seconds=self.lease)
+        )
+        error = f"Lease of {self.lease} seconds expired, the worker was lost"
+        failed = expired.filter(attempts__gte=self.max_attempts).update(
+            status=WorkflowJob.FAILED, last_error=error, updated_at=now
+        )
+        released = expired.update(
+            status=WorkflowJob.PENDING, run_after=now, last_error=error, updated_at=now
+        )
+        if failed + released > 0:
+            logger.warning(
+                f"Workflow jobs with an expired lease: {released} pending again, {failed} failed"
+            )
+        return failed + released
+
+    def claim_jobs(self, batch_size):
+        """
+        Claims up to batch_size pending jobs that are due. A job is claimed by moving
+        it from pending to running, so a job is run by one worker only, even with
+        several run_workflow_jobs processes. The claim time (updated_at) starts the
+        lease of the job, see reclaim_expired_jobs.
+
+        Database Operations:
+            - Read: WorkflowJob (locked rows are skipped when the database supports it)
+            - Write: WorkflowJob
+        """
+        with transaction.atomic():
+            queryset = WorkflowJob.objects.filter(
+                status=WorkflowJob.PENDING, run_after__lte=timezone.now()
+            ).order_by("run_after")
+            if connection.features.has_select_for_update_skip_locked:
+                queryset = queryset.select_for_update(skip_locked=True)
+            ids = list(queryset.values_list("id", flat=True)[:batch_size])
+            claimed = []
+            for job_id in ids:
+                # compare and set, another worker may have claimed the job meanwhile
+                if WorkflowJob.objects.filter(
+                    pk=job_id, status=WorkflowJob.PENDING
+                ).update(
+                    status=WorkflowJob.RUNNING,
+                    attempts=F("attempts") + 1,
+                    updated_at=timezone.now(),
+                ):
+                    claimed.append(job_id)
+        return list(WorkflowJob.objects.filter(pk__in=claimed).order_by("run_after"))
+
+    def run_job(self, job):
+        """
+        Runs a claimed job in a worker thread, and reschedules it when it fails.
+
+        Returns:
+            "done", "retried" or "failed".
+        """
+        close_old_connections()
+        try:
+            CaseTransitionService().run_job(job)
+            return "done"
+        except Exception as e:
+            logger.error(f"Workflow job {job} failed: {e}")
+            if job.attempts < self.max_attempts:
+                job.status = WorkflowJob.PENDING
+                job.run_after = timezone.now() + timedelta(
+                    seconds=self.retry_delay * 2 ** (job.attempts - 1)
+                )
+            else:
+                job.status = WorkflowJob.FAILED
+            job.last_error = str(e)
+            job.save(update_fields=["status", "run_after", "last_error", "updated_at"])
+            return "retried" if job.status == WorkflowJob.PENDING else "failed"
+        finally:
+            connection.close()  # each thread has its own connection
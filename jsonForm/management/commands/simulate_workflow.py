@@ -0,0 +1,125 @@
+from django.core.management.base import BaseCommand, CommandError
+from jsonForm.models import Workflow
+from jsonForm.WorkflowExecutor import WorkflowExecutor
+import json
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays case payloads (JSONL) through a workflow without creating cases, "
+        "and reports the throughput, the final statuses and the decision point hit rates."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("workflow", help="Workflow name or id")
+        parser.add_argument(
+            "file",
+            help='JSONL file, one case data per line, or {"data": {...}, "decisions": {"<flow task>": "<decision>"}}',
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=1, help="Replay the file N times"
+        )
+        parser.add_argument(
+            "--max-steps",
+            type=int,
+            default=100,
+            help="Maximum number of tasks walked per case",
+        )
+        parser.add_argument("--json", action="store_true", help="Print JSON")
+
+    def handle(self, *args, **options):
+        workflow = (
+            Workflow.objects.filter(name=options["workflow"]).first()
+            or self.get_workflow_by_id(options["workflow"])
+        )
+        if workflow is None:
+            raise CommandError(f"Workflow {options['workflow']} is not found")
+
+        payloads = []
+        with open(options["file"], encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                if line.strip() == "":
+                    continue
+                try:
+                    payload = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise CommandError(f"Invalid JSON on line {line_no}: {e}")
+                if "data" in payload and isinstance(payload["data"], dict):
+                    payloads.append((payload["data"], payload.get("decisions")))
+                else:
+                    payloads.append((payload, None))
+
+        executor = WorkflowExecutor()
+        graph = executor.get_graph(workflow.pk)  # load the graph once, before timing
+        statuses = {}
+        visits = {}  # task name -> number of cases reaching it
+        hits = {}  # (task name, decision) -> number of cases taking it
+        errors = {}
+        started_at = time.perf_counter()
+        for _ in range(max(options["repeat"], 1)):
+            for data, decisions in payloads:
+                result = executor.simulate(
+                    workflow,
+                    data,
+                    decisions,
+                    max_steps=options["max_steps"],
+                    graph=graph,
+                )
+                statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+                if result["message"]:
+                    errors[result["message"]] = errors.get(result["message"], 0) + 1
+                for step in result["steps"]:
+                    visits[step["task"]] = visits.get(step["task"], 0) + 1
+                    key = (step["task"], step["decision_point"])
+                    hits[key] = hits.get(key, 0) + 1
+        elapsed = time.perf_counter() - started_at
+        total = sum(statuses.values())
+
+        decision_points = [
+            {
+                "task": task,
+                "decision_point": decision,
+                "hits": count,
+                "hit_rate": round(count / visits[task], 4),
+            }
+            for (task, decision), count in sorted(
+                hits.items(), key=lambda item: (item[0][0], str(item[0][1]))
+            )
+        ]
+        report = {
+            "workflow": workflow.name,
+            "cases": total,
+            "seconds": round(elapsed, 6),
+            "cases_per_second": round(total / elapsed, 1) if elapsed > 0 else None,
+            "statuses": statuses,
+            "errors": errors,
+            "decision_points": decision_points,
+        }
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(
+            f"{workflow.name}: {total} cases in {elapsed:.3f}s ({report['cases_per_second']} cases/sec)"
+        )
+        self.stdout.write(
+            "Statuses: " + ", ".join(f"{k}={v}" for k, v in sorted(statuses.items()))
+        )
+        for message, count in errors.items():
+            self.stdout.write(self.style.WARNING(f"{count} x {message}"))
+        header = f"{'task':<40} {'decision point':<30} {'hits':>8} {'rate':>6}"
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for dp in decision_points:
+            decision = dp["decision_point"] or "-"
+            self.stdout.write(
+                f"{dp['task'][:40]:<40} {decision[:30]:<30} {dp['hits']:>8} {dp['hit_rate']:>6.2f}"
+            )
+
+    def get_workflow_by_id(self, value):
+        try:
+            return Workflow.objects.filter(pk=value).first()
+        except Exception:  # not a valid uuid
+            return None
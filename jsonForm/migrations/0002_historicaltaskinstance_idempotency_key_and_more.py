@@ -0,0 +1,46 @@
+# Generated by Django 5.0.9 on 2026-10-18 08:14
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jsonForm', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicaltaskinstance',
+            name='idempotency_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=127, null=True),
+        ),
+        migrations.AddField(
+            model_name='taskinstance',
+            name='idempotency_key',
+            field=models.CharField(blank=True, editable=False, max_length=127, null=True, unique=True),
+        ),
+        migrations.CreateModel(
+            name='WorkflowJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('idempotency_key', models.CharField(max_length=127, unique=True)),
+                ('case_app_label', models.CharField(max_length=63)),
+                ('case_model', models.CharField(max_length=63)),
+                ('case_id', models.CharField(max_length=63)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=15)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='workflow_job_task', to='jsonForm.task')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after'], name='jsonForm_wo_status_cecdc0_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.0.9 on 2026-10-18 08:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_workflow_instance_summary(apps, schema_editor):
+    """
+    Computes the summary of the active workflow instances from the task instances of
+    their case, like WorkflowExecutor.get_priority_decision.
+    """
+    Case = apps.get_model("jsonForm", "Case")
+    WorkflowInstance = apps.get_model("jsonForm", "WorkflowInstance")
+    cases = Case.objects.filter(workflow_instance__is_active=True)
+    for case in cases.iterator():
+        task_instances = case.task_instances.all()
+        decision = (
+            task_instances.filter(decision_point__isnull=False)
+            .order_by("decision_point__priority")
+            .values_list("decision_point_id", flat=True)
+            .first()
+        )
+        WorkflowInstance.objects.filter(pk=case.workflow_instance_id).update(
+            active_task_count=task_instances.filter(is_active=True).count(),
+            pending_decision_point_id=decision,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jsonForm', '0002_historicaltaskinstance_idempotency_key_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicalworkflowinstance',
+            name='active_task_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='historicalworkflowinstance',
+            name='pending_decision_point',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='jsonForm.decisionpoint'),
+        ),
+        migrations.AddField(
+            model_name='workflowinstance',
+            name='active_task_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='workflowinstance',
+            name='pending_decision_point',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(app_label)s_%(class)s_pending_decision_point', to='jsonForm.decisionpoint'),
+        ),
+        migrations.RunPython(
+            fill_workflow_instance_summary, migrations.RunPython.noop
+        ),
+    ]
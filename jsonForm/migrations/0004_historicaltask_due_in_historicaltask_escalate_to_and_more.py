@@ -0,0 +1,65 @@
+# Generated by Django 5.0.9 on 2026-10-18 08:19
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jsonForm', '0003_historicalworkflowinstance_active_task_count_and_more'),
+        ('userManagement', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicaltask',
+            name='due_in',
+            field=models.DurationField(blank=True, help_text='time to complete the task, it is escalated when it is overdue', null=True),
+        ),
+        migrations.AddField(
+            model_name='historicaltask',
+            name='escalate_to',
+            field=models.ForeignKey(blank=True, db_constraint=False, help_text='the overdue task is reassigned to this user group, or only the assignees are notified when it is empty', null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='userManagement.permission'),
+        ),
+        migrations.AddField(
+            model_name='historicaltask',
+            name='remind_in',
+            field=models.DurationField(blank=True, help_text='time after which the assignees are reminded of the task', null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='due_in',
+            field=models.DurationField(blank=True, help_text='time to complete the task, it is escalated when it is overdue', null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='escalate_to',
+            field=models.ForeignKey(blank=True, help_text='the overdue task is reassigned to this user group, or only the assignees are notified when it is empty', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='task_escalate_to', to='userManagement.permission'),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='remind_in',
+            field=models.DurationField(blank=True, help_text='time after which the assignees are reminded of the task', null=True),
+        ),
+        migrations.CreateModel(
+            name='TaskTimer',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('remind', 'Remind'), ('escalate', 'Escalate')], max_length=15)),
+                ('task_instance_app_label', models.CharField(max_length=63)),
+                ('task_instance_model', models.CharField(max_length=63)),
+                ('task_instance_id', models.UUIDField()),
+                ('due_at', models.DateTimeField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('done', 'Done'), ('skipped', 'Skipped')], default='pending', max_length=15)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='task_timer_task', to='jsonForm.task')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'due_at'], name='jsonForm_ta_status_1b9ad4_idx'), models.Index(fields=['task_instance_id'], name='jsonForm_ta_task_in_b4fa4f_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.9 on 2026-10-18 08:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jsonForm', '0004_historicaltask_due_in_historicaltask_escalate_to_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkflowTraceSpan',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('trace_id', models.CharField(db_index=True, max_length=32)),
+                ('span_id', models.CharField(max_length=16)),
+                ('parent_id', models.CharField(blank=True, max_length=16, null=True)),
+                ('name', models.CharField(max_length=63)),
+                ('task_id', models.CharField(blank=True, max_length=63, null=True)),
+                ('task_name', models.CharField(blank=True, max_length=255, null=True)),
+                ('decision_point_id', models.CharField(blank=True, max_length=63, null=True)),
+                ('decision_point_name', models.CharField(blank=True, max_length=255, null=True)),
+                ('case_id', models.CharField(blank=True, max_length=63, null=True)),
+                ('started_at', models.DateTimeField()),
+                ('duration_ms', models.FloatField()),
+                ('queries', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('attributes', models.JSONField(blank=True, default=dict)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['started_at', 'name'], name='jsonForm_wo_started_755274_idx')],
+            },
+        ),
+    ]
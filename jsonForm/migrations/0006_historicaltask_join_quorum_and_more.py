@@ -0,0 +1,44 @@
+# Generated by Django 5.0.9 on 2026-10-18 08:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jsonForm', '0005_workflowtracespan'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicaltask',
+            name='join_quorum',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='for Join task, the number of parallel flow tasks to complete, all when empty', null=True),
+        ),
+        migrations.AddField(
+            model_name='historicalworkflowinstance',
+            name='join_task',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='jsonForm.task'),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='join_quorum',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='for Join task, the number of parallel flow tasks to complete, all when empty', null=True),
+        ),
+        migrations.AddField(
+            model_name='workflowinstance',
+            name='join_task',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(app_label)s_%(class)s_join_task', to='jsonForm.task'),
+        ),
+        migrations.AlterField(
+            model_name='historicaltask',
+            name='task_type',
+            field=models.CharField(choices=[('Auto', 'Manual (task to created task instance by user manually)'), ('Auto', 'Auto (task to created task instance by system workflow to auto detact the next task)'), ('Flow', 'Flow Task (task to created task instance by system workflow)'), ('Fork', 'Fork (task to start the flow tasks of all the decision points matching the case in parallel)'), ('Join', 'Join (task to continue when all or join quorum of the parallel flow tasks are completed)')], default='Flow', max_length=31),
+        ),
+        migrations.AlterField(
+            model_name='task',
+            name='task_type',
+            field=models.CharField(choices=[('Auto', 'Manual (task to created task instance by user manually)'), ('Auto', 'Auto (task to created task instance by system workflow to auto detact the next task)'), ('Flow', 'Flow Task (task to created task instance by system workflow)'), ('Fork', 'Fork (task to start the flow tasks of all the decision points matching the case in parallel)'), ('Join', 'Join (task to continue when all or join quorum of the parallel flow tasks are completed)')], default='Flow', max_length=31),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.9 on 2026-10-18 08:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jsonForm', '0006_historicaltask_join_quorum_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SectionProjection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveSmallIntegerField(default=0)),
+                ('table_name', models.CharField(max_length=63, unique=True)),
+                ('columns', models.JSONField(blank=True, default=list)),
+                ('status', models.CharField(choices=[('building', 'Building'), ('ready', 'Ready')], default='building', max_length=15)),
+                ('built_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('template', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='section_projection_template', to='jsonForm.formtemplate')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='sectionprojection',
+            constraint=models.UniqueConstraint(fields=('template', 'index'), name='unique section projection template index'),
+        ),
+    ]
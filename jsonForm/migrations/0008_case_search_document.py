@@ -0,0 +1,80 @@
+# Generated by Django 5.0.9 on 2026-10-18 08:29
+
+from django.db import migrations, models
+
+TABLE = '"jsonForm_casesearchdocument"'
+FTS_TABLE = "jsonform_casesearchdocument_fts"
+
+
+def create_search_index(apps, schema_editor):
+    """
+    PostgreSQL: a tsvector column generated from the content, with a GIN index.
+    SQLite: an FTS5 table of the content, synced by triggers. Without FTS5 the search
+    falls back to jsonForm.search.ContainsSearchBackend.
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(
+            f"ALTER TABLE {TABLE} ADD COLUMN search_vector tsvector "
+            "GENERATED ALWAYS AS (to_tsvector('simple', content)) STORED"
+        )
+        schema_editor.execute(
+            f"CREATE INDEX jsonform_casesearchdocument_vector ON {TABLE} USING GIN (search_vector)"
+        )
+    elif vendor == "sqlite":
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("PRAGMA compile_options")
+            if "ENABLE_FTS5" not in {row[0] for row in cursor.fetchall()}:
+                return
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(content, content={TABLE}, content_rowid='id')"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON {TABLE} BEGIN "
+            f"INSERT INTO {FTS_TABLE}(rowid, content) VALUES (new.id, new.content); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON {TABLE} BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', old.id, old.content); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {FTS_TABLE}_update AFTER UPDATE ON {TABLE} BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', old.id, old.content); "
+            f"INSERT INTO {FTS_TABLE}(rowid, content) VALUES (new.id, new.content); END"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(f"ALTER TABLE {TABLE} DROP COLUMN search_vector")
+    elif vendor == "sqlite":
+        for trigger in ("insert", "delete", "update"):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{trigger}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jsonForm', '0007_section_projection'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CaseSearchDocument',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('case_app_label', models.CharField(max_length=63)),
+                ('case_model', models.CharField(max_length=63)),
+                ('case_id', models.BigIntegerField()),
+                ('content', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='casesearchdocument',
+            constraint=models.UniqueConstraint(fields=('case_app_label', 'case_model', 'case_id'), name='unique case search document case'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
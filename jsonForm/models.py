@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import F, Q
 from base.models import BaseAuditModel, FileModel
 from django.core.cache import cache
 from userManagement.models import (
@@ -16,8 +17,11 @@ from jsonschema import validate, ValidationError
 from django.core.exceptions import ValidationError
 from django.urls import reverse
 from django.apps import apps
+from django.utils import timezone
 import uuid
 from base.validators import get_validator
+from .conditions import compile_condition, ConditionError
+from .workflow_graph import WorkflowGraph
 from base.cache import global_class_cache_decorator, global_instance_cache_decorator
 from django.conf import settings
 from base.util import (
@@ -30,9 +34,11 @@ from base.constants import (
     TASK_TYPE_CHOICES,
     TASK_TYPE_AUTO,
     TASK_TYPE_FLOW,
+    TASK_TYPE_JOIN,
     CASE_INITIATED,
     CASE_COMPLETED,
     JSON_FORM_TEMPLATE_SCHEMA_PATH,
+    WORKFLOW_CACHE_TAGS,
 )
 
 
@@ -174,7 +180,9 @@ class FormTemplate(BaseAuditModel):
             )
 
     @global_instance_cache_decorator(
-        cache_key="form_template_model_instance", timeout=settings.CACHE_TIMEOUT_L3
+        cache_key="form_template_model_instance",
+        timeout=settings.CACHE_TIMEOUT_L3,
+        compact=True,
     )
     def get_model_instance(self, id):
         if self.backend_app_label and self.backend_app_model:
@@ -210,7 +218,11 @@ class FormTemplate(BaseAuditModel):
         return headers
 
     @global_class_cache_decorator(
-        cache_key="form_instance", timeout=settings.CACHE_TIMEOUT_L3
+        cache_key="form_instance",
+        timeout=settings.CACHE_TIMEOUT_L4,
+        local=True,
+        tags=["jsonForm.FormTemplate"],
+        compact=True,
     )
     def get_instance_by_code(cls, code):
         result = get_object_or_redirect(cls, code=code)
@@ -220,7 +232,11 @@ class FormTemplate(BaseAuditModel):
             return result
 
     @global_class_cache_decorator(
-        cache_key="form_header", timeout=settings.CACHE_TIMEOUT_L3
+        cache_key="form_header",
+        timeout=settings.CACHE_TIMEOUT_L4,
+        local=True,
+        tags=["jsonForm.FormTemplate", "jsonForm.FormSection"],
+        stale_ttl=settings.CACHE_TIMEOUT_DEFAULT,
     )
     def get_headers_by_code(cls, code):
         form = cls.get_instance_by_code(code)
@@ -325,6 +341,7 @@ class FormSection(BaseAuditModel):
     @global_instance_cache_decorator(
         cache_key="form_section_template_model_instance",
         timeout=settings.CACHE_TIMEOUT_L3,
+        compact=True,
     )
     def get_model_instance(self, id):
         if self.template.backend_app_label and self.template.backend_app_section_model:
@@ -345,7 +362,8 @@ class FormSection(BaseAuditModel):
     @property
     @global_instance_cache_decorator(
         cache_key="form_section_template_json_key_list",
-        timeout=settings.CACHE_TIMEOUT_L3,
+        timeout=settings.CACHE_TIMEOUT_L4,
+        tags=["jsonForm.FormSection"],
     )
     def get_key_list(self):
         fields = []
@@ -613,7 +631,10 @@ class Workflow(BaseAuditModel):
         return data
 
     @global_class_cache_decorator(
-        cache_key="workflow_data", timeout=settings.CACHE_TIMEOUT_L3
+        cache_key="workflow_data",
+        timeout=settings.CACHE_TIMEOUT_L4,
+        tags=WORKFLOW_CACHE_TAGS,
+        stale_ttl=settings.CACHE_TIMEOUT_DEFAULT,
     )
     def get_data_by_id(cls, id):
         result = get_object_or_redirect(cls, pk=id)
@@ -621,6 +642,41 @@ class Workflow(BaseAuditModel):
             return None
         return result.get_workflow_data()
 
+    @global_class_cache_decorator(
+        cache_key="workflow_graph",
+        timeout=settings.CACHE_TIMEOUT_L4,
+        local=True,
+        tags=WORKFLOW_CACHE_TAGS,
+        single_flight=True,
+    )
+    def get_graph_by_id(cls, id):
+        """
+        Builds the WorkflowGraph (tasks, decision points and next task edges) of a workflow.
+
+        Args:
+            id: The Workflow id.
+
+        Returns:
+            The WorkflowGraph.
+
+        Database Operations:
+            - Read: Task (with assign_to_role), Task.assign_to (with app, role, company, department, team and its first support), DecisionPoint
+        """
+        tasks = list(
+            Task.objects.filter(workflow_id=id)
+            .select_related("assign_to_role")
+            .prefetch_related(
+                models.Prefetch(
+                    "assign_to",
+                    queryset=Permission.objects.select_related(
+                        "app", "role", "company", "department", "team__first_support"
+                    ),
+                )
+            )
+        )
+        decision_points = list(DecisionPoint.objects.filter(task__workflow_id=id))
+        return WorkflowGraph(id, tasks, decision_points)
+
 
 class Task(BaseAuditModel):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -653,6 +709,30 @@ class Task(BaseAuditModel):
     task_type = models.CharField(
         max_length=31, choices=TASK_TYPE_CHOICES, default=TASK_TYPE_FLOW
     )
+    # SLA of flow tasks, see TaskTimer and the run_task_timers command
+    due_in = models.DurationField(
+        blank=True,
+        null=True,
+        help_text="time to complete the task, it is escalated when it is overdue",
+    )
+    remind_in = models.DurationField(
+        blank=True,
+        null=True,
+        help_text="time after which the assignees are reminded of the task",
+    )
+    escalate_to = models.ForeignKey(
+        Permission,
+        related_name="task_escalate_to",
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+        help_text="the overdue task is reassigned to this user group, or only the assignees are notified when it is empty",
+    )
+    join_quorum = models.PositiveSmallIntegerField(
+        blank=True,
+        null=True,
+        help_text="for Join task, the number of parallel flow tasks to complete, all when empty",
+    )
 
     class Meta:
         constraints = [
@@ -672,6 +752,20 @@ class Task(BaseAuditModel):
             raise ValidationError(
                 f"Manual Craete Task should not be the first task in the workflow"
             )
+        if (
+            self.due_in is not None or self.remind_in is not None
+        ) and self.task_type != TASK_TYPE_FLOW:
+            raise ValidationError(f"Only Flow Task can have a due time or a reminder")
+        if (
+            self.due_in is not None
+            and self.remind_in is not None
+            and self.remind_in >= self.due_in
+        ):
+            raise ValidationError(f"The reminder should be before the due time")
+        if self.join_quorum is not None and self.task_type != TASK_TYPE_JOIN:
+            raise ValidationError(f"Only Join Task can have a join quorum")
+        if self.join_quorum == 0:
+            raise ValidationError(f"The join quorum should be at least 1")
 
 
 class DecisionPoint(BaseAuditModel):
@@ -710,6 +804,16 @@ class DecisionPoint(BaseAuditModel):
     def __str__(self):
         return f"[{self.task.workflow}] {self.task.name} - {self.decision} ({self.priority})"
 
+    def clean(self):
+        super().clean()
+        # compile the condition, so an invalid one is reported here rather than when a case reaches the task
+        try:
+            compiled = compile_condition(self.condition)
+        except ConditionError as e:
+            raise ValidationError(str(e))
+        if compiled is not None and len(compiled.errors) > 0:
+            raise ValidationError(f"Invalid condition: {'; '.join(compiled.errors)}")
+
 
 class WorkflowInstanceBaseModel(BaseAuditModel):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -719,10 +823,77 @@ class WorkflowInstanceBaseModel(BaseAuditModel):
         on_delete=models.CASCADE,
     )
     is_active = models.BooleanField(default=True)  # if the workflow instance is active
+    # summary of the current flow task, kept up to date when its task instances are
+    # created and completed, so checking if the task is done does not read them
+    active_task_count = models.PositiveIntegerField(default=0)
+    pending_decision_point = models.ForeignKey(
+        DecisionPoint,
+        related_name="%(app_label)s_%(class)s_pending_decision_point",
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+    )  # the highest priority decision taken on the current flow task
+    join_task = models.ForeignKey(
+        Task,
+        related_name="%(app_label)s_%(class)s_join_task",
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+    )  # the Join task waiting on the parallel flow tasks started by a Fork task
 
     class Meta:
         abstract = True
 
+    @classmethod
+    def start_flow_task(cls, workflow_instance, task_count, join_task=None):
+        """
+        Resets the summary when the task instances of a flow task (or of the parallel
+        flow tasks of a fork) are created.
+
+        Database Operations:
+            - Write: WorkflowInstance (one update)
+        """
+        cls.objects.filter(pk=workflow_instance.pk).update(
+            active_task_count=task_count,
+            pending_decision_point=None,
+            join_task=join_task,
+        )
+        workflow_instance.active_task_count = task_count
+        workflow_instance.pending_decision_point = None
+        workflow_instance.join_task = join_task
+
+    @classmethod
+    def complete_task(cls, workflow_instance_id, decision_point):
+        """
+        Updates the summary when a task instance of the flow task is completed. The
+        updates are atomic (F expressions and conditional updates), so assignees
+        completing their task instances at the same time are all counted.
+
+        Database Operations:
+            - Write: WorkflowInstance (up to two updates)
+        """
+        cls.objects.filter(pk=workflow_instance_id, active_task_count__gt=0).update(
+            active_task_count=F("active_task_count") - 1
+        )
+        if decision_point is not None:
+            cls.objects.filter(pk=workflow_instance_id).filter(
+                Q(pending_decision_point__isnull=True)
+                | Q(pending_decision_point__priority__gt=decision_point.priority)
+            ).update(pending_decision_point=decision_point)
+
+    @classmethod
+    def reopen_task(cls, workflow_instance_id):
+        """
+        Updates the summary when a completed task instance of the flow task is
+        active again, e.g. edited in the admin.
+
+        Database Operations:
+            - Write: WorkflowInstance (one update)
+        """
+        cls.objects.filter(pk=workflow_instance_id).update(
+            active_task_count=F("active_task_count") + 1
+        )
+
 
 class TaskInstanceBaseModel(BaseAuditModel):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -754,6 +925,10 @@ class TaskInstanceBaseModel(BaseAuditModel):
     files = models.ManyToManyField(
         FileModel, related_name="%(app_label)s_%(class)s_files", blank=True
     )
+    # set for task instances created by workflow jobs, so a job creates each of them once
+    idempotency_key = models.CharField(
+        max_length=127, unique=True, blank=True, null=True, editable=False
+    )
 
     is_active = models.BooleanField(default=True)
     created_by = models.ForeignKey(
@@ -800,8 +975,14 @@ class TaskInstanceBaseModel(BaseAuditModel):
         field_info = TaskInstance.get_selected_fields_info(fields)
         return field_info
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_is_active = instance.__dict__.get("is_active")
+        return instance
+
     def clean(self):  # 在model的clean方法中调用验证器
-        if not self.assign_to and self.task.task_type != constants.TASK_TYPE_AUTO:
+        if not self.assign_to and self.task.task_type not in constants.SYSTEM_TASK_TYPES:
             raise ValidationError(
                 f"assign_to is required for task type {self.task.task_type}"
             )
@@ -820,7 +1001,25 @@ class TaskInstanceBaseModel(BaseAuditModel):
                 self.updated_by.first_name,
                 self.updated_by.last_name,
             )
+        # a loaded flow task instance being completed or re-activated (auto task
+        # instances have no assignee)
+        loaded_is_active = getattr(self, "_loaded_is_active", None)
+        changed = (
+            loaded_is_active is not None
+            and loaded_is_active != self.is_active
+            and self.assign_to_id is not None
+            and self.workflow_instance_id is not None
+        )
         super().save(*args, **kwargs)
+        if changed:
+            WorkflowInstance = self._meta.get_field("workflow_instance").related_model
+            if self.is_active:
+                WorkflowInstance.reopen_task(self.workflow_instance_id)
+            else:
+                WorkflowInstance.complete_task(
+                    self.workflow_instance_id, self.decision_point
+                )
+        self._loaded_is_active = self.is_active
 
 
 class CaseBaseModel(BaseAuditModel):
@@ -877,6 +1076,33 @@ class CaseBaseModel(BaseAuditModel):
     class Meta:
         abstract = True
 
+    # fields whose changes advance the workflow, see CaseTransitionService
+    transition_fields = ("status", "is_submited", "workflow_instance_id")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.mark_transition_state()
+        return instance
+
+    def mark_transition_state(self):
+        """
+        Records the transition fields, get_transition_changes compares with these values.
+        """
+        self._transition_state = {
+            f: self.__dict__.get(f) for f in self.transition_fields
+        }
+
+    def get_transition_changes(self):
+        """
+        Returns the transition fields changed since the case was loaded or last advanced
+        (all of them for a new case).
+        """
+        state = getattr(self, "_transition_state", None)
+        if state is None:
+            return set(self.transition_fields)
+        return {f for f in self.transition_fields if self.__dict__.get(f) != state[f]}
+
     @classmethod
     def selected_fields_info(cls):
         fields = [
@@ -1053,3 +1279,248 @@ class CaseData(CaseDataBaseModel):
     case = models.ForeignKey(
         Case, on_delete=models.PROTECT, related_name="case_data_case"
     )
+
+
+class WorkflowJob(models.Model):
+    """
+    A chain of auto tasks to run for a case outside the request, by the run_workflow_jobs
+    command (see WORKFLOW_DEFERRED_AUTO_TASKS).
+    Jobs are operational rows updated on every attempt, so they have no audit history.
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # the same transition of a case always gets the same key, see WorkflowExecutor.enqueue_auto_tasks
+    idempotency_key = models.CharField(max_length=127, unique=True)
+    case_app_label = models.CharField(max_length=63)
+    case_model = models.CharField(max_length=63)
+    case_id = models.CharField(max_length=63)
+    task = models.ForeignKey(
+        Task, related_name="workflow_job_task", on_delete=models.CASCADE
+    )
+    status = models.CharField(max_length=15, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, null=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "run_after"])]
+
+    def __str__(self):
+        return f"[{self.status}] {self.case_app_label}.{self.case_model}:{self.case_id} - {self.task_id}"
+
+    def get_case_model(self):
+        return apps.get_model(self.case_app_label, self.case_model)
+
+
+class TaskTimer(models.Model):
+    """
+    A reminder or an escalation due on a flow task instance, created with the task
+    instance when its Task has a remind_in or due_in, and processed by the
+    run_task_timers command (see TaskTimerService).
+    Like WorkflowJob, timers are operational rows without audit history.
+    """
+
+    REMIND = "remind"
+    ESCALATE = "escalate"
+    KIND_CHOICES = ((REMIND, "Remind"), (ESCALATE, "Escalate"))
+
+    PENDING = "pending"
+    DONE = "done"
+    SKIPPED = "skipped"  # the task instance was completed before the due time
+    STATUS_CHOICES = (
+        (PENDING, "Pending"),
+        (DONE, "Done"),
+        (SKIPPED, "Skipped"),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=15, choices=KIND_CHOICES)
+    # task instances of jsonForm and modelBase cases
+    task_instance_app_label = models.CharField(max_length=63)
+    task_instance_model = models.CharField(max_length=63)
+    task_instance_id = models.UUIDField()
+    task = models.ForeignKey(
+        Task, related_name="task_timer_task", on_delete=models.CASCADE
+    )
+    due_at = models.DateTimeField()
+    status = models.CharField(max_length=15, choices=STATUS_CHOICES, default=PENDING)
+    last_error = models.TextField(blank=True, null=True)  # the reminder email failed
+    processed_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "due_at"]),
+            models.Index(fields=["task_instance_id"]),
+        ]
+
+    def __str__(self):
+        return f"[{self.kind} {self.status}] {self.task_instance_model}:{self.task_instance_id} at {self.due_at}"
+
+
+class WorkflowTraceSpan(models.Model):
+    """
+    A step of a workflow execution saved by jsonForm.tracing.DatabaseSink, see the
+    trace summary of the admin.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    trace_id = models.CharField(max_length=32, db_index=True)
+    span_id = models.CharField(max_length=16)
+    parent_id = models.CharField(max_length=16, blank=True, null=True)
+    name = models.CharField(max_length=63)
+    task_id = models.CharField(max_length=63, blank=True, null=True)
+    task_name = models.CharField(max_length=255, blank=True, null=True)
+    decision_point_id = models.CharField(max_length=63, blank=True, null=True)
+    decision_point_name = models.CharField(max_length=255, blank=True, null=True)
+    case_id = models.CharField(max_length=63, blank=True, null=True)
+    started_at = models.DateTimeField()
+    duration_ms = models.FloatField()
+    queries = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, null=True)
+    attributes = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["started_at", "name"])]
+
+    def __str__(self):
+        return f"{self.name} {self.duration_ms}ms ({self.queries} queries)"
+
+
+class SectionProjection(models.Model):
+    """
+    A typed side table of the section data of a form (the case data of the form
+    sections at an index), with one indexed column per key, so the case data search
+    filters and sorts on columns instead of section_data JSON paths.
+    Projections are opt-in, built and dropped by the build_section_projections
+    command, and the rows are kept in sync when the case data are saved. See
+    jsonForm/projections.py.
+    """
+
+    BUILDING = "building"
+    READY = "ready"
+    STATUS_CHOICES = (
+        (BUILDING, "Building"),
+        (READY, "Ready"),
+    )
+
+    template = models.ForeignKey(
+        FormTemplate,
+        related_name="section_projection_template",
+        on_delete=models.CASCADE,
+    )
+    index = models.PositiveSmallIntegerField(default=0)
+    table_name = models.CharField(max_length=63, unique=True)
+    # [{"key": section data key, "column": column name, "input": input type, ...}]
+    columns = models.JSONField(default=list, blank=True)
+    status = models.CharField(max_length=15, choices=STATUS_CHOICES, default=BUILDING)
+    built_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["template", "index"],
+                name="unique section projection template index",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.template} section {self.index} ({self.status})"
+
+    def get_definition(self):
+        return {
+            "id": self.pk,
+            "template_id": self.template_id,
+            "index": self.index,
+            "table_name": self.table_name,
+            "columns": self.columns,
+            "status": self.status,
+            "case_data_model": (
+                self.template.backend_app_label,
+                self.template.backend_app_section_model,
+            ),
+        }
+
+    @global_class_cache_decorator(
+        cache_key="section_projection",
+        timeout=settings.CACHE_TIMEOUT_L4,
+        local=True,
+        tags=["jsonForm.SectionProjection"],
+    )
+    def get_definition_by_index(cls, template_id, index):
+        """
+        Returns the definition (a dict, see get_definition) of the projection of the
+        sections of a form at an index, or None.
+
+        Database Operations:
+            - Read: SectionProjection, FormTemplate (one query, cached)
+        """
+        projection = (
+            cls.objects.filter(template_id=template_id, index=index)
+            .select_related("template")
+            .first()
+        )
+        return None if projection is None else projection.get_definition()
+
+    @global_class_cache_decorator(
+        cache_key="section_projection_by_section",
+        timeout=settings.CACHE_TIMEOUT_L4,
+        local=True,
+        tags=["jsonForm.FormSection", "jsonForm.SectionProjection"],
+    )
+    def get_definition_by_section(cls, form_section_id):
+        """
+        Returns the definition of the projection of a form section, or None.
+
+        Database Operations:
+            - Read: FormSection (one query, cached)
+        """
+        section = (
+            FormSection.objects.filter(pk=form_section_id)
+            .values("template_id", "index")
+            .first()
+        )
+        if section is None or section["template_id"] is None:
+            return None
+        return cls.get_definition_by_index(section["template_id"], section["index"])
+
+
+class CaseSearchDocument(models.Model):
+    """
+    The text of the section data of a case, indexed for the full-text search of the
+    cases (a tsvector column on PostgreSQL, an FTS5 table on SQLite). It is rebuilt
+    when the case data are saved, see jsonForm/search.py.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    case_app_label = models.CharField(max_length=63)
+    case_model = models.CharField(max_length=63)
+    case_id = models.BigIntegerField()
+    content = models.TextField(blank=True, default="")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["case_app_label", "case_model", "case_id"],
+                name="unique case search document case",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.case_app_label}.{self.case_model}:{self.case_id}"
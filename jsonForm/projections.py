@@ -0,0 +1,343 @@
+"""
+Typed projections of the case data (CaseDataBaseModel.section_data).
+
+The section data are JSON, so searching and sorting the case data of a form on
+section_data__<key> lookups reads and parses every row. A projection is a side table
+with the case data id as primary key and one typed, indexed column per key of the
+form sections at an index:
+
+    string, select  -> varchar (text when longer than PROJECTION_MAX_INDEXED_LENGTH)
+    integer         -> bigint
+    decimal         -> numeric(max_digits, decimal_places)
+    date            -> date
+
+select_multiple, list and file values are not projected, they stay JSON lookups.
+
+Projections are opt-in: build_section_projections creates the table of a form
+section index, fills it from the existing case data and records it as a
+SectionProjection. The case data saved afterwards are upserted by the post_save
+signal (see jsonForm/signals.py), and set_datatables_response filters and sorts on
+the columns (see get_projection_lookups).
+"""
+
+from django.apps import apps
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, connection, models, transaction
+from django.utils import timezone
+from base.util import get_model_class
+import re
+import threading
+
+import logging
+
+logger = logging.getLogger("django")
+
+PROJECTION_MAX_INDEXED_LENGTH = 255
+
+# table name -> (columns, model class) of the projection models of this process
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_table_name(template_id, index):
+    return f"jsonform_projection_{template_id}_{index}"
+
+
+def get_related_name(definition):
+    """
+    The name of the projection on the case data model, e.g. case_data_class.objects.filter(projection_3_0__amount__gt=10)
+    """
+    return f"projection_{definition['template_id']}_{definition['index']}"
+
+
+def get_section_columns(template, index):
+    """
+    Returns the projected columns of the published form sections of a form at an index.
+
+    Returns:
+        A list of dicts with the section data "key", the "column" name, the "input"
+        type, and "length", "max_digits" and "decimal_places" when they apply.
+
+    Database Operations:
+        - Read: FormSection
+    """
+    sections = template.form_section_form_template.filter(
+        index=index, is_publish=True
+    ).order_by("-version")
+    columns = []
+    keys = set()
+    names = {"case_data"}
+    for section in sections:
+        for key, field in section.json_template.items():
+            if key in keys or not isinstance(field, dict):
+                continue
+            keys.add(key)
+            input_type = field.get("input")
+            if input_type not in ("string", "select", "integer", "decimal", "date"):
+                continue
+            name = re.sub(r"\W+", "_", key.lower()).strip("_")[:40] or "field"
+            if name[0].isdigit():
+                name = f"f_{name}"
+            column = name
+            i = 1
+            while column in names:
+                i += 1
+                column = f"{name}_{i}"
+            names.add(column)
+            column_info = {"key": key, "column": column, "input": input_type}
+            if input_type == "string":
+                column_info["length"] = field.get("length") or PROJECTION_MAX_INDEXED_LENGTH
+            elif input_type == "decimal":
+                column_info["max_digits"] = field.get("max_digits", 20)
+                column_info["decimal_places"] = field.get("decimal_places", 2)
+            columns.append(column_info)
+    return columns
+
+
+def build_field(column):
+    input_type = column["input"]
+    if input_type == "integer":
+        return models.BigIntegerField(blank=True, null=True, db_index=True)
+    elif input_type == "decimal":
+        return models.DecimalField(
+            max_digits=column["max_digits"],
+            decimal_places=column["decimal_places"],
+            blank=True,
+            null=True,
+            db_index=True,
+        )
+    elif input_type == "date":
+        return models.DateField(blank=True, null=True, db_index=True)
+    length = column.get("length") or PROJECTION_MAX_INDEXED_LENGTH
+    if length > PROJECTION_MAX_INDEXED_LENGTH:
+        return models.TextField(blank=True, null=True)
+    return models.CharField(max_length=length, blank=True, null=True, db_index=True)
+
+
+def get_projection_model(definition):
+    """
+    Returns the model class of a projection (see SectionProjection.get_definition).
+    The class is created once per process, and again when the columns change.
+    """
+    table_name = definition["table_name"]
+    columns = definition["columns"]
+    cached = _models.get(table_name)
+    if cached is not None and cached[0] == columns:
+        return cached[1]
+    with _models_lock:
+        cached = _models.get(table_name)
+        if cached is not None and cached[0] == columns:
+            return cached[1]
+        model_name = f"Projection_{definition['template_id']}_{definition['index']}"
+        app_models = apps.all_models["jsonForm"]
+        if model_name.lower() in app_models:  # the columns changed, replace the class
+            del app_models[model_name.lower()]
+            apps.clear_cache()
+        case_data_class = get_model_class(*definition["case_data_model"])
+        attrs = {
+            "__module__": __name__,
+            "Meta": type(
+                "Meta",
+                (),
+                {"app_label": "jsonForm", "db_table": table_name, "managed": False},
+            ),
+            "case_data": models.OneToOneField(
+                case_data_class,
+                primary_key=True,
+                on_delete=models.DO_NOTHING,  # deleted by the post_delete signal
+                db_constraint=False,
+                related_name=get_related_name(definition),
+            ),
+        }
+        for column in columns:
+            attrs[column["column"]] = build_field(column)
+        model = type(model_name, (models.Model,), attrs)
+        _models[table_name] = (columns, model)
+        return model
+
+
+def get_projection_lookups(template_id, index):
+    """
+    Returns the lookups of the projected keys of the case data of a form section
+    index, e.g. {"section_data__amount": "projection_3_0__amount"}, or {} when the
+    sections have no ready projection.
+    """
+    SectionProjection = get_model_class("jsonForm", "SectionProjection")
+    definition = SectionProjection.get_definition_by_index(template_id, index)
+    if definition is None or definition["status"] != SectionProjection.READY:
+        return {}
+    get_projection_model(definition)  # registers the relation on the case data model
+    related_name = get_related_name(definition)
+    return {
+        f"section_data__{column['key']}": f"{related_name}__{column['column']}"
+        for column in definition["columns"]
+    }
+
+
+def to_row(model, definition, case_data_id, section_data):
+    """
+    Returns the projection model instance of case data, the values that can not be
+    converted to the column type are saved as NULL.
+    """
+    values = {}
+    section_data = section_data if isinstance(section_data, dict) else {}
+    for column in definition["columns"]:
+        field = model._meta.get_field(column["column"])
+        value = section_data.get(column["key"])
+        if value is None or value == "":
+            continue
+        if isinstance(value, (list, dict)):
+            value = None
+        elif isinstance(field, (models.CharField, models.TextField)):
+            value = str(value)
+            if field.max_length is not None:
+                value = value[: field.max_length]
+        try:
+            values[column["column"]] = field.clean(value, None)
+        except ValidationError:
+            logger.debug(
+                f"Section data {column['key']} of case data {case_data_id} is not a valid {column['input']}"
+            )
+    return model(case_data_id=case_data_id, **values)
+
+
+def upsert_rows(model, definition, rows):
+    model.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=["case_data"],
+        update_fields=[column["column"] for column in definition["columns"]],
+    )
+
+
+def insert_rows(model, rows):
+    # the rows synced since the case data were read are newer, they are kept
+    model.objects.bulk_create(rows, ignore_conflicts=True)
+    return len(rows)
+
+
+def sync_case_data(instance):
+    """
+    Upserts the projection row of saved case data, when its form section has a projection.
+
+    Database Operations:
+        - Write: the projection table (one upsert), when the section is projected
+    """
+    SectionProjection = get_model_class("jsonForm", "SectionProjection")
+    definition = SectionProjection.get_definition_by_section(instance.form_section_id)
+    if definition is None or len(definition["columns"]) == 0:
+        return
+    model = get_projection_model(definition)
+    try:
+        # the projection is derived data, it never fails the save of the case data
+        with transaction.atomic():
+            upsert_rows(
+                model,
+                definition,
+                [to_row(model, definition, instance.pk, instance.section_data)],
+            )
+    except DatabaseError as e:
+        logger.error(
+            f"Unable to sync case data {instance.pk} to {definition['table_name']}: {e}"
+        )
+
+
+def delete_case_data(instance):
+    SectionProjection = get_model_class("jsonForm", "SectionProjection")
+    definition = SectionProjection.get_definition_by_section(instance.form_section_id)
+    if definition is None:
+        return
+    try:
+        with transaction.atomic():
+            get_projection_model(definition).objects.filter(pk=instance.pk).delete()
+    except DatabaseError as e:
+        logger.error(
+            f"Unable to delete case data {instance.pk} from {definition['table_name']}: {e}"
+        )
+
+
+def build_projection(template, index, rebuild=False, batch_size=1000):
+    """
+    Creates (or re-creates when its columns changed) the projection table of the
+    sections of a form at an index and fills it from the case data.
+
+    The projection is saved as building first, so the case data saved while the
+    table is filled are already synced, and it is only used by the search once it is
+    ready.
+
+    Args:
+        template: The FormTemplate.
+        index: The form section index.
+        rebuild: Drop and re-create the table even when the columns did not change.
+        batch_size: The number of case data read and inserted at once.
+
+    Returns:
+        The SectionProjection and the number of case data rows projected.
+
+    Database Operations:
+        - Read: FormSection, case data of the form
+        - Write: SectionProjection, the projection table (DDL and bulk inserts)
+    """
+    SectionProjection = get_model_class("jsonForm", "SectionProjection")
+    case_data_class = template.get_section_model_class()
+    columns = get_section_columns(template, index)
+    projection = SectionProjection.objects.filter(template=template, index=index).first()
+    # DDL runs outside of a transaction (SQLite does not support it in one), the
+    # SectionProjection is deleted before its table is dropped and saved after its
+    # table is created, so the case data sync never writes to a missing table
+    if projection is not None and (rebuild or projection.columns != columns):
+        projection.delete()
+        drop_table(projection)
+        projection = None
+    if projection is None:
+        projection = SectionProjection(
+            template=template,
+            index=index,
+            table_name=get_table_name(template.pk, index),
+            columns=columns,
+        )
+        drop_table(projection)  # left by a build that failed
+        with connection.schema_editor() as schema_editor:
+            schema_editor.create_model(get_projection_model(projection.get_definition()))
+        projection.save()
+    else:
+        projection.status = SectionProjection.BUILDING
+        projection.save(update_fields=["status", "updated_at"])
+
+    definition = projection.get_definition()
+    model = get_projection_model(definition)
+    count = 0
+    rows = []
+    for case_data_id, section_data in (
+        case_data_class.objects.filter(
+            form_section__template=template, form_section__index=index
+        )
+        .values_list("pk", "section_data")
+        .iterator(chunk_size=batch_size)
+    ):
+        rows.append(to_row(model, definition, case_data_id, section_data))
+        if len(rows) >= batch_size:
+            count += insert_rows(model, rows)
+            rows = []
+    if len(rows) > 0:
+        count += insert_rows(model, rows)
+
+    projection.status = SectionProjection.READY
+    projection.built_at = timezone.now()
+    projection.save(update_fields=["status", "built_at", "updated_at"])
+    return projection, count
+
+
+def drop_table(projection):
+    """
+    Drops the table of a projection (when it exists), the SectionProjection is
+    deleted by the caller.
+    """
+    model = get_projection_model(projection.get_definition())
+    if projection.table_name in connection.introspection.table_names():
+        with connection.schema_editor() as schema_editor:
+            schema_editor.delete_model(model)
+    with _models_lock:
+        _models.pop(projection.table_name, None)
+        apps.all_models["jsonForm"].pop(model._meta.model_name, None)
+        apps.clear_cache()
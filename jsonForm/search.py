@@ -0,0 +1,236 @@
+"""
+Full-text search of the cases on their section data.
+
+A CaseSearchDocument holds the text of the section data of a case (all its case data
+rows), rebuilt once per case when the case data saved or deleted in a transaction
+are committed (see jsonForm/signals.py), and by the rebuild_case_search command for
+the existing cases. The database indexes the text:
+
+    - PostgreSQL: the search_vector tsvector column generated from the content, with a
+      GIN index.
+    - SQLite: the jsonform_casesearchdocument_fts FTS5 table, kept in sync with the
+      content by triggers.
+
+Both are created by the jsonForm 0008 migration. The case search views filter the
+cases with search_cases, through the backend of the CASE_SEARCH_BACKEND setting (a
+dotted path), or the backend of the database vendor when it is empty.
+ContainsSearchBackend (icontains on the content) works on every database.
+"""
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from base.util import get_model_class
+import re
+
+import logging
+
+logger = logging.getLogger("django")
+
+SEARCH_CONFIG = "simple"  # the text search configuration of the search_vector column
+FTS_TABLE = "jsonform_casesearchdocument_fts"
+
+_backend = None
+_backend_setting = None
+
+
+class ContainsSearchBackend:
+    """
+    Matches the documents containing every word of the query, without an index.
+    """
+
+    def search(self, documents, query):
+        for word in query.split():
+            documents = documents.filter(content__icontains=word)
+        return documents
+
+
+class PostgresSearchBackend:
+    """
+    Matches the search_vector of the documents with the query, in the web search
+    syntax ("quoted phrase", or, -excluded), through the GIN index.
+    """
+
+    def search(self, documents, query):
+        return documents.filter(
+            RawSQL(
+                f"search_vector @@ websearch_to_tsquery('{SEARCH_CONFIG}', %s)",
+                (query,),
+                output_field=BooleanField(),
+            )
+        )
+
+
+class SQLiteSearchBackend:
+    """
+    Matches the documents containing every word of the query, or a word starting
+    with it, through the FTS5 table.
+    """
+
+    def search(self, documents, query):
+        words = [w.replace('"', '""') for w in query.split()]
+        if len(words) == 0:
+            return documents
+        match = " ".join(f'"{w}"*' for w in words)
+        return documents.filter(
+            pk__in=RawSQL(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", (match,)
+            )
+        )
+
+
+def get_search_backend():
+    """
+    Returns the backend of CASE_SEARCH_BACKEND, or of the database vendor when it is
+    empty, loaded once per setting value.
+    """
+    global _backend, _backend_setting
+    path = getattr(settings, "CASE_SEARCH_BACKEND", None)
+    if _backend is None or path != _backend_setting:
+        if path:
+            backend = import_string(path)()
+        elif connection.vendor == "postgresql":
+            backend = PostgresSearchBackend()
+        elif (
+            connection.vendor == "sqlite"
+            and FTS_TABLE in connection.introspection.table_names()
+        ):
+            backend = SQLiteSearchBackend()
+        else:
+            backend = ContainsSearchBackend()
+        _backend, _backend_setting = backend, path
+    return _backend
+
+
+def search_cases(case_class, query, case_field="pk"):
+    """
+    Returns a Q of the cases (or of the rows related to a case) whose section data
+    match a search query.
+
+    Args:
+        case_class: The case model, e.g. jsonForm.Case.
+        query: The search text.
+        case_field: The case field of the filtered queryset, e.g. "case" for case data.
+
+    Database Operations:
+        None (the documents are read in a subquery of the filtered queryset)
+    """
+    CaseSearchDocument = get_model_class("jsonForm", "CaseSearchDocument")
+    documents = CaseSearchDocument.objects.filter(
+        case_app_label=case_class._meta.app_label,
+        case_model=case_class._meta.model_name,
+    )
+    documents = get_search_backend().search(documents, query)
+    return Q(**{f"{case_field}__in": documents.values("case_id")})
+
+
+def get_text(value):
+    """
+    Returns the searchable text of a section data value: the strings and numbers of
+    the value, with the items of the lists and dicts.
+    """
+    if value is None or isinstance(value, bool):
+        return ""
+    if isinstance(value, dict):
+        return " ".join(get_text(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return " ".join(get_text(v) for v in value)
+    return str(value)
+
+
+def get_content(section_datas):
+    texts = (get_text(section_data) for section_data in section_datas)
+    return re.sub(r"\s+", " ", " ".join(texts)).strip()
+
+
+class _PendingDocuments:
+    """
+    The cases whose search document is rebuilt when the transaction is committed,
+    by case data model. The section data of a case are saved in turn, the document
+    is rebuilt once with all of them.
+    """
+
+    def __init__(self):
+        self.case_ids = {}
+
+    def add(self, case_data):
+        self.case_ids.setdefault(type(case_data), set()).add(case_data.case_id)
+
+    def __call__(self):
+        for case_data_class, case_ids in self.case_ids.items():
+            case_class = case_data_class._meta.get_field("case").related_model
+            section_datas_by_case = {case_id: [] for case_id in case_ids}
+            for case_id, section_data in (
+                case_data_class.objects.filter(case_id__in=case_ids)
+                .order_by("case_id", "form_section__index")
+                .values_list("case_id", "section_data")
+            ):
+                section_datas_by_case[case_id].append(section_data)
+            save_documents(case_class, section_datas_by_case)
+
+
+def update_case_document(case_data):
+    """
+    Rebuilds the search document of the case of saved or deleted case data, once per
+    case when the transaction is committed (at once outside of a transaction).
+
+    Database Operations:
+        - Read: the case data of the cases, on commit
+        - Write: CaseSearchDocument (one upsert, and one delete for the cases without case data), on commit
+    """
+    if case_data.case_id is None:
+        return
+    connection = transaction.get_connection()
+    pending = getattr(connection, "case_search_pending", None)
+    # a new batch when the last one was run, or dropped by a rollback
+    if pending is None or not any(
+        func is pending for _, func, _ in connection.run_on_commit
+    ):
+        pending = _PendingDocuments()
+        connection.case_search_pending = pending
+        pending.add(case_data)
+        transaction.on_commit(pending)
+    else:
+        pending.add(case_data)
+
+
+def save_documents(case_class, section_datas_by_case):
+    """
+    Saves the search documents of cases.
+
+    Args:
+        case_class: The case model.
+        section_datas_by_case: The section data of the case data of each case, by case id.
+
+    Database Operations:
+        - Write: CaseSearchDocument (one bulk upsert, and one delete for the cases without case data)
+    """
+    CaseSearchDocument = get_model_class("jsonForm", "CaseSearchDocument")
+    app_label, model_name = case_class._meta.app_label, case_class._meta.model_name
+    documents = []
+    deleted = []
+    for case_id, section_datas in section_datas_by_case.items():
+        if len(section_datas) == 0:
+            deleted.append(case_id)
+            continue
+        documents.append(
+            CaseSearchDocument(
+                case_app_label=app_label,
+                case_model=model_name,
+                case_id=case_id,
+                content=get_content(section_datas),
+            )
+        )
+    if len(documents) > 0:
+        CaseSearchDocument.objects.bulk_create(
+            documents,
+            update_conflicts=True,
+            unique_fields=["case_app_label", "case_model", "case_id"],
+            update_fields=["content", "updated_at"],
+        )
+    if len(deleted) > 0:
+        CaseSearchDocument.objects.filter(
+            case_app_label=app_label, case_model=model_name, case_id__in=deleted
+        ).delete()
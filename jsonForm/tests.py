@@ -1,3 +1,135 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase
+
+from userManagement.models import (
+    AppMenu,
+    Company,
+    CustomGroup,
+    Department,
+    Permission,
+    Team,
+)
+from .CaseTransitionService import CaseTransitionService
+from .conditions import compile_condition
+from .models import (
+    Case,
+    DecisionPoint,
+    FormTemplate,
+    Task,
+    TaskInstance,
+    Workflow,
+    WorkflowInstance,
+)
+
+
+class CompileConditionTests(SimpleTestCase):
+    def test_number_compared_with_numeric_string(self):
+        condition = compile_condition(
+            {"field_name": "a", "comparison_operator": "gt", "compare_value": "5"}
+        )
+        self.assertTrue(condition({"a": 7}))
+        self.assertFalse(condition({"a": 3}))
+
+    def test_numeric_string_compared_with_number(self):
+        condition = compile_condition(
+            {"field_name": "a", "comparison_operator": "gt", "compare_value": 5}
+        )
+        self.assertTrue(condition({"a": "7"}))
+        self.assertFalse(condition({"a": "3"}))
+
+    def test_in_converts_each_item(self):
+        condition = compile_condition(
+            {"field_name": "a", "comparison_operator": "in", "compare_value": [1, 2, "3"]}
+        )
+        self.assertTrue(condition({"a": 3}))
+        self.assertTrue(condition({"a": "2"}))
+        self.assertFalse(condition({"a": 4}))
+
+
+class TaskInstanceSummaryTests(TestCase):
+    """
+    The WorkflowInstance summary (active_task_count) follows the task instances of a
+    flow task with two assignees.
+    """
+
+    def setUp(self):
+        company = Company.objects.create(short_name="co", full_name="co")
+        department = Department.objects.create(
+            short_name="d", full_name="d", company=company
+        )
+        team = Team.objects.create(short_name="t", full_name="t", department=department)
+        app = AppMenu.objects.create(
+            key="app", label="App", link="/app/", control_type="app", is_active=True
+        )
+        group = CustomGroup.objects.create(name="g", group_type=1)
+        workflow = Workflow.objects.create(name="wf")
+        self.review = Task.objects.create(
+            workflow=workflow, name="review", index=0, task_type="Flow"
+        )
+        self.review.assign_to.add(
+            Permission.objects.create(role=group, app=app, team=team),
+            Permission.objects.create(role=group, app=app, department=department),
+        )
+        self.approve = DecisionPoint.objects.create(
+            task=self.review, decision="approve", next_task=None, priority=1
+        )
+        form = FormTemplate.objects.create(
+            code="F1",
+            name="F1",
+            description="x",
+            owner_company=company,
+            owner_department=department,
+            owner_team=team,
+            application=app,
+            workflow=workflow,
+        )
+        self.case = Case.objects.create(
+            form=form, case_team=team, case_department=department
+        )
+        self.case.is_submited = True
+        CaseTransitionService().advance(self.case)
+
+    def complete(self, task_instance):
+        task_instance.is_active = False
+        task_instance.decision_point = self.approve
+        task_instance.save()
+
+    def get_summary(self):
+        workflow_instance = WorkflowInstance.objects.get(
+            pk=self.case.workflow_instance_id
+        )
+        return workflow_instance.active_task_count, self.case.task_instances.filter(
+            is_active=True
+        ).count()
+
+    def test_failed_transition_rolls_back_the_completed_task_instance(self):
+        first, second = self.case.task_instances.all()
+        with mock.patch.object(
+            CaseTransitionService, "transition", side_effect=RuntimeError("failed")
+        ):
+            with self.assertRaises(RuntimeError):
+                # as get_case_details saves the task instance forms and advances the case
+                with transaction.atomic():
+                    self.complete(TaskInstance.objects.get(pk=first.pk))
+                    CaseTransitionService().advance(
+                        Case.objects.get(pk=self.case.pk), tasks_changed=True
+                    )
+        self.assertEqual(self.get_summary(), (2, 2))
+
+        # the same assignee submits again, the other task instance is still active
+        self.complete(TaskInstance.objects.get(pk=first.pk))
+        case = Case.objects.get(pk=self.case.pk)
+        CaseTransitionService().advance(case, tasks_changed=True)
+        self.assertEqual(case.status, "review")
+        self.assertEqual(self.get_summary(), (1, 1))
+
+    def test_reactivated_task_instance_is_counted(self):
+        first = self.case.task_instances.first()
+        self.complete(TaskInstance.objects.get(pk=first.pk))
+        self.assertEqual(self.get_summary(), (1, 1))
+        task_instance = TaskInstance.objects.get(pk=first.pk)
+        task_instance.is_active = True
+        task_instance.save()
+        self.assertEqual(self.get_summary(), (2, 2))
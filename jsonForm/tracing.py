@@ -0,0 +1,422 @@
+"""
+Trace spans of the workflow execution (WorkflowExecutor and CaseTransitionService).
+
+A span measures one step: the duration, the number of SQL queries run during the
+step and attributes like the task and the decision point. Spans started inside a
+span are its children, the outermost span of a case submit is the root of the trace.
+
+Finished spans are sent to the sinks listed in WORKFLOW_TRACE_SINKS (dotted paths of
+classes with an emit(spans) method, called with the spans of a trace when its root
+span ends). Tracing is off when the setting is empty, trace_span then only returns a
+no-op span.
+
+Sinks:
+    - LogSink: logs one JSON line per span.
+    - RingBufferSink: keeps the last WORKFLOW_TRACE_RING_SIZE spans in the worker memory.
+    - DatabaseSink: saves the spans as WorkflowTraceSpan (outside of the traced
+      transaction), aggregated by the admin trace summary.
+    - OpenTelemetrySink: exports the spans with the configured OpenTelemetry tracer provider.
+"""
+
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from base.util import get_model_class
+import json
+import logging
+import threading
+import time
+import uuid
+
+logger = logging.getLogger("django")
+
+# the current span, its trace holds the spans and the query counter
+_current_span = ContextVar("workflow_trace_span", default=None)
+_sinks = None
+_sinks_setting = None
+
+
+class Span:
+    __slots__ = (
+        "trace",
+        "span_id",
+        "parent_id",
+        "name",
+        "attributes",
+        "started_at",
+        "start",
+        "duration_ms",
+        "queries",
+        "error",
+    )
+
+    def __init__(self, trace, name, parent_id, attributes):
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.started_at = timezone.now()
+        self.start = time.perf_counter()
+        self.duration_ms = None
+        self.queries = trace.queries
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def as_dict(self):
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": self.duration_ms,
+            "queries": self.queries,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    def set(self, **attributes):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _Trace:
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex
+        self.spans = []
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper counting the queries of the trace
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+
+def get_sinks():
+    """
+    Returns the sink instances of WORKFLOW_TRACE_SINKS, loaded once per setting value.
+    """
+    global _sinks, _sinks_setting
+    paths = tuple(getattr(settings, "WORKFLOW_TRACE_SINKS", ()) or ())
+    if _sinks is None or paths != _sinks_setting:
+        sinks = []
+        for path in paths:
+            try:
+                sinks.append(import_string(path)())
+            except Exception as e:
+                logger.error(f"Unable to load the workflow trace sink {path}: {e}")
+        _sinks, _sinks_setting = sinks, paths
+    return _sinks
+
+
+@contextmanager
+def trace_span(name, **attributes):
+    """
+    Measures a step of the workflow execution.
+
+    Args:
+        name: The step name, e.g. "task.auto".
+        attributes: The span attributes, e.g. task_id, decision_point_id. Values must
+            be JSON serializable (ids are converted with str).
+
+    Yields:
+        The Span, call span.set(...) to add attributes found during the step.
+    """
+    parent = _current_span.get()
+    if parent is None and len(get_sinks()) == 0:
+        yield NOOP_SPAN
+        return
+    attributes = {k: _json_value(v) for k, v in attributes.items()}
+    if parent is None:  # root span, count the queries of the trace
+        trace = _Trace()
+        span = Span(trace, name, None, attributes)
+        wrapper = connection.execute_wrapper(trace)
+        wrapper.__enter__()
+    else:
+        trace = parent.trace
+        span = Span(trace, name, parent.span_id, attributes)
+        wrapper = None
+    token = _current_span.set(span)
+    try:
+        yield span
+    except Exception as e:
+        span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        span.duration_ms = round((time.perf_counter() - span.start) * 1000, 3)
+        span.queries = trace.queries - span.queries
+        span.attributes = {k: _json_value(v) for k, v in span.attributes.items()}
+        trace.spans.append(span)
+        if wrapper is not None:
+            wrapper.__exit__(None, None, None)
+            _emit(trace.spans)
+
+
+def _json_value(value):
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def _emit(spans):
+    for sink in get_sinks():
+        try:
+            sink.emit(spans)
+        except Exception as e:  # tracing never breaks the workflow
+            logger.warning(f"Unable to emit workflow trace to {type(sink).__name__}: {e}")
+
+
+class LogSink:
+    def emit(self, spans):
+        for span in spans:
+            logger.info(f"workflow span {json.dumps(span.as_dict())}")
+
+
+# spans of the RingBufferSink, shared by the sink instances of the worker
+_ring_buffer = deque(maxlen=1000)
+_ring_buffer_lock = threading.Lock()
+
+
+class RingBufferSink:
+    def __init__(self):
+        global _ring_buffer
+        size = getattr(settings, "WORKFLOW_TRACE_RING_SIZE", 1000)
+        if _ring_buffer.maxlen != size:
+            with _ring_buffer_lock:
+                _ring_buffer = deque(_ring_buffer, maxlen=size)
+
+    def emit(self, spans):
+        with _ring_buffer_lock:
+            _ring_buffer.extend(span.as_dict() for span in spans)
+
+    @staticmethod
+    def recent():
+        """
+        Returns the spans kept in the buffer of this worker, oldest first.
+        """
+        with _ring_buffer_lock:
+            return list(_ring_buffer)
+
+
+# spans of failed traces, saved by the DatabaseSink after their transaction
+_failed_spans = deque(maxlen=1000)
+_failed_spans_lock = threading.Lock()
+
+
+class DatabaseSink:
+    """
+    Saves the spans as WorkflowTraceSpan, outside of the transaction of the traced
+    step, so they never fail it and are kept when it is rolled back:
+        - with the WORKFLOW_TRACE_DATABASE connection when it is set,
+        - else, the spans of a trace are saved when its transaction is committed, or
+          at once outside of a transaction. The spans of a failed trace, whose
+          transaction is rolled back, are kept in memory and saved with the next
+          spans saved.
+    """
+
+    def emit(self, spans):
+        using = getattr(settings, "WORKFLOW_TRACE_DATABASE", None)
+        if using:
+            self.save(spans, using)
+        elif not transaction.get_connection().in_atomic_block:
+            self.save(spans)
+        elif any(span.error is not None for span in spans):
+            with _failed_spans_lock:
+                _failed_spans.extend(spans)
+        else:
+            transaction.on_commit(lambda: self.save(spans), robust=True)
+
+    def save(self, spans, using=DEFAULT_DB_ALIAS):
+        WorkflowTraceSpan = get_model_class("jsonForm", "WorkflowTraceSpan")
+        with _failed_spans_lock:
+            spans = list(_failed_spans) + list(spans)
+            _failed_spans.clear()
+        try:
+            # a savepoint, a failed insert never aborts a transaction of the connection
+            with transaction.atomic(using=using):
+                WorkflowTraceSpan.objects.using(using).bulk_create(
+                    [
+                        WorkflowTraceSpan(
+                            trace_id=span.trace.trace_id,
+                            span_id=span.span_id,
+                            parent_id=span.parent_id,
+                            name=span.name,
+                            task_id=span.attributes.get("task_id"),
+                            task_name=span.attributes.get("task"),
+                            decision_point_id=span.attributes.get("decision_point_id"),
+                            decision_point_name=span.attributes.get("decision_point"),
+                            case_id=span.attributes.get("case_id"),
+                            started_at=span.started_at,
+                            duration_ms=span.duration_ms,
+                            queries=span.queries,
+                            error=span.error,
+                            attributes=span.attributes,
+                        )
+                        for span in spans
+                    ]
+                )
+        except Exception as e:  # tracing never breaks the workflow
+            logger.warning(f"Unable to save {len(spans)} workflow trace spans: {e}")
+
+
+class OpenTelemetrySink:
+    """
+    Exports the spans with the global OpenTelemetry tracer provider (the
+    opentelemetry-api package, configured by the deployment).
+    """
+
+    def __init__(self):
+        from opentelemetry import trace
+
+        self.trace = trace
+        self.tracer = trace.get_tracer("csoa.workflow")
+
+    def emit(self, spans):
+        contexts = {}
+        # parents first, so the children are created in their context
+        for span in sorted(spans, key=lambda s: s.start):
+            start_ns = int(span.started_at.timestamp() * 1e9)
+            otel_span = self.tracer.start_span(
+                span.name,
+                context=contexts.get(span.parent_id),
+                start_time=start_ns,
+                attributes={
+                    **{k: v for k, v in span.attributes.items() if v is not None},
+                    "db.query_count": span.queries,
+                },
+            )
+            if span.error is not None:
+                otel_span.set_status(
+                    self.trace.Status(self.trace.StatusCode.ERROR, span.error)
+                )
+            otel_span.end(end_time=start_ns + int(span.duration_ms * 1e6))
+            contexts[span.span_id] = self.trace.set_span_in_context(otel_span)
+
+
+def aggregate_spans(spans, key):
+    """
+    Aggregates span dicts (e.g. RingBufferSink.recent()) by key, a function returning
+    the group of a span or None to skip it.
+
+    Returns:
+        A list of dicts with the group, count, avg_ms, max_ms and avg_queries,
+        slowest (average) first.
+    """
+    groups = {}
+    for span in spans:
+        group = key(span)
+        if group is None:
+            continue
+        g = groups.setdefault(
+            group, {"group": group, "count": 0, "total_ms": 0, "max_ms": 0, "queries": 0}
+        )
+        g["count"] += 1
+        g["total_ms"] += span["duration_ms"]
+        g["max_ms"] = max(g["max_ms"], span["duration_ms"])
+        g["queries"] += span["queries"]
+    result = []
+    for g in groups.values():
+        result.append(
+            {
+                "group": g["group"],
+                "count": g["count"],
+                "avg_ms": round(g["total_ms"] / g["count"], 3),
+                "max_ms": g["max_ms"],
+                "avg_queries": round(g["queries"] / g["count"], 1),
+            }
+        )
+    result.sort(key=lambda g: g["avg_ms"], reverse=True)
+    return result
+
+
+TASK_SPANS = ("task.auto", "task.flow", "task.fork", "task.join")
+
+
+def summarize_spans(since):
+    """
+    Aggregates the WorkflowTraceSpan saved since a time (DatabaseSink), for the admin
+    trace summary.
+
+    Returns:
+        A dict with the slowest "tasks" and "decision_points", the time per "step"
+        (span name), and the case advances per hour ("hours").
+
+    Database Operations:
+        - Read: WorkflowTraceSpan (4 aggregate queries)
+    """
+    from django.db.models import Avg, Count, Max
+    from django.db.models.functions import TruncHour
+
+    WorkflowTraceSpan = get_model_class("jsonForm", "WorkflowTraceSpan")
+    spans = WorkflowTraceSpan.objects.filter(started_at__gte=since)
+    stats = {
+        "count": Count("id"),
+        "avg_ms": Avg("duration_ms"),
+        "max_ms": Max("duration_ms"),
+        "avg_queries": Avg("queries"),
+    }
+    return {
+        "tasks": list(
+            spans.filter(name__in=TASK_SPANS)
+            .values("task_name", "name")
+            .annotate(**stats)
+            .order_by("-avg_ms")[:20]
+        ),
+        "decision_points": list(
+            spans.filter(name="decision_point.evaluate")
+            .values("task_name", "decision_point_name")
+            .annotate(**stats)
+            .order_by("-avg_ms")[:20]
+        ),
+        "steps": list(spans.values("name").annotate(**stats).order_by("-avg_ms")),
+        "hours": list(
+            spans.filter(parent_id__isnull=True)
+            .annotate(hour=TruncHour("started_at"))
+            .values("hour")
+            .annotate(**stats)
+            .order_by("-hour")
+        ),
+    }
+
+
+def summarize_recent_spans():
+    """
+    Aggregates the spans of the RingBufferSink of this worker, like summarize_spans.
+    """
+    spans = RingBufferSink.recent()
+    attr = lambda span, name: span["attributes"].get(name)
+    summary = {
+        "tasks": aggregate_spans(
+            spans,
+            lambda s: (attr(s, "task"), s["name"]) if s["name"] in TASK_SPANS else None,
+        ),
+        "decision_points": aggregate_spans(
+            spans,
+            lambda s: (
+                (attr(s, "task"), attr(s, "decision_point"))
+                if s["name"] == "decision_point.evaluate"
+                else None
+            ),
+        ),
+        "steps": aggregate_spans(spans, lambda s: s["name"]),
+    }
+    # same keys as summarize_spans
+    for row in summary["tasks"]:
+        row["task_name"], row["name"] = row.pop("group")
+    for row in summary["decision_points"]:
+        row["task_name"], row["decision_point_name"] = row.pop("group")
+    for row in summary["steps"]:
+        row["name"] = row.pop("group")
+    return summary
@@ -8,11 +8,13 @@ from base.util import CustomJSONEncoder
 from base.util_model import get_audit_history, get_audit_history_by_instance
 from base.util_files import process_form_files, process_formset_files, handle_temp_file
 from .models import FormTemplate
+from .CaseTransitionService import CaseTransitionService
 from userManagement.models import Team
 from django.contrib import messages
 import logging
 from django.core.files.uploadedfile import InMemoryUploadedFile, TemporaryUploadedFile
 from django.http import HttpResponseRedirect
+from django.db import transaction
 
 logger = logging.getLogger("django")
 
@@ -131,7 +133,7 @@ def create_case_view(request, form: FormTemplate, app_id=None):
             }
         if request.POST.get("action") == "submit":
             instance.is_submited = True
-        instance.save()
+        CaseTransitionService().advance(instance)
         messages.info(request, f"Case [{instance.id}] {instance.status}")
         # clear_session_files(request)
         return {}
@@ -170,7 +172,7 @@ def edit_case_data_view(request, case, form: FormTemplate, app_id=None):
             case.is_submited = True
         elif request.POST.get("action") == "cancel":
             case.status = "Cancelled"
-            case.save()
+            CaseTransitionService().advance(case)
             messages.info(request, f"Case [{case.id}] {case.status}")
             case.remove_lock()
             return {}
@@ -254,14 +256,19 @@ def edit_case_data_view(request, case, form: FormTemplate, app_id=None):
             case_department = team.department
         case.case_department = case_department
         try:
-            case.save()
-            for section in section_datas:
-                section_data = json.dumps(
-                    section_forms_data.get(str(section.form_section.id)),
-                    cls=CustomJSONEncoder,
-                )
-                section.section_data = json.loads(section_data)
-                section.save()
+            # rolled back with the workflow when the transition fails, so the case is
+            # never left submitted without its workflow
+            with transaction.atomic():
+                case.save()
+                for section in section_datas:
+                    section_data = json.dumps(
+                        section_forms_data.get(str(section.form_section.id)),
+                        cls=CustomJSONEncoder,
+                    )
+                    section.section_data = json.loads(section_data)
+                    section.save()
+                # after the section data, auto tasks evaluate conditions on the new data
+                CaseTransitionService().advance(case)
         except Exception as e:
             logger.error(e)
             messages.error(request, e)
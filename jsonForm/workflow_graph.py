@@ -0,0 +1,47 @@
+import logging
+
+logger = logging.getLogger("django")
+
+
+class WorkflowGraph:
+    """
+    The tasks of a workflow with their decision points (ordered by priority) and next
+    task edges, loaded once so routing a case does not query them task by task.
+
+    Built by Workflow.get_graph_by_id, which caches it until a workflow, task or
+    decision point changes. Conditions are kept as JSON (the graph is pickled in the
+    cache), WorkflowExecutor compiles them on first use, see jsonForm.conditions.
+    """
+
+    def __init__(self, workflow_id, tasks, decision_points):
+        """
+        Args:
+            workflow_id: The Workflow id.
+            tasks: The Task instances of the workflow.
+            decision_points: The DecisionPoint instances of the tasks.
+        """
+        self.workflow_id = workflow_id
+        self.tasks = {task.id: task for task in tasks}
+        self.first_task = min(tasks, key=lambda t: t.index) if tasks else None
+        self.decision_points = {}
+        self.decision_points_by_id = {}
+        for dp in sorted(decision_points, key=lambda dp: dp.priority):
+            # point the relations to the graph tasks, so they are not loaded again
+            dp.task = self.tasks[dp.task_id]
+            dp.next_task = (
+                self.tasks.get(dp.next_task_id) if dp.next_task_id is not None else None
+            )
+            self.decision_points.setdefault(dp.task_id, []).append(dp)
+            self.decision_points_by_id[dp.id] = dp
+
+    def get_task(self, task_id):
+        return self.tasks.get(task_id)
+
+    def get_decision_points(self, task):
+        """
+        Returns the decision points of task, ordered by priority.
+        """
+        return self.decision_points.get(task.id, [])
+
+    def get_decision_point(self, decision_point_id):
+        return self.decision_points_by_id.get(decision_point_id)
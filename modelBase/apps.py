@@ -4,6 +4,3 @@ from django.apps import AppConfig
 class ModelbaseConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "modelBase"
-
-    def ready(self):
-        import modelBase.signals
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.9 on 2026-10-18 08:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('modelBase', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicaltaskinstance',
+            name='idempotency_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=127, null=True),
+        ),
+        migrations.AddField(
+            model_name='taskinstance',
+            name='idempotency_key',
+            field=models.CharField(blank=True, editable=False, max_length=127, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.9 on 2026-10-18 08:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jsonForm', '0006_historicaltask_join_quorum_and_more'),
+        ('modelBase', '0003_historicalworkflowinstance_active_task_count_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicalworkflowinstance',
+            name='join_task',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='jsonForm.task'),
+        ),
+        migrations.AddField(
+            model_name='workflowinstance',
+            name='join_task',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='%(app_label)s_%(class)s_join_task', to='jsonForm.task'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from userManagement.models import AppMenu, CustomUser
+import time
+
+
+class Command(BaseCommand):
+    help = "Shows the number of queries and the time AppMenu.build_menu_tree takes for growing menu sizes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user", help="Username to build the user menu tree for (optional)"
+        )
+        parser.add_argument(
+            "--steps",
+            type=int,
+            default=4,
+            help="Number of menu sizes to measure, up to all active menu items",
+        )
+
+    def handle(self, *args, **options):
+        user = None
+        if options["user"]:
+            user = CustomUser.objects.filter(username=options["user"]).first()
+            if user is None:
+                raise CommandError(f"User {options['user']} is not found")
+
+        menu_items = AppMenu.objects.filter(is_active=True)
+        if user:
+            menu_items = menu_items.filter(
+                group_menus__permission_role__user_permissions=user
+            ).distinct()
+        ids = list(menu_items.order_by("menu_level", "id").values_list("id", flat=True))
+        if len(ids) == 0:
+            self.stdout.write("No active menu items")
+            return
+
+        steps = max(options["steps"], 1)
+        sizes = sorted({max(len(ids) * i // steps, 1) for i in range(1, steps + 1)})
+        header = f"{'menu items':>10} {'queries':>8} {'time':>9}"
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for size in sizes:
+            queryset = AppMenu.objects.filter(id__in=ids[:size]).order_by("menu_level")
+            started_at = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                AppMenu.build_menu_tree(queryset, user)
+            elapsed = time.perf_counter() - started_at
+            self.stdout.write(
+                f"{size:>10} {len(queries):>8} {elapsed * 1000:>7.1f}ms"
+            )
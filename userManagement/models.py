@@ -9,10 +9,10 @@ from django.core.cache import cache
 from base.cache import global_class_cache_decorator, global_instance_cache_decorator
 from base.util import normalized_url
 from base import constants
+from base.constants import MENU_CACHE_TAGS, USER_MENU_CACHE_TAGS, USER_INFO_CACHE_TAGS
 from django.conf import settings
 import pytz
-import json
-from base.util import CustomJSONEncoder
+from base.util import to_json_value
 
 
 TITLE_CHOICE = (
@@ -41,23 +41,29 @@ class Company(BaseAuditModel):
         null=True,
     )
     is_active = models.BooleanField(default=True)
+    # fields of the cached company lists, see get_list
+    list_fields = ["id", "short_name", "full_name", "manager_id", "is_active"]
 
     def __str__(self) -> str:
         return "%s (%s)" % (self.full_name, self.short_name)
 
     @global_class_cache_decorator(
-        cache_key="company_list", timeout=settings.CACHE_TIMEOUT_L3
+        cache_key="company_list",
+        timeout=settings.CACHE_TIMEOUT_L4,
+        tags=["userManagement.Company"],
+        compact=True,
     )
     def get_list(cls):
-        company = cls.objects.all()
-        return company
+        return list(cls.objects.values(*cls.list_fields))
 
     @global_class_cache_decorator(
-        cache_key="company_list_active", timeout=settings.CACHE_TIMEOUT_L3
+        cache_key="company_list_active",
+        timeout=settings.CACHE_TIMEOUT_L4,
+        tags=["userManagement.Company"],
+        compact=True,
     )
     def get_active_list(cls):
-        company = cls.objects.filter(is_active=True)
-        return company
+        return list(cls.objects.filter(is_active=True).values(*cls.list_fields))
 
 
 class Department(BaseAuditModel):
@@ -81,23 +87,37 @@ class Department(BaseAuditModel):
         null=True,
     )
     is_active = models.BooleanField(default=True)
+    # fields of the cached department lists, see get_list
+    list_fields = [
+        "id",
+        "short_name",
+        "full_name",
+        "company_id",
+        "manager_id",
+        "senior_manager_id",
+        "is_active",
+    ]
 
     def __str__(self) -> str:
         return "%s (%s)" % (self.full_name, self.short_name)
 
     @global_class_cache_decorator(
-        cache_key="department_list", timeout=settings.CACHE_TIMEOUT_L3
+        cache_key="department_list",
+        timeout=settings.CACHE_TIMEOUT_L4,
+        tags=["userManagement.Department"],
+        compact=True,
     )
     def get_list(cls):
-        department = Department.objects.all()
-        return department
+        return list(cls.objects.values(*cls.list_fields))
 
     @global_class_cache_decorator(
-        cache_key="department_list_active", timeout=settings.CACHE_TIMEOUT_L3
+        cache_key="department_list_active",
+        timeout=settings.CACHE_TIMEOUT_L4,
+        tags=["userManagement.Department"],
+        compact=True,
     )
     def get_active_list(cls):
-        department = Department.objects.filter(is_active=True)
-        return department
+        return list(cls.objects.filter(is_active=True).values(*cls.list_fields))
 
 
 class Team(BaseAuditModel):
@@ -121,23 +141,37 @@ class Team(BaseAuditModel):
         null=True,
     )
     is_active = models.BooleanField(default=True)
+    # fields of the cached team lists, see get_list
+    list_fields = [
+        "id",
+        "short_name",
+        "full_name",
+        "department_id",
+        "manager_id",
+        "first_support_id",
+        "is_active",
+    ]
 
     def __str__(self) -> str:
         return "%s (%s)" % (self.full_name, self.short_name)
 
     @global_class_cache_decorator(
-        cache_key="team_list", timeout=settings.CACHE_TIMEOUT_L3
+        cache_key="team_list",
+        timeout=settings.CACHE_TIMEOUT_L4,
+        tags=["userManagement.Team"],
+        compact=True,
     )
     def get_list(cls):
-        team = cls.objects.all()
-        return team
+        return list(cls.objects.values(*cls.list_fields))
 
     @global_class_cache_decorator(
-        cache_key="team_list_active", timeout=settings.CACHE_TIMEOUT_L3
+        cache_key="team_list_active",
+        timeout=settings.CACHE_TIMEOUT_L4,
+        tags=["userManagement.Team"],
+        compact=True,
     )
     def get_active_list(cls):
-        team = cls.objects.filter(is_active=True)
-        return team
+        return list(cls.objects.filter(is_active=True).values(*cls.list_fields))
 
     # def save(self, *args, **kwargs):
     #     super().save(*args, **kwargs)
@@ -253,78 +287,92 @@ class AppMenu(BaseAuditModel):
             )
         super().save(*args, **kwargs)
 
+    # role/permission fields in the "role_unit" of each menu item, see build_menu_tree
+    role_unit_fields = [
+        "id",
+        "name",
+        "group_type",
+        "permission_role__id",
+        "permission_role__app__key",
+        "permission_role__company__short_name",
+        "permission_role__company__id",
+        "permission_role__department__short_name",
+        "permission_role__department__id",
+        "permission_role__team__short_name",
+        "permission_role__team__id",
+    ]
+
+    @classmethod
+    def get_role_units(cls, menu_items, user=None):
+        """
+        Retrieves the active roles (with their permissions) of the menu items, in one query.
+
+        Args:
+            menu_items: A queryset of AppMenu objects.
+            user: Only the roles whose permissions are granted to this user, if given.
+
+        Returns:
+            A dict of menu item id to the list of its role_unit_fields values.
+
+        Database Operations:
+            - Read: CustomGroup joined with its menus and Permission (company, department, team, app)
+        """
+        queryset = CustomGroup.objects.filter(
+            menus__in=menu_items.order_by().values("id"), is_active=True
+        )
+        if user:
+            queryset = queryset.filter(permission_role__user_permissions=user)
+        role_units = {}
+        for row in (
+            queryset.values("menus__id", *cls.role_unit_fields)
+            .distinct()
+            .order_by("menus__id", "id", "permission_role__id")
+        ):
+            role_units.setdefault(row.pop("menus__id"), []).append(row)
+        return role_units
+
+    @classmethod
+    def filter_role_unit(cls, item, role_unit):
+        """
+        Keeps the roles that apply to the link of the menu item: the permission app must
+        be in the link, and for unit control items also the department/team.
+        """
+        new_role = []
+        link = item.link.lower() if item.link else ""  # Simplified conditional
+        for p in role_unit:
+            p_app = (
+                p.get("permission_role__app__key") or ""
+            ).lower()  # Simplified conditional
+            if item.unit_control:
+                department = (
+                    p.get("permission_role__department__short_name") or ""
+                ).lower()
+                team = (p.get("permission_role__team__short_name") or "").lower()
+                if f"/{p_app}/" in link and (
+                    f"/{department}/{team}/" in link or f"/{department}/all/" in link
+                ):
+                    new_role.append(p)
+            elif f"/{p_app}/" in link:
+                new_role.append(p)
+        return new_role
+
     @classmethod
     def build_menu_tree(cls, menu_items, user=None):
         """
         Builds a nested menu tree structure from a queryset of AppMenu objects.
         Handles user permissions and unit control.
+
+        Database Operations:
+            - Read: AppMenu (with parent), and the roles of all items in one query (see get_role_units),
+              so the number of queries does not depend on the number of menu items.
         """
-        menu_items = menu_items.prefetch_related(
-            "group_menus__permission_role"
-        )  # Optimize query
+        menu_items = menu_items.select_related("parent_app_menu")
+        items = list(menu_items)
+        role_units = cls.get_role_units(menu_items, user) if items else {}
         menu_dict = {}
 
-        for item in menu_items:
-            if user:
-                role_unit = list(
-                    item.group_menus.filter(
-                        is_active=True, permission_role__user_permissions=user
-                    )
-                    .values(
-                        "id",
-                        "name",
-                        "group_type",
-                        "permission_role__id",
-                        "permission_role__app__key",
-                        "permission_role__company__short_name",
-                        "permission_role__company__id",
-                        "permission_role__department__short_name",
-                        "permission_role__department__id",
-                        "permission_role__team__short_name",
-                        "permission_role__team__id",
-                    )
-                    .distinct()
-                )
-            else:
-                role_unit = list(
-                    item.group_menus.filter(is_active=True)
-                    .values(
-                        "id",
-                        "name",
-                        "group_type",
-                        "permission_role__id",
-                        "permission_role__app__key",
-                        "permission_role__company__short_name",
-                        "permission_role__company__id",
-                        "permission_role__department__short_name",
-                        "permission_role__department__id",
-                        "permission_role__team__short_name",
-                        "permission_role__team__id",
-                    )
-                    .distinct()
-                )
-
-            new_role = []
-            link = item.link.lower() if item.link else ""  # Simplified conditional
-            for p in role_unit:
-                p_app = (
-                    p.get("permission_role__app__key") or ""
-                ).lower()  # Simplified conditional
-                if item.unit_control:
-                    department = (
-                        p.get("group_menus__permission_role__department__short_name")
-                        or ""
-                    ).lower()
-                    team = (
-                        p.get("group_menus__permission_role__team__short_name") or ""
-                    ).lower()
-                    if f"/{p_app}/" in link and (
-                        f"/{department}/{team}/" in link
-                        or f"/{department}/all/" in link
-                    ):
-                        new_role.append(p)
-                elif f"/{p_app}/" in link:
-                    new_role.append(p)
+        for item in items:
+            new_role = cls.filter_role_unit(item, role_units.get(item.id, []))
 
             if item.unit_control and not new_role:  # More Pythonic check
                 menu_dict[item.id] = None  # Remove if no roles
@@ -348,7 +396,7 @@ class AppMenu(BaseAuditModel):
                     "diango_view": item.diango_view,
                 }
 
-        for item in menu_items:
+        for item in items:
             if (
                 item.parent_app_menu
                 and menu_dict.get(item.parent_app_menu_id)
@@ -361,7 +409,11 @@ class AppMenu(BaseAuditModel):
         return menu_dict
 
     @global_class_cache_decorator(
-        cache_key="menu_tree_active", timeout=settings.CACHE_TIMEOUT_L3
+        cache_key="menu_tree_active",
+        timeout=settings.CACHE_TIMEOUT_L4,
+        local=True,
+        tags=MENU_CACHE_TAGS,
+        stale_ttl=settings.CACHE_TIMEOUT_DEFAULT,
     )
     def get_menu_tree(cls):
         """
@@ -372,7 +424,11 @@ class AppMenu(BaseAuditModel):
         return [v for k, v in menu_dict.items()]
 
     @global_class_cache_decorator(
-        cache_key="menu_tree_active", timeout=settings.CACHE_TIMEOUT_L3
+        cache_key="menu_tree_active",
+        timeout=settings.CACHE_TIMEOUT_L4,
+        local=True,
+        tags=MENU_CACHE_TAGS,
+        stale_ttl=settings.CACHE_TIMEOUT_DEFAULT,
     )
     def get_menu_tree_by_id_key(cls, menu_id, menu_key):
         """
@@ -396,7 +452,11 @@ class AppMenu(BaseAuditModel):
         )  # Corrected to m.get('id')
 
     @global_class_cache_decorator(
-        cache_key="app_tree_active", timeout=settings.CACHE_TIMEOUT_L3
+        cache_key="app_tree_active",
+        timeout=settings.CACHE_TIMEOUT_L4,
+        local=True,
+        tags=MENU_CACHE_TAGS,
+        stale_ttl=settings.CACHE_TIMEOUT_DEFAULT,
     )
     def get_app_tree(cls):
         """
@@ -409,7 +469,11 @@ class AppMenu(BaseAuditModel):
         return app
 
     @global_class_cache_decorator(
-        cache_key="app_instance", timeout=settings.CACHE_TIMEOUT_L3
+        cache_key="app_instance",
+        timeout=settings.CACHE_TIMEOUT_L4,
+        local=True,
+        tags=MENU_CACHE_TAGS,
+        compact=True,
     )
     def get_app_instance_by_key(cls, app_name):
         """
@@ -430,7 +494,11 @@ class AppMenu(BaseAuditModel):
             return None
 
     @global_class_cache_decorator(
-        cache_key="app_form", timeout=settings.CACHE_TIMEOUT_L3
+        cache_key="app_form",
+        timeout=settings.CACHE_TIMEOUT_L4,
+        local=True,
+        tags=["userManagement.AppMenu", "jsonForm.FormTemplate"],
+        compact=True,
     )
     def get_app_form_by_id(cls, app_id):
         """
@@ -453,7 +521,11 @@ class AppMenu(BaseAuditModel):
         )  # More concise way to return None if no forms
 
     @global_class_cache_decorator(
-        cache_key="app_form", timeout=settings.CACHE_TIMEOUT_L3
+        cache_key="app_form",
+        timeout=settings.CACHE_TIMEOUT_L4,
+        local=True,
+        tags=["userManagement.AppMenu", "jsonForm.FormTemplate"],
+        compact=True,
     )
     def get_app_form_by_key(cls, app_name):
         """
@@ -476,7 +548,9 @@ class AppMenu(BaseAuditModel):
         )  # More concise way to return None if no forms
 
     @global_class_cache_decorator(
-        cache_key="menu_permission_roles_by_url", timeout=settings.CACHE_TIMEOUT_L3
+        cache_key="menu_permission_roles_by_url",
+        timeout=settings.CACHE_TIMEOUT_L4,
+        tags=MENU_CACHE_TAGS,
     )
     def get_permission_roles_by_url(cls, url, department=None, team=None):
         link = normalized_url(url)
@@ -503,7 +577,9 @@ class AppMenu(BaseAuditModel):
         ).distinct()
 
     @global_class_cache_decorator(
-        cache_key="menu_permission_users_by_url", timeout=settings.CACHE_TIMEOUT_L3
+        cache_key="menu_permission_users_by_url",
+        timeout=settings.CACHE_TIMEOUT_L4,
+        tags=USER_MENU_CACHE_TAGS,
     )
     def get_permission_users_by_url(cls, url, department=None, team=None):
         link = normalized_url(url)
@@ -597,12 +673,15 @@ class CustomGroup(
     #     # ... your logic to assign permissions ...
 
     @global_instance_cache_decorator(
-        cache_key="group_active_user_list", timeout=settings.CACHE_TIMEOUT_L3
+        cache_key="group_active_user_list",
+        timeout=settings.CACHE_TIMEOUT_L4,
+        tags=["userManagement.CustomGroup", "userManagement.CustomUser"],
+        compact=True,
     )
     def get_active_users(self):
-        """Gets a list of users associated with this group."""
-        return self.user_set.filter(
-            is_active=True
+        """Gets a list of users (list_fields of CustomUser) associated with this group."""
+        return list(
+            self.user_set.filter(is_active=True).values(*CustomUser.list_fields)
         )  # Use the built-in user_set attribute
 
     @classmethod
@@ -800,7 +879,11 @@ class Permission(BaseAuditModel):  # Assuming BaseAuditModel is defined elsewher
                 team__isnull=True, department__isnull=True, company__isnull=True
             )  # No data control
 
-        return Permission.objects.filter(filter).first()
+        return (
+            Permission.objects.filter(filter)
+            .select_related("team__first_support")
+            .first()
+        )
 
     @property
     def get_perm_user_department(self, user):
@@ -881,6 +964,18 @@ class CustomUser(AbstractUser, BaseAuditModel):
         choices=[(tz, tz) for tz in pytz.all_timezones],
         default="UTC",
     )
+    # fields of the cached user lists, see get_list
+    list_fields = [
+        "id",
+        "username",
+        "first_name",
+        "last_name",
+        "title",
+        "email",
+        "company_id",
+        "department_id",
+        "is_active",
+    ]
 
     def __str__(self) -> str:
         """
@@ -893,7 +988,10 @@ class CustomUser(AbstractUser, BaseAuditModel):
         )
 
     @global_instance_cache_decorator(
-        cache_key="user_menu_tree", timeout=settings.CACHE_TIMEOUT_L2
+        cache_key="user_menu_tree",
+        timeout=settings.CACHE_TIMEOUT_L4,
+        tags=USER_MENU_CACHE_TAGS,
+        stale_ttl=settings.CACHE_TIMEOUT_DEFAULT,
     )
     def get_user_menu_tree(self):
         """
@@ -917,7 +1015,10 @@ class CustomUser(AbstractUser, BaseAuditModel):
         ]  # Filter out None values
 
     @global_instance_cache_decorator(
-        cache_key="user_app_tree", timeout=settings.CACHE_TIMEOUT_L2
+        cache_key="user_app_tree",
+        timeout=settings.CACHE_TIMEOUT_L4,
+        tags=USER_MENU_CACHE_TAGS,
+        stale_ttl=settings.CACHE_TIMEOUT_DEFAULT,
     )
     def get_user_app_tree(self):
         """
@@ -962,32 +1063,36 @@ class CustomUser(AbstractUser, BaseAuditModel):
         return field_info
 
     @global_class_cache_decorator(
-        cache_key="user_list", timeout=settings.CACHE_TIMEOUT_L3
+        cache_key="user_list",
+        timeout=settings.CACHE_TIMEOUT_L4,
+        tags=["userManagement.CustomUser"],
+        compact=True,
     )
     def get_list(cls):
         """
         Retrieves a list of all users.
 
         Returns:
-            A queryset of all CustomUser objects.
+            A list of dicts with the list_fields of all CustomUser objects.
         """
-        users = cls.objects.all()
-        return users
+        return list(cls.objects.values(*cls.list_fields))
 
     @global_class_cache_decorator(
-        cache_key="user_list_active", timeout=settings.CACHE_TIMEOUT_L3
+        cache_key="user_list_active",
+        timeout=settings.CACHE_TIMEOUT_L4,
+        tags=["userManagement.CustomUser"],
+        compact=True,
     )
     def get_active_list(cls):
         """
         Retrieves a list of all active users.
 
         Returns:
-            A queryset of all active CustomUser objects.
+            A list of dicts with the list_fields of all active CustomUser objects.
         """
-        users = cls.objects.filter(is_active=True)
-        return users
+        return list(cls.objects.filter(is_active=True).values(*cls.list_fields))
 
-    @global_class_cache_decorator(cache_key="user_info")
+    @global_class_cache_decorator(cache_key="user_info", tags=USER_INFO_CACHE_TAGS)
     def get_user_info(cls, id):
         """Retrieves detailed information about the user."""
         fields = set(cls.get_selected_fields_info([f.name for f in cls._meta.fields]))
@@ -995,4 +1100,5 @@ class CustomUser(AbstractUser, BaseAuditModel):
         fields = list(fields.union(selected_fields))
         user_info = cls.objects.filter(id=id).values(*fields)
         user_info = list(user_info)[0]
-        return json.loads(json.dumps(user_info, cls=CustomJSONEncoder))
+        # JSON values (also saved in the session), converted in one pass over the row
+        return {key: to_json_value(value) for key, value in user_info.items()}